@@ -0,0 +1,133 @@
+"""Registry of the lab1 kernels to be benchmarked.
+
+Each ques directory of lab1 is a separate script root, and several of them have
+a top level 'utils' or 'data_loader' package. load_module imports a module of a
+given ques directory after evicting the packages of the previously loaded one,
+so that all the kernels can be benchmarked from a single process.
+
+A kernel is a function (size, rng) -> None, doing 'size' units of work (samples,
+bins or games), along with the name of that unit.
+"""
+
+import importlib
+import numpy as np
+import pathlib
+import sys
+import unittest
+from typing import Callable, Dict, List, Tuple
+
+
+LAB1_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(LAB1_DIR))
+from common.board import Board
+
+_SCRIPT_PACKAGES = ('utils', 'data_loader')
+
+
+def load_module(ques_dir: str, module_name: str):
+    """Imports module_name (eg. 'utils.utils') with lab1/<ques_dir> as the script root."""
+    for name in list(sys.modules):
+        if name.split('.')[0] in _SCRIPT_PACKAGES:
+            del sys.modules[name]
+    root = str(LAB1_DIR / ques_dir)
+    sys.path.insert(0, root)
+    try:
+        return importlib.import_module(module_name)
+    finally:
+        sys.path.remove(root)
+
+
+def _ques1_kernels() -> Dict[str, Tuple[Callable, str]]:
+    utils = load_module('ques1', 'utils.utils')
+
+    def streaming_histogram(size, rng):
+        histogram = utils.StreamingHistogram(200, (-6, 6))
+        for samples in utils.stream_samples('gaussian', size, chunk_size=1_000_000, seed=0):
+            histogram.update(samples)
+    return {'ques1.streaming_histogram': (streaming_histogram, 'samples')}
+
+
+def _ques2_kernels() -> Dict[str, Tuple[Callable, str]]:
+    utils = load_module('ques2', 'utils.utils')
+
+    def generate_data_point(size, rng):
+        for _ in range(size):
+            utils.generate_data_point(100)
+
+    return {
+        'ques2.generate_data_point': (generate_data_point, 'samples'),
+        'ques2.generate_using_CLT': (lambda size, rng: utils.generate_using_CLT(size, 5, 9, rng=rng), 'samples'),
+        'ques2.generate_using_Box_Muller_Transform': (
+            lambda size, rng: utils.generate_using_Box_Muller_Transform(size, 5, 9, rng=rng), 'samples'),
+    }
+
+
+def _ques3_kernels() -> Dict[str, Tuple[Callable, str]]:
+    utils = load_module('ques3', 'utils.utils')
+    sampling = load_module('ques3', 'utils.sampling')
+    return {
+        'ques3.calculate_area': (lambda size, rng: utils.calculate_area(utils.sqrt_sin, num_bins=size), 'bins'),
+        'ques3.mc_integrate_stratified': (lambda size, rng: sampling.mc_integrate(
+            utils.sqrt_sin, 0, np.pi, method='stratified', batch_size=min(size, 2**12), max_samples=size, rng=rng),
+            'samples'),
+    }
+
+
+def _ques4_simulation_kernels() -> Dict[str, Tuple[Callable, str]]:
+    environments = load_module('ques4/simulation', 'data_loader.environments')
+
+    def snake_and_ladder_step(size, rng):
+        env = environments.SnakeAndLadderEnv()
+        for _ in range(size):
+            env.reset()
+            done = False
+            while not done:
+                _, _, done, _ = env.step(int(rng.integers(1, 7)))
+
+    def batched_snake_and_ladder_step(size, rng):
+        env = environments.BatchedSnakeAndLadderEnv(size)
+        env.reset()
+        for _ in range(env.max_timesteps):
+            _, _, dones, _ = env.step(rng.integers(1, 7, size=size, dtype=np.int8))
+            if dones.all():
+                break
+
+    return {
+        'ques4.SnakeAndLadderEnv.step': (snake_and_ladder_step, 'games'),
+        'ques4.BatchedSnakeAndLadderEnv.step': (batched_snake_and_ladder_step, 'games'),
+    }
+
+
+def _ques4_numerical_kernels() -> Dict[str, Tuple[Callable, str]]:
+    absorption = load_module('ques4/numerical', 'data_loader.absorption')
+
+    def absorption_large_board(size, rng):
+        board = Board(num_cells=size, die_moves=range(1, 7), snakes={size - 2: 1})
+        absorption.hitting_probability(board.transition_matrix(), board.start, board.goal)
+
+    return {'ques4.hitting_probability': (absorption_large_board, 'cells')}
+
+
+def get_kernels() -> Tuple[Dict[str, Tuple[Callable, str]], List[str]]:
+    """Returns the kernels which could be loaded, and the errors of the ques
+    directories which could not (eg. because gym is not installed)."""
+    kernels, errors = {}, []
+    for loader in (_ques1_kernels, _ques2_kernels, _ques3_kernels, _ques4_simulation_kernels, _ques4_numerical_kernels):
+        try:
+            kernels.update(loader())
+        except ImportError as error:
+            errors.append(f'{loader.__name__}: {error}')
+    return kernels, errors
+
+
+class TestKernels(unittest.TestCase):
+    def test_every_kernel_runs(self):
+        """Every kernel which could be loaded should run at a small size."""
+        kernels, _ = get_kernels()
+        for name, (kernel, _) in kernels.items():
+            with self.subTest(kernel=name):
+                kernel(100, np.random.default_rng(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
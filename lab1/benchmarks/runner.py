@@ -0,0 +1,83 @@
+import numpy as np
+import hydra
+import json
+import logging
+import pathlib
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+from kernels import get_kernels
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def measure(kernel: Callable, size: int, repeats: int, seed: int) -> Dict[str, float]:
+    """Runs kernel(size, rng) 'repeats' times and returns the best throughput
+    (units of work per second) and the peak memory traced during one extra run."""
+    best_time = np.inf
+    for _ in range(repeats):
+        rng = np.random.default_rng(seed)
+        start_time = time.perf_counter()
+        kernel(size, rng)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    # tracing slows down the kernel, so the memory is measured on a separate run
+    tracemalloc.start()
+    kernel(size, np.random.default_rng(seed))
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': best_time, 'throughput': size / best_time, 'peak_memory_mb': peak_memory / 2**20}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> list:
+    """Returns the (key, metric, baseline, current) of every result which is worse
+    than the baseline by more than the tolerance (a fraction)."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        if result['throughput'] < baseline[key]['throughput'] * (1 - tolerance):
+            regressions.append((key, 'throughput', baseline[key]['throughput'], result['throughput']))
+        # a little slack, as tiny allocations are noisy
+        if result['peak_memory_mb'] > baseline[key]['peak_memory_mb'] * (1 + tolerance) + 1:
+            regressions.append((key, 'peak_memory_mb', baseline[key]['peak_memory_mb'], result['peak_memory_mb']))
+    return regressions
+
+
+@hydra.main(config_path="conf", config_name="config")
+def main(cfg):
+    kernels, errors = get_kernels()
+    for error in errors:
+        logger.warning(f'Skipping kernels: {error}')
+
+    results = {}
+    for name, (kernel, unit) in kernels.items():
+        if cfg.kernels and name not in cfg.kernels:
+            continue
+        for size in cfg.sizes.get(unit, cfg.sizes.default):
+            # the pure python kernels are benchmarked on smaller sizes
+            if size > cfg.max_python_loop_size and name in cfg.python_loop_kernels:
+                continue
+            result = measure(kernel, size, cfg.repeats, cfg.seed)
+            results[f'{name}[{size}]'] = result
+            print(f"{name:45s} {size:>12,d} {unit:8s} {result['throughput']:>16,.0f} {unit}/s "
+                  f"{result['peak_memory_mb']:>10.1f} MB")
+
+    baseline_path = pathlib.Path(hydra.utils.get_original_cwd()) / cfg.baseline
+    if cfg.save_baseline or not baseline_path.exists():
+        baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f'Saved the baseline to {baseline_path}')
+        return
+
+    regressions = compare(results, json.loads(baseline_path.read_text()), cfg.tolerance)
+    for key, metric, old, new in regressions:
+        print(f'REGRESSION {key} {metric}: {old:,.2f} -> {new:,.2f}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Description of a generalized Snake and Ladder board, shared by the numerical
+(Markov chain) and the simulation solutions of lab1 ques4.
+
+The player starts at 'start' and rolls a fair die with len(die_moves) faces; face
+i moves the player forward by die_moves[i] cells. Rolls which would take the
+player beyond the last cell are ignored. Landing on the bottom of a ladder or on
+the head of a snake moves the player to its other end. The game is won at the
+last cell, and lost at any of the dead cells, both of which can not be left.
+
+The default board is the one of the problem statement: 9 cells, only the rolls
+1 and 2 move the player, and the cells 2 and 4 are dead.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import unittest
+from typing import Dict, Optional, Sequence
+
+
+class Board:
+    def __init__(self, num_cells: int = 9, die_moves: Sequence[int] = (1, 2, 0, 0, 0, 0),
+                 snakes: Optional[Dict[int, int]] = None, ladders: Optional[Dict[int, int]] = None,
+                 dead_cells: Sequence[int] = (2, 4), start: int = 0) -> None:
+        """Initialize the board.
+
+        Args:
+            num_cells (int, optional): Number of cells. The last cell is the goal. Defaults to 9.
+            die_moves (Sequence[int], optional): Number of cells moved for each face
+              of the die. Defaults to (1, 2, 0, 0, 0, 0).
+            snakes (Dict[int, int], optional): Map from the head to the tail of each snake.
+            ladders (Dict[int, int], optional): Map from the bottom to the top of each ladder.
+            dead_cells (Sequence[int], optional): Cells where the game is lost. Defaults to (2, 4).
+            start (int, optional): Starting cell. Defaults to 0.
+        """
+        self.num_cells = num_cells
+        self.die_moves = np.asarray(die_moves, dtype=np.int64)
+        self.snakes = dict(snakes or {})
+        self.ladders = dict(ladders or {})
+        self.dead_cells = tuple(dead_cells)
+        self.start = start
+        self.goal = num_cells - 1
+
+        for head, tail in self.snakes.items():
+            if not 0 <= tail < head < num_cells:
+                raise ValueError(f'Snake {head} -> {tail} must go down, within the board')
+        for bottom, top in self.ladders.items():
+            if not 0 <= bottom < top < num_cells:
+                raise ValueError(f'Ladder {bottom} -> {top} must go up, within the board')
+        if np.any(self.die_moves < 0):
+            raise ValueError('die_moves can not be negative')
+
+        self.is_dead = np.zeros(num_cells, dtype=bool)
+        self.is_dead[list(self.dead_cells)] = True
+        self.is_absorbing = self.is_dead.copy()
+        self.is_absorbing[self.goal] = True
+
+        # cell reached after landing on each cell, following snakes and ladders
+        jumps = np.arange(num_cells)
+        jumps[list(self.snakes)] = list(self.snakes.values())
+        jumps[list(self.ladders)] = list(self.ladders.values())
+        self.jumps = jumps
+
+    @property
+    def num_faces(self) -> int:
+        return self.die_moves.size
+
+    @property
+    def next_cells(self) -> np.ndarray:
+        """Array of shape (num_cells, num_faces), with the cell reached from each
+        cell for each face of the die."""
+        if not hasattr(self, '_next_cells'):
+            cells = np.arange(self.num_cells)[:, None]
+            landing = cells + self.die_moves[None, :]
+            landing = np.where(landing < self.num_cells, landing, cells)
+            next_cells = self.jumps[landing]
+            next_cells[self.is_absorbing] = cells[self.is_absorbing]
+            self._next_cells = next_cells.astype(np.min_scalar_type(self.num_cells))
+        return self._next_cells
+
+    def transition_matrix(self) -> sp.csr_matrix:
+        """Sparse (num_cells, num_cells) transition matrix of the game. Only
+        num_cells * num_faces entries are built, never a dense N^2 matrix."""
+        moving = np.flatnonzero(~self.is_absorbing)
+        absorbing = np.flatnonzero(self.is_absorbing)
+        rows = np.concatenate([np.repeat(moving, self.num_faces), absorbing])
+        cols = np.concatenate([self.next_cells[moving].ravel().astype(np.int64), absorbing])
+        data = np.concatenate([np.full(moving.size * self.num_faces, 1.0 / self.num_faces), np.ones(absorbing.size)])
+        # duplicate (row, col) pairs, ie. faces leading to the same cell, are summed up
+        return sp.csr_matrix((data, (rows, cols)), shape=(self.num_cells, self.num_cells))
+
+    def __str__(self) -> str:
+        return (f'Board(cells={self.num_cells}, die_moves={self.die_moves.tolist()}, snakes={self.snakes}, '
+                f'ladders={self.ladders}, dead_cells={self.dead_cells})')
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class TestBoard(unittest.TestCase):
+    def test_default_board(self):
+        P = Board().transition_matrix().toarray()
+        np.testing.assert_allclose(P.sum(axis=1), 1)
+        self.assertAlmostEqual(P[0, 0], 4/6)
+        self.assertAlmostEqual(P[0, 1], 1/6)
+        self.assertAlmostEqual(P[7, 7], 5/6)
+        for cell in (2, 4, 8):
+            self.assertEqual(P[cell, cell], 1)
+
+    def test_snakes_and_ladders(self):
+        board = Board(num_cells=10, die_moves=(1, 2), snakes={7: 1}, ladders={2: 6}, dead_cells=())
+        self.assertEqual(board.next_cells[1].tolist(), [6, 3])
+        self.assertEqual(board.next_cells[6].tolist(), [1, 8])
+        self.assertEqual(board.next_cells[8].tolist(), [9, 8])
+
+    def test_large_board_is_sparse(self):
+        P = Board(num_cells=100_000, die_moves=range(1, 7), ladders={10: 50_000}, snakes={99_990: 5}).transition_matrix()
+        self.assertLessEqual(P.nnz, 6 * 100_000)
+        np.testing.assert_allclose(np.asarray(P.sum(axis=1)).ravel(), 1)
+
+    def test_large_board_is_absorbed(self):
+        # every game ends, won at the goal or lost at the dead cell: the absorption
+        # probabilities N R of each transient cell sum to 1
+        board = Board(num_cells=100_000, die_moves=range(1, 7), snakes={99_990: 5, 50_000: 100}, dead_cells=(70_000,))
+        P = board.transition_matrix()
+        transient, absorbing = np.flatnonzero(~board.is_absorbing), np.flatnonzero(board.is_absorbing)
+        Q, R = P[transient][:, transient], P[transient][:, absorbing]
+        B = spla.splu(sp.identity(transient.size, format='csc') - Q.tocsc()).solve(R.toarray())
+        np.testing.assert_allclose(B.sum(axis=1), 1)
+        self.assertTrue(np.all(B >= -1e-12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+"""Shared driver for running Monte Carlo estimators over a pool of processes.
+
+The job of drawing 'num_samples' samples is cut into shards of 'shard_size'
+samples. Every shard gets its own numpy Generator, seeded by a child of a single
+np.random.SeedSequence, and the partial statistics of the shards are merged in
+shard order. The shards, their seeds and the order of the merge only depend on
+(num_samples, shard_size, seed), so the result is the same irrespective of the
+number of workers.
+
+generate_samples draws the same shards, but returns the samples themselves,
+concatenated in shard order, for the callers which need all of them (e.g. to
+plot a histogram) rather than their mean.
+
+The sample function must be picklable (ie. defined at the top level of a module,
+or a functools.partial of one), and is called as sample_fn(size, rng=rng). It
+should return an array of 'size' i.i.d. terms whose mean is the quantity being
+estimated.
+"""
+
+import numpy as np
+import multiprocessing
+import logging
+import sys
+import unittest
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+DEFAULT_SHARD_SIZE = 1_000_000
+
+
+class RunningStats:
+    """Count, mean and sum of squared deviations (M2) of a stream of samples.
+    Two RunningStats can be merged exactly (Chan et al.), which is used to reduce
+    the partial results of the shards."""
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0) -> None:
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray) -> 'RunningStats':
+        samples = np.asarray(samples, dtype=float).ravel()
+        if samples.size == 0:
+            return cls()
+        mean = samples.mean()
+        return cls(samples.size, float(mean), float(np.square(samples - mean).sum()))
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self) -> float:
+        """Unbiased sample variance."""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.inf
+
+    @property
+    def std_error(self) -> float:
+        """Standard error of the mean."""
+        return np.sqrt(self.variance / self.count) if self.count > 1 else np.inf
+
+    def __str__(self) -> str:
+        return f'{self.mean:.6f} ± {self.std_error:.6f} ({self.count} samples)'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _run_shard(sample_fn: Callable, shard: Tuple[int, np.random.SeedSequence]) -> RunningStats:
+    size, seed_seq = shard
+    return RunningStats.from_samples(sample_fn(size, rng=np.random.default_rng(seed_seq)))
+
+
+def _sample_shard(sample_fn: Callable, shard: Tuple[int, np.random.SeedSequence]) -> np.ndarray:
+    size, seed_seq = shard
+    return sample_fn(size, rng=np.random.default_rng(seed_seq))
+
+
+def make_shards(num_samples: int, shard_size: int, seed: Optional[int] = None):
+    """Returns the list of (size, SeedSequence) of each shard of the job."""
+    if shard_size <= 0:
+        raise ValueError(f'shard_size must be positive, got {shard_size}')
+    sizes = [min(shard_size, num_samples - start) for start in range(0, num_samples, shard_size)]
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def run_monte_carlo(sample_fn: Callable, num_samples: int, shard_size: int = DEFAULT_SHARD_SIZE,
+                    num_workers: Optional[int] = None, seed: Optional[int] = None,
+                    target_std_error: Optional[float] = None, verbose: bool = False) -> RunningStats:
+    """Estimate the mean of the terms returned by sample_fn, using num_samples
+    samples spread over a pool of processes.
+
+    Args:
+        sample_fn (Callable): Called as sample_fn(size, rng=rng), returns 'size' terms.
+        num_samples (int): Maximum number of samples to draw.
+        shard_size (int, optional): Number of samples per shard. Changing it changes
+          the random streams, and hence the result.
+        num_workers (int, optional): Number of processes. Defaults to the number of
+          cpus. With 1 worker, the shards are run in the current process.
+        seed (int, optional): Seed of the root SeedSequence.
+        target_std_error (float, optional): If given, stop once the standard error
+          of the merged shards falls below it. The shards are merged in order, so
+          the stopping point does not depend on num_workers either.
+        verbose (bool, optional): Log the running estimate after every shard.
+
+    Returns:
+        RunningStats: The merged statistics, with the estimate in .mean.
+    """
+    shards = make_shards(num_samples, shard_size, seed)
+    run_shard = partial(_run_shard, sample_fn)
+    num_workers = num_workers or multiprocessing.cpu_count()
+    stats = RunningStats()
+
+    def reduce(results) -> RunningStats:
+        for shard_stats in results:
+            stats.merge(shard_stats)
+            if verbose:
+                logger.info(f'Running estimate: {stats}')
+            if target_std_error is not None and stats.std_error <= target_std_error:
+                break
+        return stats
+
+    if num_workers == 1 or len(shards) == 1:
+        return reduce(map(run_shard, shards))
+    with multiprocessing.Pool(processes=min(num_workers, len(shards))) as pool:
+        # imap keeps the shard order, which makes the reduction deterministic
+        return reduce(pool.imap(run_shard, shards))
+
+
+def generate_samples(sample_fn: Callable, num_samples: int, shard_size: int = DEFAULT_SHARD_SIZE,
+                     num_workers: Optional[int] = None, seed: Optional[int] = None) -> np.ndarray:
+    """Draw num_samples samples with sample_fn, shard by shard over a pool of
+    processes, each shard with its own Generator as in run_monte_carlo.
+
+    Args:
+        sample_fn (Callable): Called as sample_fn(size, rng=rng), returns 'size' samples.
+        num_samples (int): Number of samples to draw.
+        shard_size (int, optional): Number of samples per shard.
+        num_workers (int, optional): Number of processes. Defaults to the number of
+          cpus. With 1 worker, the shards are run in the current process.
+        seed (int, optional): Seed of the root SeedSequence.
+
+    Returns:
+        np.ndarray: Array of shape (num_samples,), the same for any num_workers.
+    """
+    shards = make_shards(num_samples, shard_size, seed)
+    sample_shard = partial(_sample_shard, sample_fn)
+    num_workers = num_workers or multiprocessing.cpu_count()
+    if num_workers == 1 or len(shards) <= 1:
+        parts = list(map(sample_shard, shards))
+    else:
+        with multiprocessing.Pool(processes=min(num_workers, len(shards))) as pool:
+            parts = pool.map(sample_shard, shards)
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def _uniform_terms(size: int, rng) -> np.ndarray:
+    return rng.uniform(0, 1, size)
+
+
+class TestRunningStats(unittest.TestCase):
+    def test_merge_matches_numpy(self):
+        samples = np.random.default_rng(0).normal(3, 2, 1001)
+        stats = RunningStats()
+        for chunk in np.array_split(samples, 6):
+            stats.merge(RunningStats.from_samples(chunk))
+        self.assertEqual(stats.count, samples.size)
+        self.assertAlmostEqual(stats.mean, samples.mean())
+        self.assertAlmostEqual(stats.variance, samples.var(ddof=1))
+
+
+class TestRunMonteCarlo(unittest.TestCase):
+    def test_independent_of_num_workers(self):
+        results = [run_monte_carlo(_uniform_terms, 100_000, shard_size=10_000, num_workers=num_workers, seed=7)
+                   for num_workers in (1, 2, 3)]
+        for stats in results[1:]:
+            self.assertEqual(stats.mean, results[0].mean)
+            self.assertEqual(stats.m2, results[0].m2)
+        self.assertAlmostEqual(results[0].mean, 0.5, places=2)
+
+    def test_generate_samples_independent_of_num_workers(self):
+        results = [generate_samples(_uniform_terms, 25_001, shard_size=5_000, num_workers=num_workers, seed=3)
+                   for num_workers in (1, 2)]
+        self.assertEqual(results[0].shape, (25_001,))
+        np.testing.assert_array_equal(results[0], results[1])
+
+    def test_early_exit(self):
+        stats = run_monte_carlo(_uniform_terms, 10**7, shard_size=10_000, num_workers=1, seed=0, target_std_error=1e-3)
+        self.assertLess(stats.count, 10**7)
+        self.assertLessEqual(stats.std_error, 1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
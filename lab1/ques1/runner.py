@@ -2,30 +2,28 @@ import numpy as np
 import hydra
 import matplotlib.pyplot as plt
 import pathlib
+from utils.utils import DIST_TYPES, RangeSketch, StreamingHistogram, stream_samples
 
 
 @hydra.main(config_path="conf", config_name="config")
 def main(cfg):
-    # np.random.seed(cfg.seed)
-
-    if cfg.dist_type == "multinomial":
-        numbers = np.random.multinomial(n=1, size=(cfg.num_pts,), pvals=[0.2, 0.4, 0.3, 0.1]).argmax(axis=1)
-        range = (0, 4)
-    elif cfg.dist_type == "uniform":
-        numbers = np.random.uniform(low=0, high=1, size=(cfg.num_pts,)) #.argmax(axis=1)
-        range = (0, 1)
-    elif cfg.dist_type == "gaussian":
-        numbers = np.random.normal(loc=0, scale=1, size=(cfg.num_pts,)) #.argmax(axis=1)
-        range = (numbers.min(), numbers.max())
-    elif cfg.dist_type == "exponential":
-        numbers = np.random.exponential(scale=0.5, size=(cfg.num_pts,))
-        range = (numbers.min(), numbers.max())
-    else:
+    if cfg.dist_type not in DIST_TYPES:
         raise ValueError("dist_type must be one of 'multinomial', 'uniform', 'gaussian', 'exponential'")
 
-    # ToDo: update the num of bins depending on the range of the distribution and change in len(numbers)
+    # First pass: sketch the stream to find the range and the number of bins.
+    # The stream is seeded, so that the second pass replays exactly the same samples.
+    sketch = RangeSketch(capacity=cfg.sketch_size)
+    for numbers in stream_samples(cfg.dist_type, cfg.num_pts, cfg.chunk_size, seed=cfg.seed):
+        sketch.update(numbers)
+    num_bins = cfg.num_bins if cfg.num_bins is not None else sketch.num_bins(max_bins=cfg.max_bins)
+
+    # Second pass: fill the histogram, one chunk at a time
+    histogram = StreamingHistogram(num_bins, sketch.range)
+    for numbers in stream_samples(cfg.dist_type, cfg.num_pts, cfg.chunk_size, seed=cfg.seed):
+        histogram.update(numbers)
+
     plt.clf()
-    plt.hist(numbers, bins=20, range=range, density=True)
+    histogram.plot(plt.gca(), density=True)
     plt.xlabel('Random Variable')
     plt.ylabel('Fraction of num of hits')
     plt.title(f'Sampling from {cfg.dist_type} Distribution: {cfg.num_pts} samples')
@@ -34,4 +32,4 @@ def main(cfg):
 
 if __name__ == '__main__':
     pathlib.Path(f'{pathlib.Path.cwd()}/figs/').mkdir(parents=True, exist_ok=True)
-    main()
\ No newline at end of file
+    main()
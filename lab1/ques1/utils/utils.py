@@ -0,0 +1,200 @@
+import numpy as np
+from typing import Callable, Iterator, Optional, Tuple
+import unittest
+
+
+DIST_TYPES = ('multinomial', 'uniform', 'gaussian', 'exponential')
+MULTINOMIAL_PVALS = [0.2, 0.4, 0.3, 0.1]
+
+
+def get_sampler(dist_type: str) -> Callable:
+    """Returns a function (rng, size) -> np.ndarray which draws 'size' samples
+    of the given distribution type."""
+    if dist_type == "multinomial":
+        # equivalent to multinomial(n=1).argmax(axis=1), without the (size, 4) one-hot matrix
+        return lambda rng, size: rng.choice(len(MULTINOMIAL_PVALS), size=size, p=MULTINOMIAL_PVALS)
+    elif dist_type == "uniform":
+        return lambda rng, size: rng.uniform(low=0, high=1, size=size)
+    elif dist_type == "gaussian":
+        return lambda rng, size: rng.normal(loc=0, scale=1, size=size)
+    elif dist_type == "exponential":
+        return lambda rng, size: rng.exponential(scale=0.5, size=size)
+    raise ValueError("dist_type must be one of 'multinomial', 'uniform', 'gaussian', 'exponential'")
+
+
+def stream_samples(dist_type: str, num_pts: int, chunk_size: int, seed: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Lazily draws num_pts samples of dist_type, in chunks of at most chunk_size.
+    Streams created with the same seed yield exactly the same samples, so that
+    the stream can be replayed for a second pass.
+
+    Args:
+        dist_type (str): One of 'multinomial', 'uniform', 'gaussian', 'exponential'.
+        num_pts (int): Total number of samples.
+        chunk_size (int): Maximum number of samples per chunk.
+        seed (int, optional): Seed of the underlying numpy Generator.
+
+    Yields:
+        np.ndarray: The next chunk of samples.
+    """
+    sampler = get_sampler(dist_type)
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_pts, chunk_size):
+        yield sampler(rng, min(chunk_size, num_pts - start))
+
+
+class RangeSketch:
+    """First pass summary of a stream of samples, used to decide the range and
+    the number of bins of a histogram. Keeps the exact min / max, the count, and
+    the first 'capacity' samples as a subsample. As the samples are i.i.d, the
+    first samples are as good as a uniformly drawn subsample."""
+
+    def __init__(self, capacity: int = 100_000) -> None:
+        self.capacity = capacity
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.is_integer = True
+        self._subsample = []
+        self._subsample_size = 0
+
+    def update(self, samples: np.ndarray) -> None:
+        if samples.size == 0:
+            return
+        self.count += samples.size
+        self.min = min(self.min, samples.min())
+        self.max = max(self.max, samples.max())
+        if self.is_integer:
+            self.is_integer = bool(np.all(np.mod(samples, 1) == 0))
+        if self._subsample_size < self.capacity:
+            kept = samples[:self.capacity - self._subsample_size]
+            self._subsample.append(kept.copy())
+            self._subsample_size += kept.size
+
+    @property
+    def subsample(self) -> np.ndarray:
+        return np.concatenate(self._subsample) if self._subsample else np.empty(0)
+
+    @property
+    def range(self) -> Tuple[float, float]:
+        """Range of the histogram. For integer valued samples, each integer gets
+        its own unit width bin."""
+        if self.count == 0:
+            raise ValueError('Can not compute the range of an empty stream')
+        if self.is_integer:
+            return float(self.min), float(self.max) + 1
+        if self.min == self.max:
+            return float(self.min) - 0.5, float(self.max) + 0.5
+        return float(self.min), float(self.max)
+
+    def num_bins(self, max_bins: int = 200) -> int:
+        """Number of bins using the Freedman-Diaconis rule on the subsample, and the
+        total number of samples seen. Integer valued samples get one bin per value."""
+        low, high = self.range
+        if self.is_integer:
+            return int(high - low)
+        q75, q25 = np.percentile(self.subsample, [75, 25])
+        bin_width = 2 * (q75 - q25) / np.cbrt(self.count)
+        if bin_width <= 0:
+            return 1
+        return int(np.clip(np.ceil((high - low) / bin_width), 1, max_bins))
+
+
+class StreamingHistogram:
+    """Fixed bin histogram which is filled incrementally, one chunk of samples at
+    a time. Memory used is O(num_bins), irrespective of the number of samples."""
+
+    def __init__(self, num_bins: int, range: Tuple[float, float]) -> None:
+        low, high = range
+        if not high > low:
+            raise ValueError(f'range must be increasing, got {range}')
+        self.num_bins = num_bins
+        self.range = (float(low), float(high))
+        self.edges = np.linspace(low, high, num_bins + 1)
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+        self.num_outside = 0
+        self._scale = num_bins / (high - low)
+
+    def update(self, samples: np.ndarray) -> None:
+        """Add the samples to the histogram. Samples outside the range are only
+        counted in num_outside. Like np.histogram, the last bin is closed."""
+        low, high = self.range
+        samples = np.asarray(samples).ravel()
+        inside = (samples >= low) & (samples <= high)
+        bin_indices = ((samples[inside] - low) * self._scale).astype(np.int64)
+        np.minimum(bin_indices, self.num_bins - 1, out=bin_indices)
+        self.counts += np.bincount(bin_indices, minlength=self.num_bins)
+        self.num_outside += samples.size - bin_indices.size
+
+    def merge(self, other: 'StreamingHistogram') -> 'StreamingHistogram':
+        """Add the counts of another histogram with the same bins to this one."""
+        if self.num_bins != other.num_bins or self.range != other.range:
+            raise ValueError('Can only merge histograms with identical bins')
+        self.counts += other.counts
+        self.num_outside += other.num_outside
+        return self
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def density(self) -> np.ndarray:
+        """Normalized counts, such that the area under the histogram is 1, or
+        zeros while the histogram is empty."""
+        if self.total == 0:
+            return np.zeros(self.num_bins)
+        return self.counts / (self.total * np.diff(self.edges))
+
+    def plot(self, ax, density: bool = True) -> None:
+        weights = self.density if density else self.counts
+        ax.hist(self.edges[:-1], bins=self.edges, weights=weights)
+
+
+class TestStreamingHistogram(unittest.TestCase):
+    def test_matches_numpy(self):
+        samples = np.random.default_rng(0).normal(size=10_001)
+        hist = StreamingHistogram(20, (-2, 2))
+        for chunk in np.array_split(samples, 7):
+            hist.update(chunk)
+        expected, _ = np.histogram(samples, bins=20, range=(-2, 2))
+        np.testing.assert_array_equal(hist.counts, expected)
+        self.assertEqual(hist.total + hist.num_outside, samples.size)
+
+    def test_merge(self):
+        samples = np.random.default_rng(1).uniform(size=1000)
+        full, first, second = (StreamingHistogram(10, (0, 1)) for _ in range(3))
+        full.update(samples)
+        first.update(samples[:300])
+        second.update(samples[300:])
+        np.testing.assert_array_equal(first.merge(second).counts, full.counts)
+
+    def test_density_integrates_to_one(self):
+        hist = StreamingHistogram(13, (0, 3))
+        hist.update(np.random.default_rng(2).exponential(0.5, 1000).clip(0, 3))
+        self.assertAlmostEqual((hist.density * np.diff(hist.edges)).sum(), 1)
+
+    def test_density_of_empty_histogram(self):
+        hist = StreamingHistogram(5, (0, 1))
+        hist.update(np.array([-1.0, 2.0]))
+        np.testing.assert_array_equal(hist.density, np.zeros(5))
+
+
+class TestRangeSketch(unittest.TestCase):
+    def test_multinomial_gets_unit_bins(self):
+        sketch = RangeSketch()
+        for chunk in stream_samples('multinomial', 10_000, 3000, seed=0):
+            sketch.update(chunk)
+        self.assertEqual(sketch.range, (0, 4))
+        self.assertEqual(sketch.num_bins(), 4)
+
+    def test_range_covers_stream(self):
+        sketch = RangeSketch(capacity=100)
+        for chunk in stream_samples('gaussian', 10_000, 3000, seed=0):
+            sketch.update(chunk)
+        samples = np.concatenate(list(stream_samples('gaussian', 10_000, 3000, seed=0)))
+        self.assertEqual(sketch.range, (samples.min(), samples.max()))
+        self.assertEqual(sketch.subsample.size, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import numpy as np
+from typing import Iterator, Optional
+import unittest
+
+
+# number of samples generated per vectorized call. Large enough to amortize the
+# python overhead, small enough to keep the temporaries in a few tens of MBs.
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# number of uniform samples averaged to produce a single CLT data point
+CLT_SAMPLE_SIZE = 100
+
+
+def generate_data_point(sample_size: int = 10) -> int:
+    samples = np.random.uniform(0, 1, sample_size)
+    return samples.mean()
+
+
+def _chunk_sizes(num_samples: int, chunk_size: int) -> Iterator[int]:
+    """Yields the sizes of the consecutive chunks that add up to num_samples."""
+    if chunk_size <= 0:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+    for start in range(0, num_samples, chunk_size):
+        yield min(chunk_size, num_samples - start)
+
+
+def box_muller_chunk(size: int, mean: float = 0.0, std: float = 1.0, rng=None) -> np.ndarray:
+    """Generates 'size' normally distributed samples at once using the Box-Muller
+    transform.
+
+    Args:
+        size (int): Number of samples to generate.
+        mean (float, optional): Mean of the distribution. Defaults to 0.
+        std (float, optional): Standard deviation of the distribution. Defaults to 1.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Returns:
+        np.ndarray: Array of shape (size,) with the samples.
+    """
+    rng = np.random if rng is None else rng
+    num_pairs = (size + 1) // 2
+    # 1 - U lies in (0, 1], so that the log never sees a 0
+    radius = np.sqrt(-2 * np.log(1.0 - rng.uniform(0, 1, num_pairs)))
+    theta = 2 * np.pi * rng.uniform(0, 1, num_pairs)
+
+    samples = np.empty(2 * num_pairs)
+    np.multiply(radius, np.cos(theta), out=samples[:num_pairs])
+    np.multiply(radius, np.sin(theta), out=samples[num_pairs:])
+    samples = samples[:size]
+    samples *= std
+    samples += mean
+    return samples
+
+
+def stream_using_Box_Muller_Transform(num_samples: int, mean: float, variance: float,
+                                      chunk_size: int = DEFAULT_CHUNK_SIZE, rng=None) -> Iterator[np.ndarray]:
+    """Lazily generates num_samples normal samples, in chunks of at most chunk_size.
+    Only a single chunk is alive at a time, so the memory used does not depend
+    on num_samples.
+
+    Args:
+        num_samples (int): Total number of samples to generate.
+        mean (float): Mean of the distribution.
+        variance (float): Variance of the distribution.
+        chunk_size (int, optional): Maximum size of each yielded array.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Yields:
+        np.ndarray: The next chunk of samples.
+    """
+    std = np.sqrt(variance)
+    for size in _chunk_sizes(num_samples, chunk_size):
+        yield box_muller_chunk(size, mean, std, rng=rng)
+
+
+def generate_using_Box_Muller_Transform(num_samples: int, mean: float, variance: float,
+                                        chunk_size: int = DEFAULT_CHUNK_SIZE, rng=None) -> np.ndarray:
+    """Generates num_samples normal samples using the Box-Muller transform.
+
+    Args:
+        num_samples (int): Total number of samples to generate.
+        mean (float): Mean of the distribution.
+        variance (float): Variance of the distribution.
+        chunk_size (int, optional): Number of samples generated per vectorized call.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Returns:
+        np.ndarray: Array of shape (num_samples,) with the samples.
+    """
+    data_points = np.empty(num_samples)
+    start = 0
+    for chunk in stream_using_Box_Muller_Transform(num_samples, mean, variance, chunk_size, rng=rng):
+        data_points[start: start + chunk.shape[0]] = chunk
+        start += chunk.shape[0]
+    return data_points
+
+
+def clt_chunk(size: int, sample_size: int = CLT_SAMPLE_SIZE, rng=None) -> np.ndarray:
+    """Generates 'size' data points, each being the mean of sample_size uniform
+    samples from [0, 1]. This is the vectorized version of generate_data_point.
+
+    Args:
+        size (int): Number of data points to generate.
+        sample_size (int, optional): Number of uniform samples averaged per data point.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Returns:
+        np.ndarray: Array of shape (size,) with the data points.
+    """
+    rng = np.random if rng is None else rng
+    return rng.uniform(0, 1, (size, sample_size)).mean(axis=1)
+
+
+def stream_using_CLT(num_samples: int, mean: float, variance: float, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     sample_size: int = CLT_SAMPLE_SIZE, rng=None) -> Iterator[np.ndarray]:
+    """Lazily generates num_samples approximately normal samples using the CLT.
+    Unlike generate_using_CLT, the data points are standardized using the known
+    mean (1/2) and variance (1/(12 * sample_size)) of the mean of uniform
+    samples, as the empirical statistics are not available while streaming.
+
+    Args:
+        num_samples (int): Total number of samples to generate.
+        mean (float): Mean of the distribution.
+        variance (float): Variance of the distribution.
+        chunk_size (int, optional): Maximum number of data points per yielded array.
+          Each chunk allocates chunk_size * sample_size uniform samples.
+        sample_size (int, optional): Number of uniform samples averaged per data point.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Yields:
+        np.ndarray: The next chunk of samples.
+    """
+    scale = np.sqrt(variance * 12 * sample_size)
+    for size in _chunk_sizes(num_samples, chunk_size):
+        data_points = clt_chunk(size, sample_size, rng=rng)
+        data_points -= 0.5
+        data_points *= scale
+        data_points += mean
+        yield data_points
+
+
+def generate_using_CLT(num_samples: int, mean: float, variance: float, chunk_size: int = DEFAULT_CHUNK_SIZE // CLT_SAMPLE_SIZE,
+                       sample_size: int = CLT_SAMPLE_SIZE, rng=None) -> np.ndarray:
+    """Generates num_samples approximately normal samples using the CLT. The data
+    points are standardized using their empirical mean and std.
+
+    Args:
+        num_samples (int): Total number of samples to generate.
+        mean (float): Mean of the distribution.
+        variance (float): Variance of the distribution.
+        chunk_size (int, optional): Number of data points generated per vectorized call.
+        sample_size (int, optional): Number of uniform samples averaged per data point.
+        rng (optional): A numpy.random.Generator to draw from. Defaults to the
+          global np.random state.
+
+    Returns:
+        np.ndarray: Array of shape (num_samples,) with the samples.
+    """
+    data_points = np.empty(num_samples)
+    for start, size in zip(range(0, num_samples, chunk_size), _chunk_sizes(num_samples, chunk_size)):
+        data_points[start: start + size] = clt_chunk(size, sample_size, rng=rng)
+    return standardize(data_points, mean, variance)
+
+
+def standardize(data_points: np.ndarray, mean: float, variance: float) -> np.ndarray:
+    """Shifts and scales the data points to the given mean and variance, using
+    their empirical mean and std."""
+    data_points = (data_points - data_points.mean()) / data_points.std()
+
+    std = np.sqrt(variance)
+    data_points = data_points * std + mean
+
+    return data_points
+
+
+class TestBoxMuller(unittest.TestCase):
+    def test_shape_and_moments(self):
+        rng = np.random.default_rng(0)
+        data_points = generate_using_Box_Muller_Transform(200_001, mean=5, variance=9, chunk_size=30_000, rng=rng)
+        self.assertEqual(data_points.shape, (200_001,))
+        self.assertAlmostEqual(data_points.mean(), 5, places=1)
+        self.assertAlmostEqual(data_points.std(), 3, places=1)
+
+    def test_stream_matches_generate(self):
+        streamed = np.concatenate(list(stream_using_Box_Muller_Transform(
+            1001, 0, 1, chunk_size=100, rng=np.random.default_rng(1))))
+        generated = generate_using_Box_Muller_Transform(1001, 0, 1, chunk_size=100, rng=np.random.default_rng(1))
+        np.testing.assert_array_equal(streamed, generated)
+
+
+class TestCLT(unittest.TestCase):
+    def test_moments(self):
+        rng = np.random.default_rng(0)
+        data_points = generate_using_CLT(10_001, mean=5, variance=9, chunk_size=1000, rng=rng)
+        self.assertEqual(data_points.shape, (10_001,))
+        self.assertAlmostEqual(data_points.mean(), 5)
+        self.assertAlmostEqual(data_points.std(), 3)
+
+    def test_stream_moments(self):
+        rng = np.random.default_rng(0)
+        data_points = np.concatenate(list(stream_using_CLT(100_000, mean=5, variance=9, chunk_size=7000, rng=rng)))
+        self.assertEqual(data_points.shape, (100_000,))
+        self.assertAlmostEqual(data_points.mean(), 5, places=1)
+        self.assertAlmostEqual(data_points.std(), 3, places=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import pathlib
-from utils.utils import sqrt_sin, calculate_area, sqrt_sin_exp_minus_x2
+import sys
+from utils.utils import sqrt_sin, calculate_area, sqrt_sin_exp_minus_x2, integrate
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from common.monte_carlo import run_monte_carlo
+from utils.sampling import (SAMPLING_METHODS, TruncatedHalfNormalProposal, importance_terms, mc_integrate,
+                            uniform_terms)
 
 
 def print_areas(num_bins: int = 20_000) -> None:
@@ -9,25 +15,46 @@ def print_areas(num_bins: int = 20_000) -> None:
     print(f'Calculated Area of √sin(x)exp(-x2) over [0, pi] is: {calculate_area(sqrt_sin_exp_minus_x2, num_bins)}')
 
 
-def print_areas_using_sampling():
+def print_areas_with_error(method: str = 'gauss_kronrod', num_bins: int = 20_000) -> None:
+    for name, value_func in (('√sin(x)', sqrt_sin), ('√sin(x)exp(-x2)', sqrt_sin_exp_minus_x2)):
+        area, error = integrate(value_func, 0, np.pi, num_bins=num_bins, method=method)
+        print(f'Calculated Area of {name} over [0, pi] using {method} is: {area} ± {error:.2e}')
+
+
+# proposal of Part B, proportional to the exp(-x2) factor of the integrand
+PART_B_PROPOSAL = TruncatedHalfNormalProposal(sigma=1/np.sqrt(2), upper=np.pi)
+
+
+def sample_part_a(num_samples: int, rng) -> np.ndarray:
+    """Terms of the Part A estimator: pi * √sin(x) at x ~ U(0, pi)."""
+    return uniform_terms(sqrt_sin, 0, np.pi, num_samples, rng)
+
+
+def sample_part_b(num_samples: int, rng) -> np.ndarray:
+    """Terms of the Part B estimator: importance sampling with x ~ |N(0, 1/2)| truncated to [0, pi]."""
+    return importance_terms(sqrt_sin_exp_minus_x2, PART_B_PROPOSAL, num_samples, rng)
+
+
+def print_areas_using_sampling(num_samples: int = 10**4, num_workers: int = 1, seed: int = None) -> None:
     """Uses sampling method to print the areas of the functions"""
     # ------- Part A ---------
-    num_samples = 10**4
-    current_sum = 0
-    for _ in range(num_samples):
-        x = np.random.uniform(0, np.pi)
-        current_sum += sqrt_sin(x)
-    print(f'Area of √sin(x) over [0, pi] by sampling is: {current_sum / num_samples:.3f}')
-
+    stats = run_monte_carlo(sample_part_a, num_samples, num_workers=num_workers, seed=seed)
+    print(f'Area of √sin(x) over [0, pi] by sampling is: {stats.mean:.3f} ± {stats.std_error:.3f}')
 
     # ------- Part B ---------
-    num_samples = 10**4
-    current_sum = 0
-    for _ in range(num_samples):
-        x = abs(np.random.normal(0, 1/np.sqrt(2)))
-        x = np.clip(x, 0, np.pi)
-        current_sum += sqrt_sin_exp_minus_x2(x)
-    print(f'Area of √sin(x)exp(-x2) over [0, pi] by sampling is: {current_sum / num_samples:.3f}')
+    stats = run_monte_carlo(sample_part_b, num_samples, num_workers=num_workers, seed=seed)
+    print(f'Area of √sin(x)exp(-x2) over [0, pi] by sampling is: {stats.mean:.3f} ± {stats.std_error:.3f}')
+
+
+def print_sampling_methods_comparison(target_std_error: float = 1e-3, seed: int = None) -> None:
+    """Prints the number of samples each sampling method needs to reach target_std_error."""
+    for name, value_func in (('√sin(x)', sqrt_sin), ('√sin(x)exp(-x2)', sqrt_sin_exp_minus_x2)):
+        for method in SAMPLING_METHODS:
+            proposal = PART_B_PROPOSAL if value_func is sqrt_sin_exp_minus_x2 else None
+            estimate, std_error, num_samples = mc_integrate(
+                value_func, 0, np.pi, method=method, proposal=proposal,
+                target_std_error=target_std_error, rng=np.random.default_rng(seed))
+            print(f'Area of {name} over [0, pi] using {method} sampling is: {estimate:.5f} ± {std_error:.1e} ({num_samples} samples)')
 
 
 def main():
@@ -0,0 +1,161 @@
+"""Monte Carlo integration over an interval, with variance reduction.
+
+Every method draws samples in batches, and stops as soon as the standard error
+of the estimate falls below target_std_error (or max_samples is reached).
+    - 'uniform': plain Monte Carlo, x ~ U(a, b).
+    - 'importance': x ~ proposal, weighted by f(x) / proposal.pdf(x).
+    - 'antithetic': x and a + b - x are used together.
+    - 'stratified': one uniform sample in each of batch_size equal strata.
+    - 'sobol': scrambled Sobol points (randomized quasi Monte Carlo).
+The last two give one (low variance) estimate per batch, so the standard error
+is computed across batches instead of across samples.
+"""
+
+import numpy as np
+import pathlib
+import sys
+import unittest
+from scipy.special import erf, erfinv
+from scipy.stats import qmc
+from typing import Callable, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from common.monte_carlo import RunningStats
+
+
+SAMPLING_METHODS = ('uniform', 'importance', 'antithetic', 'stratified', 'sobol')
+
+
+class UniformProposal:
+    """Uniform density over [a, b]."""
+    def __init__(self, a: float, b: float) -> None:
+        self.a, self.b = a, b
+
+    def sample(self, size: int, rng) -> np.ndarray:
+        return rng.uniform(self.a, self.b, size)
+
+    def pdf(self, x: np.ndarray) -> np.ndarray:
+        return np.full(np.shape(x), 1.0 / (self.b - self.a))
+
+
+class TruncatedHalfNormalProposal:
+    """Density proportional to exp(-x^2 / (2 sigma^2)) over [0, upper]. With
+    sigma = 1/√2 and upper = pi, it is proportional to the exp(-x^2) factor of
+    √sin(x)exp(-x2), which is what makes it a good proposal for Part B."""
+    def __init__(self, sigma: float, upper: float = np.inf) -> None:
+        self.sigma = sigma
+        self.upper = upper
+        self._mass = erf(upper / (sigma * np.sqrt(2)))
+
+    def sample(self, size: int, rng) -> np.ndarray:
+        # inverse of the cdf erf(x / (sigma √2)) / mass
+        return self.sigma * np.sqrt(2) * erfinv(rng.uniform(0, 1, size) * self._mass)
+
+    def pdf(self, x: np.ndarray) -> np.ndarray:
+        density = np.sqrt(2 / np.pi) / self.sigma * np.exp(-x**2 / (2 * self.sigma**2)) / self._mass
+        return np.where((x >= 0) & (x <= self.upper), density, 0.0)
+
+
+def uniform_terms(value_func: Callable, a: float, b: float, size: int, rng) -> np.ndarray:
+    return (b - a) * value_func(rng.uniform(a, b, size))
+
+
+def importance_terms(value_func: Callable, proposal, size: int, rng) -> np.ndarray:
+    x = proposal.sample(size, rng)
+    return value_func(x) / proposal.pdf(x)
+
+
+def antithetic_terms(value_func: Callable, a: float, b: float, size: int, rng) -> np.ndarray:
+    """Each term averages a pair of negatively correlated samples, x and a + b - x."""
+    x = rng.uniform(a, b, size)
+    return (b - a) * (value_func(x) + value_func(a + b - x)) / 2
+
+
+def stratified_estimate(value_func: Callable, a: float, b: float, size: int, rng) -> float:
+    x = a + (b - a) * (np.arange(size) + rng.uniform(0, 1, size)) / size
+    return (b - a) * value_func(x).mean()
+
+
+def sobol_estimate(value_func: Callable, a: float, b: float, size: int, rng) -> float:
+    """size should be a power of 2, for the balance properties of the Sobol points."""
+    points = qmc.Sobol(d=1, scramble=True, seed=rng).random(size)[:, 0]
+    return (b - a) * value_func(a + (b - a) * points).mean()
+
+
+def mc_integrate(value_func: Callable, a: float, b: float, method: str = 'uniform', proposal=None,
+                 batch_size: int = 2**12, max_samples: int = 10**7, target_std_error: float = None,
+                 rng=None) -> Tuple[float, float, int]:
+    """Estimates the integral of value_func over [a, b] by sampling.
+
+    Args:
+        value_func (Callable): Function to be integrated, evaluated over whole arrays.
+        a (float): Start of the domain.
+        b (float): End of the domain.
+        method (str, optional): One of 'uniform', 'importance', 'antithetic',
+          'stratified', 'sobol'. Defaults to 'uniform'.
+        proposal (optional): Proposal of 'importance', with sample(size, rng) and
+          pdf(x) methods. Its support must cover [a, b]. Defaults to UniformProposal(a, b).
+        batch_size (int, optional): Number of evaluations of value_func per batch
+          (antithetic pairs count as two). Defaults to 2**12.
+        max_samples (int, optional): Maximum number of evaluations of value_func.
+        target_std_error (float, optional): Stop once the standard error is below it.
+        rng (optional): A numpy.random.Generator.
+
+    Returns:
+        Tuple[float, float, int]: The estimate, its standard error, and the number
+          of evaluations of value_func used.
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f'method must be one of {SAMPLING_METHODS}, got {method}')
+    rng = np.random.default_rng() if rng is None else rng
+    proposal = UniformProposal(a, b) if proposal is None else proposal
+
+    stats, num_evaluations = RunningStats(), 0
+    while num_evaluations + batch_size <= max(max_samples, batch_size):
+        if method == 'uniform':
+            stats.merge(RunningStats.from_samples(uniform_terms(value_func, a, b, batch_size, rng)))
+        elif method == 'importance':
+            stats.merge(RunningStats.from_samples(importance_terms(value_func, proposal, batch_size, rng)))
+        elif method == 'antithetic':
+            stats.merge(RunningStats.from_samples(antithetic_terms(value_func, a, b, batch_size // 2, rng)))
+        elif method == 'stratified':
+            stats.merge(RunningStats.from_samples([stratified_estimate(value_func, a, b, batch_size, rng)]))
+        else:
+            stats.merge(RunningStats.from_samples([sobol_estimate(value_func, a, b, batch_size, rng)]))
+        num_evaluations += batch_size
+
+        if target_std_error is not None and stats.std_error <= target_std_error:
+            break
+    return stats.mean, stats.std_error, num_evaluations
+
+
+class TestMCIntegrate(unittest.TestCase):
+    def test_all_methods_estimate_sin(self):
+        for method in SAMPLING_METHODS:
+            estimate, std_error, _ = mc_integrate(np.sin, 0, np.pi, method=method, max_samples=2**16,
+                                                  rng=np.random.default_rng(0))
+            self.assertLess(abs(estimate - 2), 5 * std_error, method)
+
+    def test_variance_reduction_uses_fewer_samples(self):
+        # antithetic variates only help for monotone integrands
+        used = {method: mc_integrate(np.exp, 0, 1, method=method, target_std_error=1e-3,
+                                     rng=np.random.default_rng(0))[2] for method in SAMPLING_METHODS}
+        for method in ('antithetic', 'stratified', 'sobol'):
+            self.assertLess(used[method], used['uniform'], method)
+
+    def test_truncated_half_normal_proposal(self):
+        proposal = TruncatedHalfNormalProposal(sigma=1 / np.sqrt(2), upper=np.pi)
+        samples = proposal.sample(10_000, np.random.default_rng(0))
+        self.assertTrue(np.all((samples >= 0) & (samples <= np.pi)))
+        x = np.linspace(0, np.pi, 10_001)
+        self.assertAlmostEqual(proposal.pdf(x).mean() * np.pi, 1, places=3)
+
+        # integral of exp(-x^2) over [0, pi] has zero variance under this proposal
+        estimate, std_error, _ = mc_integrate(lambda x: np.exp(-x**2), 0, np.pi, method='importance',
+                                              proposal=proposal, max_samples=1000, rng=np.random.default_rng(0))
+        self.assertAlmostEqual(estimate, np.sqrt(np.pi) / 2 * erf(np.pi))
+        self.assertAlmostEqual(std_error, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import numpy as np
-from typing import Callable
+from typing import Callable, Tuple
 import logging
 import sys
 import unittest
@@ -20,7 +20,137 @@ def sqrt_sin(x: float) -> float:
     return np.sqrt(np.sin(x))
 
 
-def calculate_area(value_func: Callable, num_bins: int = 20_000) -> float:
+# number of grid points evaluated per call of the integrand on the fixed grid methods
+DEFAULT_CHUNK_SIZE = 1_000_000
+QUADRATURE_METHODS = ('rectangle', 'trapezoid', 'simpson', 'gauss_kronrod')
+
+# 15 point Kronrod nodes (non-negative half) and weights, and the weights of the 7 point
+# Gauss rule embedded in them (at the odd indices of the nodes). Taken from QUADPACK qk15.
+_KRONROD_NODES = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.000000000000000000000000000000000])
+_KRONROD_WEIGHTS = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+_GAUSS_WEIGHTS = np.array([
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327])
+
+
+def vectorize_integrand(value_func: Callable) -> Callable:
+    """Returns a version of value_func which can be evaluated over a whole array.
+    Functions built from numpy ufuncs are returned as they are; np.vectorize is
+    only used for the ones which fail on (or do not map over) an array input."""
+    probe = np.linspace(0.1, 0.9, 3)
+    try:
+        if np.shape(value_func(probe)) == probe.shape:
+            return value_func
+    except (TypeError, ValueError):
+        pass
+    return np.vectorize(value_func, otypes=[float])
+
+
+def _fixed_grid_sums(value_func: Callable, a: float, b: float, num_bins: int, method: str, chunk_size: int) -> Tuple[float, float]:
+    """Weighted sums of value_func over the num_bins+1 grid points, for the rule on
+    the full grid and on the grid with every other point (used for the error
+    estimate). The grid is evaluated chunk_size points at a time."""
+    fine_sum, coarse_sum = 0.0, 0.0
+    for start in range(0, num_bins + 1, chunk_size):
+        indices = np.arange(start, min(start + chunk_size, num_bins + 1))
+        values = value_func(a + (b - a) * indices / num_bins)
+        coarse = indices % 2 == 0
+        if method == 'rectangle':
+            # right end point of each bin
+            fine_weights = (indices > 0).astype(float)
+            coarse_weights = coarse & (indices > 0)
+        elif method == 'trapezoid':
+            fine_weights = np.where((indices == 0) | (indices == num_bins), 0.5, 1.0)
+            coarse_weights = coarse * fine_weights
+        else:
+            fine_weights = np.where((indices == 0) | (indices == num_bins), 1.0, np.where(indices % 2 == 1, 4.0, 2.0))
+            coarse_weights = np.where((indices == 0) | (indices == num_bins), 1.0, np.where(indices % 4 == 2, 4.0, 2.0)) * coarse
+        fine_sum += float(np.dot(fine_weights, values))
+        coarse_sum += float(np.dot(coarse_weights, values))
+    return fine_sum, coarse_sum
+
+
+def _gauss_kronrod(value_func: Callable, a: float, b: float, tol: float, max_intervals: int) -> Tuple[float, float]:
+    """Adaptive G7-K15 quadrature. Every round evaluates all the unconverged
+    intervals at once, keeps the ones whose error is within their share of tol,
+    and bisects the others."""
+    nodes = np.concatenate([-_KRONROD_NODES[:-1], _KRONROD_NODES[::-1]])
+    kronrod_weights = np.concatenate([_KRONROD_WEIGHTS[:-1], _KRONROD_WEIGHTS[::-1]])
+    gauss_weights = np.zeros(15)
+    gauss_weights[1::2] = np.concatenate([_GAUSS_WEIGHTS[:-1], _GAUSS_WEIGHTS[::-1]])
+
+    lows, highs = np.array([a], dtype=float), np.array([b], dtype=float)
+    area, error = 0.0, 0.0
+    while lows.size:
+        centers, half_widths = (lows + highs) / 2, (highs - lows) / 2
+        values = value_func(centers[:, None] + half_widths[:, None] * nodes[None, :])
+        kronrod = half_widths * (values @ kronrod_weights)
+        errors = np.abs(kronrod - half_widths * (values @ gauss_weights))
+
+        converged = errors <= tol * (highs - lows) / (b - a)
+        if lows.size * 2 > max_intervals:
+            converged[:] = True
+        area += kronrod[converged].sum()
+        error += errors[converged].sum()
+
+        lows, highs, centers = lows[~converged], highs[~converged], centers[~converged]
+        lows, highs = np.concatenate([lows, centers]), np.concatenate([centers, highs])
+    return float(area), float(error)
+
+
+def integrate(value_func: Callable, a: float, b: float, num_bins: int = 20_000, method: str = 'trapezoid',
+              tol: float = 1e-10, chunk_size: int = DEFAULT_CHUNK_SIZE, max_intervals: int = 100_000) -> Tuple[float, float]:
+    """Integrates value_func over [a, b], evaluating it over whole arrays of points
+    at once.
+
+    Args:
+        value_func (Callable): Function to be integrated. Scalar only functions are
+          wrapped with np.vectorize.
+        a (float): Start of the domain.
+        b (float): End of the domain.
+        num_bins (int, optional): Number of bins of the fixed grid methods. Must be
+          even for 'simpson'. Defaults to 20_000.
+        method (str, optional): One of 'rectangle' (right end points), 'trapezoid',
+          'simpson' or the adaptive 'gauss_kronrod'. Defaults to 'trapezoid'.
+        tol (float, optional): Absolute error targeted by 'gauss_kronrod'.
+        chunk_size (int, optional): Maximum number of grid points evaluated at once.
+        max_intervals (int, optional): Maximum number of intervals of 'gauss_kronrod'.
+
+    Returns:
+        Tuple[float, float]: The area, and an estimate of the absolute error. For
+          the fixed grid methods, the error is estimated by comparing with the same
+          rule on half the bins (nan if num_bins is odd).
+    """
+    if method not in QUADRATURE_METHODS:
+        raise ValueError(f'method must be one of {QUADRATURE_METHODS}, got {method}')
+    value_func = vectorize_integrand(value_func)
+    if method == 'gauss_kronrod':
+        return _gauss_kronrod(value_func, a, b, tol, max_intervals)
+    if method == 'simpson' and num_bins % 2:
+        raise ValueError(f'simpson needs an even number of bins, got {num_bins}')
+
+    bin_width = (b - a) / num_bins
+    fine_sum, coarse_sum = _fixed_grid_sums(value_func, a, b, num_bins, method, chunk_size)
+    if method == 'simpson':
+        area, coarse_area, order = fine_sum * bin_width / 3, coarse_sum * 2 * bin_width / 3, 4
+    else:
+        area, coarse_area, order = fine_sum * bin_width, coarse_sum * 2 * bin_width, 1 if method == 'rectangle' else 2
+    if num_bins % 2 or (method == 'simpson' and num_bins % 4):
+        return area, np.nan
+    # Richardson: error(h) ~ (A(h) - A(2h)) / (2^order - 1)
+    return area, abs(area - coarse_area) / (2**order - 1)
+
+
+def calculate_area(value_func: Callable, num_bins: int = 20_000, method: str = 'rectangle',
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
     """Calculates the approximate area swapped by value_func over the domain [0, pi]. Divides
     the domain into num_bins bins and calculates the area of each rectangle.
 
@@ -28,18 +158,14 @@ def calculate_area(value_func: Callable, num_bins: int = 20_000) -> float:
         value_func (Callable): Function whose area is to be calculated.
         num_bins (int, optional): Number of bins in which the domain is to be
           divided. Defaults to 20_000.
+        method (str, optional): Quadrature rule, see integrate. Defaults to
+          'rectangle', ie. the height of each bin is the value at its right end.
+        chunk_size (int, optional): Maximum number of points evaluated at once.
 
     Returns:
         float: The area under the curve created by value_func in domain [0, pi].
     """
-
-    bins = np.linspace(start=0, stop=np.pi, num=num_bins+1)
-    values = np.zeros(num_bins)
-
-    for index, value in enumerate(bins[1:], start=0):
-        values[index] = value_func(value) * np.pi / num_bins
-
-    return values.sum()
+    return integrate(value_func, 0, np.pi, num_bins=num_bins, method=method, chunk_size=chunk_size)[0]
 
 
 class TestCalculateArea(unittest.TestCase):
@@ -47,6 +173,28 @@ class TestCalculateArea(unittest.TestCase):
         const_func = lambda x: 2
         self.assertAlmostEqual(calculate_area(const_func, num_bins=20_000), 2 * np.pi)
 
+    def test_matches_loop(self):
+        num_bins = 1000
+        expected = sum(sqrt_sin(x) * np.pi / num_bins for x in np.linspace(0, np.pi, num_bins + 1)[1:])
+        self.assertAlmostEqual(calculate_area(sqrt_sin, num_bins=num_bins), expected)
+        self.assertAlmostEqual(calculate_area(sqrt_sin, num_bins=num_bins, chunk_size=77), expected)
+
+    def test_methods_agree(self):
+        exact = 2.0  # integral of sin(x) over [0, pi]
+        for method in QUADRATURE_METHODS:
+            area, error = integrate(np.sin, 0, np.pi, num_bins=1000, method=method, chunk_size=333)
+            self.assertAlmostEqual(area, exact, places=5)
+            self.assertLess(abs(area - exact), 10 * error + 1e-12)
+
+    def test_gauss_kronrod_singular_derivative(self):
+        area, error = integrate(sqrt_sin, 0, np.pi, method='gauss_kronrod', tol=1e-10)
+        self.assertAlmostEqual(area, 2.396280469471184, places=8)
+        self.assertLess(error, 1e-9)
+
+    def test_scalar_only_function(self):
+        scalar_func = lambda x: float(x) ** 2
+        self.assertAlmostEqual(integrate(scalar_func, 0, 1, num_bins=100, method='simpson')[0], 1 / 3)
+
 
 class TestSqrtSin(unittest.TestCase):
     def test_multiples_of_pi(self):
@@ -0,0 +1,202 @@
+"""Closed form analysis of absorbing Markov chains using the fundamental matrix.
+
+For a transition matrix arranged as P = [[Q, R], [0, I]], where Q holds the
+transitions among transient states and R the transitions from transient to
+absorbing states, the fundamental matrix N = (I - Q)^-1 = sum_n Q^n gives
+    - N[i, j]: expected number of visits to j starting from i,
+    - B = N R: probability of being absorbed in each absorbing state,
+    - t = N 1: expected number of steps before absorption.
+Instead of inverting (I - Q), the linear systems (I - Q) X = Y are solved, either
+densely, with an ILU preconditioned BiCGSTAB iteration on the sparse matrix, or
+by summing the power series until it converges.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import unittest
+
+from data_loader.transition_probs import get_transition_probs
+
+
+# chains with more states than this are solved with sparse methods under method='auto'
+DENSE_STATES_LIMIT = 2_000
+METHODS = ('auto', 'direct', 'sparse', 'power')
+
+
+def absorbing_states(P) -> np.ndarray:
+    """Returns the indices of the states which can not be left, ie. P[i, i] == 1."""
+    return np.flatnonzero(np.isclose(P.diagonal(), 1))
+
+
+def transient_states(P) -> np.ndarray:
+    """Returns the indices of the states which are not absorbing."""
+    return np.setdiff1d(np.arange(P.shape[0]), absorbing_states(P))
+
+
+def _resolve_method(P, method: str) -> str:
+    if method not in METHODS:
+        raise ValueError(f'method must be one of {METHODS}, got {method}')
+    if method == 'auto':
+        return 'sparse' if sp.issparse(P) or P.shape[0] > DENSE_STATES_LIMIT else 'direct'
+    return method
+
+
+def _submatrix(P, rows: np.ndarray, cols: np.ndarray):
+    if sp.issparse(P):
+        return sp.csr_matrix(P)[rows][:, cols]
+    return P[np.ix_(rows, cols)]
+
+
+def solve_fundamental(P, Y: np.ndarray, method: str = 'auto', tol: float = 1e-12, max_iter: int = 10**7) -> np.ndarray:
+    """Solves (I - Q) X = Y, ie. returns X = N Y, where Q is the transient part of P.
+
+    Args:
+        P (np.ndarray or scipy.sparse matrix): The (num_states, num_states) transition matrix.
+        Y (np.ndarray): Array of shape (num_transient,) or (num_transient, k).
+        method (str, optional): 'direct' for a dense solve, 'sparse' for BiCGSTAB
+          iterations on the sparse (I - Q), preconditioned with its incomplete LU
+          factorization, 'power' for summing the series Y + Q Y + Q^2 Y + ...
+          until the added term falls below tol. 'auto' picks 'direct' for small
+          dense chains and 'sparse' otherwise. Defaults to 'auto'.
+        tol (float, optional): Convergence tolerance: relative residual of the
+          'sparse' iterations, size of the last added term of the power series.
+        max_iter (int, optional): Maximum number of iterations ('sparse') or terms
+          of the power series ('power').
+
+    Returns:
+        np.ndarray: X, with the same shape as Y.
+    """
+    transient = transient_states(P)
+    Q = _submatrix(P, transient, transient)
+    method = _resolve_method(P, method)
+
+    if method == 'direct':
+        Q = Q.toarray() if sp.issparse(Q) else Q
+        return np.linalg.solve(np.identity(Q.shape[0]) - Q, Y)
+    elif method == 'sparse':
+        A = (sp.identity(Q.shape[0], format='csc') - sp.csc_matrix(Q))
+        return _solve_iterative(A, np.asarray(Y, dtype=float), tol, max_iter)
+
+    # power series: sum_n Q^n Y, only ever doing matrix-vector products
+    term = np.array(Y, dtype=float)
+    total = term.copy()
+    for _ in range(max_iter):
+        term = Q @ term
+        total += term
+        if np.abs(term).max() < tol:
+            return total
+    raise RuntimeError(f'Power series did not converge to tol={tol} in {max_iter} iterations')
+
+
+def _solve_iterative(A: sp.csc_matrix, Y: np.ndarray, tol: float, max_iter: int) -> np.ndarray:
+    """Solves A X = Y column by column with BiCGSTAB, preconditioned by an
+    incomplete LU factorization of A which is computed once for all the columns."""
+    ilu = spla.spilu(A, drop_tol=1e-6, fill_factor=10)
+    preconditioner = spla.LinearOperator(A.shape, ilu.solve)
+    columns = Y.reshape(Y.shape[0], -1)
+    X = np.empty_like(columns)
+    for k in range(columns.shape[1]):
+        X[:, k], info = spla.bicgstab(A, columns[:, k], x0=ilu.solve(columns[:, k]), rtol=tol, atol=0.0,
+                                      maxiter=max_iter, M=preconditioner)
+        if info != 0:
+            raise RuntimeError(f'BiCGSTAB did not converge to tol={tol} (info={info})')
+    return X.reshape(Y.shape)
+
+
+def absorption_probabilities(P, method: str = 'auto', **kwargs) -> np.ndarray:
+    """Returns B, where B[i, k] is the probability that the chain started at the
+    i-th transient state gets absorbed in the k-th absorbing state. Rows and columns
+    follow the order of transient_states(P) and absorbing_states(P)."""
+    R = _submatrix(P, transient_states(P), absorbing_states(P))
+    R = R.toarray() if sp.issparse(R) else R
+    return solve_fundamental(P, R, method=method, **kwargs)
+
+
+def expected_hitting_times(P, method: str = 'auto', **kwargs) -> np.ndarray:
+    """Returns t, where t[i] is the expected number of steps before the chain
+    started at the i-th transient state gets absorbed."""
+    return solve_fundamental(P, np.ones(len(transient_states(P))), method=method, **kwargs)
+
+
+def hitting_probability(P, start: int, target: int, method: str = 'auto', **kwargs) -> float:
+    """Returns the probability that the chain started at 'start' ever reaches 'target'.
+    The target is made absorbing, and the absorption probability into it is returned."""
+    if start == target:
+        return 1.0
+    P = sp.lil_matrix(P) if sp.issparse(P) else np.array(P, dtype=float)
+    P[target, :] = 0
+    P[target, target] = 1
+    P = sp.csr_matrix(P) if sp.issparse(P) else P
+
+    transient, absorbing = transient_states(P), absorbing_states(P)
+    if start not in transient:
+        return 0.0
+    # solve only for the column of the target, instead of all of B
+    R_target = _submatrix(P, transient, np.array([target]))
+    R_target = R_target.toarray() if sp.issparse(R_target) else R_target
+    X = solve_fundamental(P, R_target.ravel(), method=method, **kwargs)
+    return float(X[np.searchsorted(transient, start)])
+
+
+def random_walk_chain(num_states: int, p: float) -> sp.csr_matrix:
+    """Sparse chain of the walk on 0..num_states-1 which moves up with probability
+    p and down otherwise, absorbed at both ends."""
+    inner = np.arange(1, num_states - 1)
+    rows = np.concatenate([inner, inner, [0, num_states - 1]])
+    cols = np.concatenate([inner + 1, inner - 1, [0, num_states - 1]])
+    data = np.concatenate([np.full(inner.size, p), np.full(inner.size, 1 - p), [1.0, 1.0]])
+    return sp.csr_matrix((data, (rows, cols)), shape=(num_states, num_states))
+
+
+class TestAbsorption(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.P = get_transition_probs()
+
+    def brute_force_hitting_prob(self, start, target, num_steps=2_000):
+        # the original approach: sum the probability of being at target at each step,
+        # after making the target lead to an absorbing state
+        P = self.P.copy()
+        P[target, :] = 0
+        P[target, -1] = 1
+        prob, total = np.eye(len(P))[start], 0
+        for _ in range(num_steps):
+            prob = prob @ P
+            total += prob[target]
+        return total
+
+    def test_state_8_from_0(self):
+        expected = self.brute_force_hitting_prob(0, 8)
+        for method in ('direct', 'sparse', 'power'):
+            self.assertAlmostEqual(hitting_probability(self.P, 0, 8, method=method), expected)
+            self.assertAlmostEqual(hitting_probability(sp.csr_matrix(self.P), 0, 8, method=method), expected)
+
+    def test_absorption_rows_sum_to_one(self):
+        for method in ('direct', 'sparse', 'power'):
+            B = absorption_probabilities(self.P, method=method)
+            np.testing.assert_allclose(B.sum(axis=1), 1)
+
+    def test_hitting_times_match_power_series(self):
+        np.testing.assert_allclose(
+            expected_hitting_times(self.P, method='direct'),
+            expected_hitting_times(self.P, method='power'))
+
+    def test_sparse_matches_direct(self):
+        P = random_walk_chain(3_000, 0.45)
+        np.testing.assert_allclose(expected_hitting_times(P, method='sparse'),
+                                   expected_hitting_times(P.toarray(), method='direct'), rtol=1e-8)
+
+    def test_large_sparse_chain(self):
+        # gambler's ruin with a fair coin: from i, the walk ends at the top with probability i / (n - 1)
+        num_states = 100_000
+        B = absorption_probabilities(random_walk_chain(num_states, 0.5))
+        np.testing.assert_allclose(B[:, 1], np.arange(1, num_states - 1) / (num_states - 1), atol=1e-6)
+        np.testing.assert_allclose(B.sum(axis=1), 1)
+
+    def test_unreachable_target(self):
+        self.assertEqual(hitting_probability(self.P, 3, 2), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
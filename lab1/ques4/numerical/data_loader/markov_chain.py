@@ -0,0 +1,128 @@
+import numpy as np
+import unittest
+from collections import OrderedDict
+from typing import Optional, Union
+
+from data_loader.transition_probs import get_transition_probs
+
+
+class MarkovChain:
+    """Answers n step queries on a Markov chain with transition matrix P. P^n is
+    computed by exponentiation by squaring, starting from the closest cached
+    power below n, so that repeated and nearby queries only cost a few matrix
+    products. The squares P^(2^k) are always kept, the other powers live in an
+    LRU cache of 'cache_size' entries."""
+
+    def __init__(self, transition_probs: Optional[np.ndarray] = None, cache_size: int = 32) -> None:
+        """Initialize the chain.
+
+        Args:
+            transition_probs (np.ndarray, optional): Row stochastic transition matrix.
+              Defaults to get_transition_probs().
+            cache_size (int, optional): Maximum number of cached powers, other
+              than the squares. Defaults to 32.
+        """
+        self.P = get_transition_probs() if transition_probs is None else np.asarray(transition_probs, dtype=float)
+        self.num_states = self.P.shape[0]
+        self.cache_size = cache_size
+        self._squares = [self.P]
+        self._cache = OrderedDict()
+        self._absorbing_chains = {}
+
+    def _square(self, k: int) -> np.ndarray:
+        """Returns P^(2^k)."""
+        while len(self._squares) <= k:
+            self._squares.append(self._squares[-1] @ self._squares[-1])
+        return self._squares[k]
+
+    def _remember(self, n: int, matrix: np.ndarray) -> None:
+        self._cache[n] = matrix
+        self._cache.move_to_end(n)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def power(self, n: int) -> np.ndarray:
+        """Returns P^n."""
+        if n < 0:
+            raise ValueError(f'n must be non-negative, got {n}')
+        if n in self._cache:
+            self._cache.move_to_end(n)
+            return self._cache[n]
+        if n & (n - 1) == 0 and n > 0:
+            return self._square(n.bit_length() - 1)
+
+        # start from the closest cached power below n, and multiply in the remaining bits
+        base = max((m for m in self._cache if m < n), default=0)
+        result = self._cache[base] if base else np.identity(self.num_states)
+        remainder, k = n - base, 0
+        while remainder:
+            if remainder & 1:
+                result = result @ self._square(k)
+            remainder >>= 1
+            k += 1
+        self._remember(n, result)
+        return result
+
+    def _as_distributions(self, initial: Union[int, np.ndarray]) -> np.ndarray:
+        if np.isscalar(initial):
+            distribution = np.zeros(self.num_states)
+            distribution[initial] = 1
+            return distribution
+        return np.asarray(initial, dtype=float)
+
+    def distribution(self, initial: Union[int, np.ndarray], n: int) -> np.ndarray:
+        """Returns the distribution over the states after n steps.
+
+        Args:
+            initial (int or np.ndarray): The starting state, a distribution of
+              shape (num_states,), or a batch of distributions of shape
+              (batch, num_states), all of which are evaluated in one matmul.
+            n (int): Number of steps.
+
+        Returns:
+            np.ndarray: Distribution(s) with the same shape as the initial ones.
+        """
+        return self._as_distributions(initial) @ self.power(n)
+
+    def absorbing_chain(self, state: int) -> 'MarkovChain':
+        """Returns the chain where 'state' can not be left. The chains are kept,
+        along with their cached powers."""
+        if state not in self._absorbing_chains:
+            P = self.P.copy()
+            P[state, :] = 0
+            P[state, state] = 1
+            self._absorbing_chains[state] = MarkovChain(P, cache_size=self.cache_size)
+        return self._absorbing_chains[state]
+
+    def prob_reached_by(self, initial: Union[int, np.ndarray], state: int, n: int) -> Union[float, np.ndarray]:
+        """Returns the probability of having been in 'state' at least once within
+        the first n steps, ie. of being in 'state' after n steps of the chain
+        where 'state' is absorbing. Supports batches of initial distributions."""
+        return self.absorbing_chain(state).distribution(initial, n)[..., state]
+
+
+class TestMarkovChain(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.chain = MarkovChain(cache_size=4)
+
+    def test_power_matches_matrix_power(self):
+        for n in (0, 1, 2, 7, 40, 41, 64, 1000, 39):
+            np.testing.assert_allclose(self.chain.power(n), np.linalg.matrix_power(self.chain.P, n), atol=1e-12)
+        self.assertLessEqual(len(self.chain._cache), 4)
+
+    def test_batched_distribution(self):
+        initial = np.eye(self.chain.num_states)[[0, 3, 5]]
+        batch = self.chain.distribution(initial, 13)
+        for row, state in zip(batch, (0, 3, 5)):
+            np.testing.assert_allclose(row, self.chain.distribution(state, 13))
+
+    def test_prob_reached_by(self):
+        # from state 7, state 8 is reached within n steps unless the die never rolls a 1
+        for n in (1, 5, 20):
+            self.assertAlmostEqual(self.chain.prob_reached_by(7, 8, n), 1 - (5/6)**n)
+        self.assertAlmostEqual(self.chain.prob_reached_by(0, 8, 10_000), 0.125)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,40 +1,57 @@
 import numpy as np
+import pathlib
+import sys
 import unittest
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[3]))
+from common.board import Board
 
-def get_transition_probs():
+
+def get_transition_probs(board: Board = None):
     """Retuns the probability distribution of the transition from one state to another
-    for the given problem statement depending on the result of the roll of the die."""
-    # 10 states, and corresponding transition probabilities
+    for the given problem statement depending on the result of the roll of the die.
+
+    The transitions are those of the board (by default, the board of the problem
+    statement: 9 cells, dead cells 2 and 4), plus one extra absorbing state: from
+    the goal, let us assume we can not stay at the goal, and move to the extra
+    state instead. This would help in calculating the probability of reaching the
+    goal only from other states.
+
+    Args:
+        board (Board, optional): The board. Defaults to Board().
+
+    Returns:
+        np.ndarray: The dense (num_cells + 1, num_cells + 1) transition matrix.
+    """
+    board = Board() if board is None else board
+    num_cells = board.num_cells
+    P = np.zeros((num_cells + 1, num_cells + 1))
+    P[:num_cells, :num_cells] = board.transition_matrix().toarray()
+
+    P[board.goal, :] = 0
+    P[board.goal, num_cells] = 1
+    P[num_cells, num_cells] = 1
+
+    return P
+
 
-    # In general, player remains in the same state iff the dice roll is 3, 4, 5, 6
+def _problem_statement_transition_probs():
+    """The hand written transition matrix of the problem statement, checked against
+    the one built from the default board."""
     same_place_prob = np.full(10, 4/6)
-    # state 9 is the terminal state, so all transitions from it go to itself
-    # from state 7, all rolls result in same state except 1 (which moves to state 8)
     same_place_prob[7:] = [5/6, 0, 1]
     P = np.diag(same_place_prob)
-
-    # fill the general probability transitions
     for i in range(9):
-        if i+1 < 9: # if die rolls to 1, it goes to immediate next state
+        if i+1 < 9:
             P[i, i+1] = 1/6
-        if i+2 < 9: # if die rolls to 2, it goes to second next state
-            P[i, i+2] = 1/6
-        # for all other cases, it stays at its own place
-
-    dead_states = [2, 4]
-    for i in dead_states:
-        P[i,i] = 1 # can't escape from the same place
-        if i+1 < 9: # can't go to next state from dead states
-            P[i,i+1] = 0
         if i+2 < 9:
-            P[i,i+2] = 0
-
-    # from 8, let us assume we can not reach 8. This would help in calculating 
-    # the probability of reaching 8 only from other states
+            P[i, i+2] = 1/6
+    for i in [2, 4]:
+        P[i, i] = 1
+        P[i, i+1] = 0
+        P[i, i+2] = 0
     P[8, 8] = 0
     P[8, 9] = 1
-
     return P
 
 
@@ -54,6 +71,9 @@ class TestTransitionProbs(unittest.TestCase):
             for val in row:
                 self.assertTrue(0 <= val <= 1)
 
+    def test_matches_problem_statement(self):
+        np.testing.assert_allclose(self.P, _problem_statement_transition_probs())
+
 
 if __name__ == '__main__':
     unittest.main()
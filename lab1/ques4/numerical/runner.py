@@ -1,7 +1,14 @@
 import numpy as np
 from data_loader.transition_probs import get_transition_probs
-from tqdm import tqdm
+from data_loader.markov_chain import MarkovChain
+from data_loader.absorption import hitting_probability, expected_hitting_times, transient_states
 import logging
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from common.board import Board
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -10,16 +17,25 @@ np.set_printoptions(linewidth=np.inf)
 
 if __name__ == '__main__':
     transition_probs = get_transition_probs()
-    initial_prob = np.zeros(transition_probs.shape[0])
-    initial_prob[0] = 1
-    probs_sum = 0
 
-    current_prob = np.identity(n=initial_prob.shape[0], like=transition_probs)
-    INFINITY = 10**7
+    # The probability of ending at state 8 is the sum over all n of the probability
+    # of being at state 8 after n steps, ie. the (0, 8) entry of the fundamental
+    # matrix (I - Q)^-1. It is solved for directly, instead of summing P^n.
+    for method in ('direct', 'power'):
+        start_time = time.perf_counter()
+        probs_sum = hitting_probability(transition_probs, start=0, target=8, method=method)
+        logger.info(f'{method} solve took {1000 * (time.perf_counter() - start_time):.3f} ms')
+        print(f'Probability of ending at state 8 is ({method}): {probs_sum}')
 
-    for i in tqdm(range(INFINITY), desc='Summing prob of ending at 8th state in iteration'):
-        current_prob = current_prob @ transition_probs
-        probs_sum += (initial_prob @ current_prob)[8]
+    hitting_times = expected_hitting_times(transition_probs)
+    print(f'Expected number of steps before the game ends, from each of the states {transient_states(transition_probs)}: {hitting_times}')
 
-    print(f'Probability of ending at state 8 is: {probs_sum}')
+    # The same game described as a Board, whose sparse transition matrix scales to large boards
+    board = Board()
+    board_probs = board.transition_matrix()
+    print(f'Probability of winning on {board} is: {hitting_probability(board_probs, start=board.start, target=board.goal)}')
 
+    # Probability of winning within a limited number of rolls, as in the simulation
+    chain = MarkovChain(transition_probs)
+    for num_steps in (10, 20, 40, 80):
+        print(f'Probability of reaching state 8 within {num_steps} steps is: {chain.prob_reached_by(0, 8, num_steps)}')
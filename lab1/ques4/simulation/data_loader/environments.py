@@ -2,39 +2,44 @@
 
 import gym
 import numpy as np
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[3]))
+from common.board import Board
 
 
 class SnakeAndLadderEnv(gym.Env):
     """Gym Environment to simulate the snake and ladder game"""
-    def __init__(self, current_state=0, num_states=9, dead_states=(2, 4), view=None, max_timesteps=40) -> None:
-        """Initialize the environment. The player starts at position 'current_state',
-        and takes actions in range(1, 6). The game ends when the player reaches 
-        either the 'dead_states' (in which case he/she looses and gets a reward
-        of 0) or when he/she reaches the 'num_states-1' postion (in which case
+    def __init__(self, board: Board = None, view=None, max_timesteps=40) -> None:
+        """Initialize the environment. The player starts at the start cell of the
+        board, and takes actions in range(1, board.num_faces + 1), the face of the
+        die rolled. The game ends when the player reaches either a dead cell (in
+        which case he/she looses and gets a reward of 0) or the goal (in which case
         he/she wins and gets a reward of 1).
 
         Args:
-            current_state (int, optional): the starting state of the player. Defaults to 0.
-            num_states (int, optional): the total number of states. Defaults to 9.
-            dead_states (tuple, optional): the dead states. Defaults to (2, 4).
+            board (Board, optional): the board to be played. Defaults to the board
+              of the problem statement: 9 states, dead states 2 and 4.
             view (tuple, optional): In order to render the environment, the shape
-              in which the environment should be printed. Note that the 'num_states'
-              should be equal to the product of elements of 'view'. If not provided,
-              it is assumed to be of shape (num_states,).
+              in which the environment should be printed. Note that the number of
+              states should be equal to the product of elements of 'view'. If not
+              provided, it is assumed to be of shape (num_states,).
             max_timesteps (int, optional): the maximum number of timesteps per game.
               This is used to exit the game with 0 reward in case the player ends up in
               a dead state. Defaults to 40.
         """
         super().__init__()
-        self.current_state = current_state
-        self.num_states = num_states
-        self.dead_states = dead_states
+        self.board = Board() if board is None else board
+        self.current_state = self.board.start
+        self.num_states = self.board.num_cells
+        self.dead_states = self.board.dead_cells
         self.view = view if view else (self.num_states, )
         self.max_timesteps = max_timesteps
         self.current_timestep = 0
 
     def reset(self) -> int:
-        self.current_state = 0
+        self.current_state = self.board.start
         self.current_timestep = 0
         return self.current_state
 
@@ -42,12 +47,11 @@ class SnakeAndLadderEnv(gym.Env):
         """Take an action and return the next state, reward, done and info."""
         self.current_timestep += 1
         # you can not step out of the board by taking an action. Such actions would be ignored.
-        if self.current_state + action < self.num_states and action in [1, 2]:
-            self.current_state += action
+        self.current_state = int(self.board.next_cells[self.current_state, action - 1])
         return (
             self.current_state,
-            int(self.current_state == self.num_states - 1),
-            bool(self.current_state in [self.num_states-1, *self.dead_states]) or (self.current_timestep == self.max_timesteps),
+            int(self.current_state == self.board.goal),
+            bool(self.board.is_absorbing[self.current_state]) or (self.current_timestep == self.max_timesteps),
             {}
         )
 
@@ -62,3 +66,73 @@ class SnakeAndLadderEnv(gym.Env):
 
     def close(self):
         pass
+
+
+class BatchedSnakeAndLadderEnv(gym.Env):
+    """Vectorized version of SnakeAndLadderEnv, which plays 'num_games' games at
+    once. The state of every game lives in numpy arrays, and a single call to
+    step() advances all the games which are not done yet. Any Board (snakes,
+    ladders, die) can be played, using its table of next cells."""
+    def __init__(self, num_games: int, max_timesteps=40, board: Board = None) -> None:
+        """Initialize the environment. Follows the same rules as SnakeAndLadderEnv.
+
+        Args:
+            num_games (int): the number of games played in parallel.
+            max_timesteps (int, optional): the maximum number of timesteps per game.
+              Defaults to 40.
+            board (Board, optional): the board to be played. Defaults to the board
+              of the problem statement.
+        """
+        super().__init__()
+        self.board = Board() if board is None else board
+        self.num_games = num_games
+        self.num_states = self.board.num_cells
+        self.dead_states = self.board.dead_cells
+        self.max_timesteps = max_timesteps
+
+        # lookup tables indexed by state, to avoid comparing against each dead state
+        self.next_states = self.board.next_cells
+        self._flat_next_states = self.next_states.ravel()
+        self.is_dead = self.board.is_dead
+        self.is_terminal = self.board.is_absorbing
+
+        self.current_states = np.zeros(num_games, dtype=self.next_states.dtype)
+        self.current_timestep = 0
+        self.dones = np.zeros(num_games, dtype=bool)
+
+    def reset(self) -> np.ndarray:
+        self.current_states[:] = self.board.start
+        self.current_timestep = 0
+        self.dones[:] = False
+        return self.current_states.copy()
+
+    def step(self, actions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, dict):
+        """Take one action (die roll in 1..num_faces) per game and return the next
+        states, rewards, dones and info. Games which are already done are left
+        unchanged, so a single timestep counter is enough to enforce the per game
+        timestep limit. info['dead'] marks the games stuck in a dead state."""
+        self.current_timestep += 1
+        # moves which would step out of the board are already mapped to the same state
+        flat_indices = self.current_states.astype(np.intp)
+        flat_indices *= self.board.num_faces
+        flat_indices += actions
+        flat_indices -= 1
+        next_states = self._flat_next_states.take(flat_indices)
+        np.copyto(self.current_states, next_states, where=~self.dones)
+
+        if self.current_timestep >= self.max_timesteps:
+            self.dones[:] = True
+        else:
+            self.dones |= self.is_terminal[self.current_states]
+        return (
+            self.current_states.copy(),
+            (self.current_states == self.board.goal).view(np.int8),
+            self.dones.copy(),
+            {'dead': self.is_dead[self.current_states]}
+        )
+
+    def render(self) -> None:
+        print(self.current_states)
+
+    def close(self):
+        pass
@@ -1,10 +1,15 @@
 import numpy as np
 import hydra
 import pathlib
-from data_loader.environments import SnakeAndLadderEnv
+import sys
+from functools import partial
+from data_loader.environments import SnakeAndLadderEnv, BatchedSnakeAndLadderEnv
 from tqdm import tqdm
 import logging
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from common.monte_carlo import run_monte_carlo
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
@@ -51,10 +56,98 @@ def simulate(num_games: int, max_timestep_per_game: int) -> None:
     print(f'Probability of winning: {np.mean(rewards)}')
 
 
+def play_games(num_games: int, max_timesteps: int = 40, rng=None, board=None) -> np.ndarray:
+    """Play num_games games of Snake and Ladder at once, using the batched environment.
+
+    Args:
+        num_games (int): Number of games to play.
+        max_timesteps (int, optional): Number of timesteps for which a single game
+          lasts. Defaults to 40.
+        rng (optional): A numpy.random.Generator to roll the die with.
+        board (Board, optional): The board to be played. Defaults to the board
+          of the problem statement.
+
+    Returns:
+        np.ndarray: The reward of each game, of shape (num_games,).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    env = BatchedSnakeAndLadderEnv(num_games, max_timesteps=max_timesteps, board=board)
+    env.reset()
+    rewards = np.zeros(num_games, dtype=np.int8)
+
+    for _ in range(max_timesteps):
+        actions = rng.integers(1, env.board.num_faces + 1, size=num_games, dtype=np.int8)
+        _, rewards, dones, _ = env.step(actions)
+        if dones.all():
+            break
+    env.close()
+    return rewards.astype(np.int64)
+
+
+def simulate_batched(num_games: int, max_timestep_per_game: int, batch_size: int = 1_000_000,
+                     confidence_z: float = 1.96, rng=None) -> (float, (float, float)):
+    """Vectorized version of simulate. Games are played batch_size at a time, and
+    only the number of wins is kept, so the memory does not grow with num_games.
+
+    Args:
+        num_games (int): Number of games to simulate.
+        max_timestep_per_game (int): Maximum number of timesteps per game.
+        batch_size (int, optional): Number of games played at once.
+        confidence_z (float, optional): z-score of the confidence interval.
+          Defaults to 1.96, ie. a 95% interval.
+        rng (optional): A numpy.random.Generator to roll the die with.
+
+    Returns:
+        (float, (float, float)): The estimated probability of winning, and its
+          Wilson score confidence interval.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    num_wins = 0
+    for start in tqdm(range(0, num_games, batch_size), desc='Simulating batches of games'):
+        num_wins += int(play_games(min(batch_size, num_games - start), max_timestep_per_game, rng=rng).sum())
+
+    win_prob = num_wins / num_games
+    # Wilson score interval, well behaved even when win_prob is close to 0 or 1
+    z2 = confidence_z ** 2
+    center = (win_prob + z2 / (2 * num_games)) / (1 + z2 / num_games)
+    half_width = confidence_z * np.sqrt(win_prob * (1 - win_prob) / num_games + z2 / (4 * num_games**2)) / (1 + z2 / num_games)
+    print(f'Probability of winning: {win_prob} ({center - half_width:.5f}, {center + half_width:.5f})')
+    return win_prob, (center - half_width, center + half_width)
+
+
+def simulate_parallel(num_games: int, max_timestep_per_game: int, batch_size: int = 1_000_000,
+                      num_workers: int = None, seed: int = None) -> (float, float):
+    """Simulate the games over a pool of processes, each batch of games using its
+    own independent random stream. The result only depends on the seed, and not on
+    the number of workers.
+
+    Args:
+        num_games (int): Number of games to simulate.
+        max_timestep_per_game (int): Maximum number of timesteps per game.
+        batch_size (int, optional): Number of games played at once by a worker.
+        num_workers (int, optional): Number of processes. Defaults to the number of cpus.
+        seed (int, optional): Seed of the root SeedSequence.
+
+    Returns:
+        (float, float): The estimated probability of winning, and its standard error.
+    """
+    stats = run_monte_carlo(partial(play_games, max_timesteps=max_timestep_per_game), num_games,
+                            shard_size=batch_size, num_workers=num_workers, seed=seed, verbose=True)
+    print(f'Probability of winning: {stats.mean} ± {stats.std_error}')
+    return stats.mean, stats.std_error
+
+
 @hydra.main(config_path="conf", config_name="configs")
 def main(cfg):
     pathlib.Path(f'{pathlib.Path.cwd()}/{cfg.exp.data_dir}/').mkdir(parents=True, exist_ok=True)
-    simulate(num_games=cfg.exp.num_games, max_timestep_per_game=cfg.exp.max_timestep_per_game)
+    if cfg.exp.num_workers != 1:
+        simulate_parallel(num_games=cfg.exp.num_games, max_timestep_per_game=cfg.exp.max_timestep_per_game,
+                          batch_size=cfg.exp.batch_size, num_workers=cfg.exp.num_workers, seed=cfg.exp.seed)
+    elif cfg.exp.vectorized:
+        simulate_batched(num_games=cfg.exp.num_games, max_timestep_per_game=cfg.exp.max_timestep_per_game,
+                         batch_size=cfg.exp.batch_size, rng=np.random.default_rng(cfg.exp.seed))
+    else:
+        simulate(num_games=cfg.exp.num_games, max_timestep_per_game=cfg.exp.max_timestep_per_game)
 
 
 if __name__ == '__main__':
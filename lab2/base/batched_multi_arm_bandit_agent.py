@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class BatchedMultiArmBanditAgent(ABC):
+    """Base class for agents which play 'num_runs' independent runs at once. The
+    statistics of every run are kept in arrays of shape (num_runs, num_arms), and
+    each call selects one arm per run."""
+
+    def __init__(self, num_runs: int, num_arms: int, rng: np.random.Generator = None) -> None:
+        self.num_runs = num_runs
+        self.num_arms = num_arms
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    @abstractmethod
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the running means of the selected actions, one per run.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            The arm selected in each run, of shape (num_runs,).
+        rewards : np.ndarray
+            The reward received in each run, of shape (num_runs,).
+        """
+        pass
+
+    def reset(self):
+        """Reset the agent initialization, for all the runs"""
+        pass
+
+    @abstractmethod
+    def forward(self, state: int) -> np.ndarray:
+        """Select an action for each run.
+
+        Parameters
+        ----------
+        state : int
+            The current state of the environment.
+
+        Returns
+        -------
+        np.ndarray
+            The index of the arm selected in each run, of shape (num_runs,).
+        """
+        pass
+
+    def __call__(self, state: int) -> np.ndarray:
+        return self.forward(state)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import numpy as np
 
 
 class MultiArmBanditAgent(ABC):
@@ -28,6 +29,33 @@ class MultiArmBanditAgent(ABC):
         """
         pass
 
+    @abstractmethod
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """Select a slate of k distinct arms for each of n independent users at
+        once, as one round of the agent (the time or temperature of the agent
+        moves by one round).
+
+        Parameters
+        ----------
+        n : int
+            The number of users to select arms for.
+        k : int, optional
+            The number of distinct arms selected per user, by default 1
+
+        Returns
+        -------
+        np.ndarray
+            The arms selected for each user, of shape (n, k), best first.
+        """
+        pass
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the agent with the rewards of many selected arms at once, e.g.
+        the (n, k) slates returned by select_batch. By default, update_mean is
+        called for each of them."""
+        for action, reward in zip(np.ravel(actions), np.ravel(rewards)):
+            self.update_mean(action, reward)
+
     def __call__(self, state: int) -> int:
         """Select an action.
 
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from typing import Callable, List, Tuple
+import numpy as np
 
 
 class RewardDistribution(ABC):
@@ -12,3 +14,41 @@ class RewardDistribution(ABC):
         float: The sampled reward.
         """
         pass
+
+    @property
+    @abstractmethod
+    def mean(self) -> float:
+        """The expected reward of the distribution."""
+        pass
+
+    @classmethod
+    def batch_sampler(cls, arms: List['RewardDistribution']) -> Callable[[np.ndarray, np.random.Generator], np.ndarray]:
+        """Return a function (actions, rng) -> rewards, which samples the reward of
+        arms[action] for every element of the integer array 'actions' at once.
+        Subclasses should override it with a vectorized version; by default each
+        reward is sampled with sample().
+
+        Parameters
+        ----------
+        arms: List[RewardDistribution]
+            The reward distribution of each arm, all of type cls.
+        """
+        def sample(actions: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+            return np.array([arms[action].sample() for action in np.ravel(actions)], dtype=float).reshape(np.shape(actions))
+        return sample
+
+    @classmethod
+    def table_sampler(cls, arms: List['RewardDistribution']) -> Callable[[Tuple[int, ...], np.random.Generator], np.ndarray]:
+        """Return a function (shape, rng) -> table, which samples a table of shape
+        shape + (len(arms),) holding an independent reward of every arm in each
+        cell. By default it is built on top of batch_sampler().
+
+        Parameters
+        ----------
+        arms: List[RewardDistribution]
+            The reward distribution of each arm, all of type cls.
+        """
+        sample_rewards = cls.batch_sampler(arms)
+        def sample(shape: Tuple[int, ...], rng: np.random.Generator) -> np.ndarray:
+            return sample_rewards(np.broadcast_to(np.arange(len(arms)), tuple(shape) + (len(arms),)), rng)
+        return sample
@@ -0,0 +1,79 @@
+"""Import time regression check: imports each entry module of lab2 in a fresh
+interpreter, as a sweep worker does, and fails when the import takes longer
+than its budget or loads a heavy dependency it should only load lazily.
+
+    python3 benchmarks/import_time.py [--budget-ms 1000] [--repeats 5]
+
+Run it from the lab2 directory; the exit code is 1 on a regression. The same
+check runs as a test with: python3 -m pytest benchmarks/import_time.py"""
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import unittest
+from typing import Dict, List
+
+LAB2_DIR = pathlib.Path(__file__).resolve().parents[1]
+DEFAULT_BUDGET_MS = 1000
+
+# module -> heavy modules which must not be loaded by importing it
+TARGETS = {
+    'models': ['torch', 'gym', 'wandb', 'hydra'],
+    'runner': ['torch', 'wandb', 'hydra'],
+    'sweep': ['torch', 'wandb', 'hydra'],
+}
+
+_PROBE = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start_time
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {forbidden!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module: str, forbidden: List[str], repeats: int) -> Dict:
+    """Best import time of 'module' over 'repeats' fresh interpreters, and the
+    forbidden modules it loaded."""
+    best_seconds, loaded = float('inf'), []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, forbidden=forbidden)],
+                                cwd=LAB2_DIR, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best_seconds, loaded = min(best_seconds, result['seconds']), result['loaded']
+    return {'seconds': best_seconds, 'loaded': loaded}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='maximum import time of each module')
+    parser.add_argument('--repeats', type=int, default=5, help='fresh interpreters per module, the best time is kept')
+    parser.add_argument('modules', nargs='*', default=list(TARGETS), help='modules to check, all by default')
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        result = measure(module, TARGETS.get(module, []), args.repeats)
+        milliseconds = 1000 * result['seconds']
+        print(f'{module:>8}: {milliseconds:8.1f} ms' + (f', loaded {", ".join(result["loaded"])}' if result['loaded'] else ''))
+        if milliseconds > args.budget_ms:
+            failures.append(f'{module} took {milliseconds:.1f} ms to import, over the budget of {args.budget_ms:.0f} ms')
+        if result['loaded']:
+            failures.append(f'{module} eagerly imports {", ".join(result["loaded"])}')
+    for failure in failures:
+        print(f'REGRESSION: {failure}')
+    return 1 if failures else 0
+
+
+class TestImportTime(unittest.TestCase):
+    def test_targets(self):
+        for module, forbidden in TARGETS.items():
+            with self.subTest(module=module):
+                result = measure(module, forbidden, repeats=3)
+                self.assertEqual(result['loaded'], [], f'{module} eagerly imports {result["loaded"]}')
+                self.assertLessEqual(1000 * result['seconds'], DEFAULT_BUDGET_MS)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
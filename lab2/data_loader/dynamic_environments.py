@@ -0,0 +1,185 @@
+from abc import ABC, abstractmethod
+import gym
+from gym.spaces import Discrete
+import numpy as np
+import sys
+from typing import Tuple
+
+sys.path.insert(0, '../')
+from data_loader.environments import RewardTable
+
+
+class BlockBanditEnvironment(gym.Env, ABC):
+    """Base class for bandits whose arm means change over time. The means of
+    every arm of the 'num_runs' runs are drawn 'block_size' timesteps at a time,
+    as a table of shape (block_size, num_runs, num_arms), together with the
+    gaussian noise of the rewards and the optimal arm of each timestep, so a
+    step only reads from the tables. Subclasses define how the means evolve in
+    _reset_arms and _draw_means.
+
+    Since the optimal arm moves, 'optimal_arm_hits' counts the pulls of the
+    optimal arm of the timestep, and optimal_mean is the mean of the optimal
+    arm averaged over the timesteps played so far."""
+
+    def __init__(self, num_arms: int=3, total_timesteps: int=1000, num_runs: int=1, noise_sigma: float=1.0,
+                 block_size: int=1024, rng: np.random.Generator=None, values_per_arm: int=1) -> None:
+        super(BlockBanditEnvironment, self).__init__()
+
+        self.num_arms = num_arms
+        self.num_runs = num_runs
+        self.noise_sigma = noise_sigma
+        self.block_size = max(1, min(block_size, RewardTable.MAX_TABLE_SIZE // (num_runs * num_arms * values_per_arm)))
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.total_timesteps = total_timesteps
+        self.current_timestep = 0
+        self.total_optimal_arms_hits = np.zeros(num_runs, dtype=np.int64)
+        self._optimal_means_sum = 0.0
+        self._rows = np.arange(num_runs)
+        self._cursor = self.block_size
+
+        self.action_space = Discrete(num_arms)
+        self.observation_space = Discrete(total_timesteps)
+
+    def __str__(self) -> str:
+        return f'{type(self).__name__}(runs={self.num_runs}, arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def optimal_mean(self) -> float:
+        return self._optimal_means_sum / max(self.current_timestep, 1)
+
+    @abstractmethod
+    def _reset_arms(self) -> None:
+        """Draw the initial state of the arms of every run."""
+        pass
+
+    @abstractmethod
+    def _draw_means(self, block_size: int) -> np.ndarray:
+        """Return the means of the arms for the next 'block_size' timesteps, of
+        shape (block_size, num_runs, num_arms)."""
+        pass
+
+    def _observation(self):
+        return self.current_timestep
+
+    def _refill(self) -> None:
+        self._means = self._draw_means(self.block_size)
+        self._noise = self.rng.standard_normal((self.block_size, self.num_runs))
+        self._noise *= self.noise_sigma
+        self._optimal_arms = self._means.argmax(axis=-1)
+        self._optimal_means = np.take_along_axis(self._means, self._optimal_arms[..., None], axis=-1)[..., 0]
+        self._cursor = 0
+
+    def reset(self):
+        self.current_timestep = 0
+        self.total_optimal_arms_hits[:] = 0
+        self._optimal_means_sum = 0.0
+        self._reset_arms()
+        self._refill()
+        return self._observation()
+
+    def step(self, actions: np.ndarray) -> Tuple[object, np.ndarray, bool, dict]:
+        """Return observation, rewards, done, and info. 'actions' holds the
+        action of each run, and 'rewards' the corresponding rewards."""
+        cursor = self._cursor
+        rewards = self._means[cursor][self._rows, actions] + self._noise[cursor]
+        self.total_optimal_arms_hits += actions == self._optimal_arms[cursor]
+        optimal_means = self._optimal_means[cursor]
+        self._optimal_means_sum += optimal_means.mean()
+
+        self.current_timestep += 1
+        self._cursor += 1
+        if self._cursor == self.block_size:
+            self._refill()
+        done = self.current_timestep >= self.total_timesteps
+        return self._observation(), rewards, done, {'optimal_arm_hits': self.total_optimal_arms_hits,
+                                                    'optimal_means': optimal_means}
+
+    def render(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class DriftingBanditEnvironment(BlockBanditEnvironment):
+    """The mean of every arm follows a gaussian random walk, starting from
+    N(0, initial_sigma^2) and moving by N(0, drift_sigma^2) at each timestep."""
+
+    def __init__(self, num_arms: int=3, total_timesteps: int=1000, num_runs: int=1, noise_sigma: float=1.0,
+                 drift_sigma: float=0.01, initial_sigma: float=1.0, block_size: int=1024,
+                 rng: np.random.Generator=None) -> None:
+        super(DriftingBanditEnvironment, self).__init__(num_arms, total_timesteps, num_runs, noise_sigma, block_size, rng)
+        self.drift_sigma = drift_sigma
+        self.initial_sigma = initial_sigma
+
+    def _reset_arms(self) -> None:
+        self._current_means = self.rng.normal(0, self.initial_sigma, (self.num_runs, self.num_arms))
+
+    def _draw_means(self, block_size: int) -> np.ndarray:
+        means = self.rng.standard_normal((block_size, self.num_runs, self.num_arms))
+        means *= self.drift_sigma
+        np.cumsum(means, axis=0, out=means)
+        means += self._current_means
+        self._current_means = means[-1].copy()
+        return means
+
+
+class SwitchingBanditEnvironment(BlockBanditEnvironment):
+    """The means of the arms are piecewise constant: at each timestep, with
+    probability switch_prob, all the means of a run are drawn again from
+    N(0, initial_sigma^2)."""
+
+    def __init__(self, num_arms: int=3, total_timesteps: int=1000, num_runs: int=1, noise_sigma: float=1.0,
+                 switch_prob: float=0.001, initial_sigma: float=1.0, block_size: int=1024,
+                 rng: np.random.Generator=None) -> None:
+        super(SwitchingBanditEnvironment, self).__init__(num_arms, total_timesteps, num_runs, noise_sigma, block_size, rng)
+        self.switch_prob = switch_prob
+        self.initial_sigma = initial_sigma
+
+    def _reset_arms(self) -> None:
+        self._current_means = self.rng.normal(0, self.initial_sigma, (self.num_runs, self.num_arms))
+
+    def _draw_means(self, block_size: int) -> np.ndarray:
+        switches = self.rng.random((block_size, self.num_runs)) < self.switch_prob
+        num_switches = int(switches.sum())
+        if num_switches == 0:
+            return np.broadcast_to(self._current_means, (block_size, self.num_runs, self.num_arms))
+        # only the means of the segments which start in this block are drawn
+        new_means = self.rng.normal(0, self.initial_sigma, (num_switches, self.num_arms))
+        segment = np.full((block_size, self.num_runs), -1)
+        segment[switches] = np.arange(num_switches)
+        # forward fill the index of the last segment which started, along the time axis
+        last_switch = np.where(switches, np.arange(block_size)[:, None], 0)
+        np.maximum.accumulate(last_switch, axis=0, out=last_switch)
+        segment = segment[last_switch, np.arange(self.num_runs)]
+        means = np.where(segment[..., None] >= 0, new_means[segment], self._current_means)
+        self._current_means = means[-1].copy()
+        return means
+
+
+class LinearContextualBanditEnvironment(BlockBanditEnvironment):
+    """Linear contextual bandit: at each timestep every arm comes with a context
+    vector x of dimension context_dim, drawn from N(0, I), and its mean reward is
+    x . theta, for a parameter theta of each run drawn from N(0, I / context_dim).
+    The observation is the contexts of the arms, of shape
+    (num_runs, num_arms, context_dim)."""
+
+    def __init__(self, num_arms: int=3, total_timesteps: int=1000, num_runs: int=1, noise_sigma: float=1.0,
+                 context_dim: int=10, block_size: int=1024, rng: np.random.Generator=None) -> None:
+        super(LinearContextualBanditEnvironment, self).__init__(num_arms, total_timesteps, num_runs, noise_sigma,
+                                                                block_size, rng, values_per_arm=context_dim + 1)
+        self.context_dim = context_dim
+        self.observation_space = None
+
+    def _reset_arms(self) -> None:
+        self.theta = self.rng.normal(0, 1 / np.sqrt(self.context_dim), (self.num_runs, self.context_dim))
+
+    def _draw_means(self, block_size: int) -> np.ndarray:
+        self._contexts = self.rng.standard_normal((block_size, self.num_runs, self.num_arms, self.context_dim))
+        return np.einsum('brad,rd->bra', self._contexts, self.theta)
+
+    def _observation(self) -> np.ndarray:
+        return self._contexts[self._cursor]
@@ -1,19 +1,83 @@
 import gym
 from gym.spaces import Discrete
+import numpy as np
 import sys
-from typing import Tuple, Callable
+from typing import Tuple, Callable, List, Union
+
+sys.path.insert(0, '../')
+from base.reward_distribution import RewardDistribution
+
+
+class RewardTable(object):
+    """Rewards pre-drawn for every arm of 'num_runs' runs, 'block_size' timesteps
+    at a time. The table of shape (block_size, num_runs, num_arms) is filled
+    with a single call to the generator, and refilled lazily once every
+    timestep of the block was consumed."""
+
+    # upper bound on the number of rewards held at once, the block is shortened to fit
+    MAX_TABLE_SIZE = 1 << 22
+
+    def __init__(self, reward_distributions: List[RewardDistribution], num_runs: int=1, block_size: int=1024,
+                 rng: np.random.Generator=None) -> None:
+        super(RewardTable, self).__init__()
+
+        self.num_arms = len(reward_distributions)
+        self.num_runs = num_runs
+        self.block_size = max(1, min(block_size, self.MAX_TABLE_SIZE // (num_runs * self.num_arms)))
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.reward_distributions = reward_distributions
+        self._sample_table = type(reward_distributions[0]).table_sampler(reward_distributions)
+        self._run_offsets = np.arange(num_runs) * self.num_arms
+        self._table = None
+        self._cursor = self.block_size
+
+    def __str__(self) -> str:
+        return f'RewardTable(runs={self.num_runs}, arms={self.num_arms}, block_size={self.block_size})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __getstate__(self) -> dict:
+        # the sampler is a closure, which cannot be pickled
+        state = self.__dict__.copy()
+        del state['_sample_table']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._sample_table = type(self.reward_distributions[0]).table_sampler(self.reward_distributions)
+
+    def refill(self) -> None:
+        """Draw the next block of rewards."""
+        self._table = self._sample_table((self.block_size, self.num_runs), self.rng)
+        self._cursor = 0
+
+    def draw(self, actions: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """Return the reward of the chosen arm of each run for the next timestep.
+        'actions' is a single action when there is one run, or holds the action of
+        each run."""
+        if self._cursor == self.block_size:
+            self.refill()
+        rewards = self._table[self._cursor]
+        self._cursor += 1
+        if np.ndim(actions) == 0:
+            return float(rewards[0, actions])
+        return rewards.ravel().take(self._run_offsets + actions)
 
 
 class MultiArmBanditEnvironment(gym.Env):
     """A generic class for MultiArmBandit environments. The underlying reward
     for each arm is initialized by a function. The simulation can be run for a
-    fixed number of timesteps."""
+    fixed number of timesteps. With 'block_size', the rewards are pre-drawn from
+    'rng' in blocks (see RewardTable) instead of one np.random call per step."""
 
-    def __init__(self, arm_initializer: Callable, num_arms: int=3, total_timesteps: int=1000) -> None:
+    def __init__(self, arm_initializer: Callable, num_arms: int=3, total_timesteps: int=1000, block_size: int=None,
+                 rng: np.random.Generator=None) -> None:
         super(MultiArmBanditEnvironment, self).__init__()
 
         self.num_arms = num_arms
         self.reward_distributions, self.optimal_arm_index, self._optimal_mean = arm_initializer(num_arms)
+        self.reward_table = None if block_size is None else RewardTable(self.reward_distributions, 1, block_size, rng)
         self.total_timesteps = total_timesteps
         self.current_timestep = 0
         self.total_optimal_arms_hits = 0
@@ -28,6 +92,11 @@ class MultiArmBanditEnvironment(gym.Env):
     def optimal_mean(self) -> float:
         return self._optimal_mean
 
+    @property
+    def arm_means(self) -> np.ndarray:
+        """The expected reward of every arm."""
+        return np.array([arm.mean for arm in self.reward_distributions], dtype=float)
+
     def reset(self) -> int:
         self.current_timestep = 0
         self.total_optimal_arms_hits = 0
@@ -35,7 +104,10 @@ class MultiArmBanditEnvironment(gym.Env):
 
     def step(self, action: int) -> Tuple[int, float, bool, dict]:
         """Return observation, reward, done, and info."""
-        reward = self.reward_distributions[action].sample()
+        if self.reward_table is None:
+            reward = self.reward_distributions[action].sample()
+        else:
+            reward = self.reward_table.draw(action)
         self.current_timestep += 1
         done = self.current_timestep >= self.total_timesteps
         self.total_optimal_arms_hits += 1 if action == self.optimal_arm_index else 0
@@ -45,4 +117,72 @@ class MultiArmBanditEnvironment(gym.Env):
         pass
 
     def close(self) -> None:
-        pass
\ No newline at end of file
+        pass
+
+
+class BatchedMultiArmBanditEnvironment(gym.Env):
+    """Runs 'num_runs' independent runs of the same MultiArmBandit at once. Each
+    step takes one action per run, and samples all the rewards in a single
+    vectorized call, or reads them from a RewardTable when 'block_size' is set."""
+
+    def __init__(self, arm_initializer: Callable, num_arms: int=3, total_timesteps: int=1000, num_runs: int=1,
+                 rng: np.random.Generator=None, block_size: int=None) -> None:
+        super(BatchedMultiArmBanditEnvironment, self).__init__()
+
+        self.num_arms = num_arms
+        self.num_runs = num_runs
+        self.reward_distributions, self.optimal_arm_index, self._optimal_mean = arm_initializer(num_arms)
+        self._sample_rewards = type(self.reward_distributions[0]).batch_sampler(self.reward_distributions)
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.reward_table = None if block_size is None else RewardTable(self.reward_distributions, num_runs, block_size, self.rng)
+        self.total_timesteps = total_timesteps
+        self.current_timestep = 0
+        self.total_optimal_arms_hits = np.zeros(num_runs, dtype=np.int64)
+
+        self.action_space = Discrete(num_arms)
+        self.observation_space = Discrete(total_timesteps)
+
+    def __str__(self) -> str:
+        return f'BatchedEnv(runs={self.num_runs}): {self.reward_distributions}'
+
+    @property
+    def optimal_mean(self) -> float:
+        return self._optimal_mean
+
+    @property
+    def arm_means(self) -> np.ndarray:
+        """The expected reward of every arm."""
+        return np.array([arm.mean for arm in self.reward_distributions], dtype=float)
+
+    def reset(self) -> int:
+        self.current_timestep = 0
+        self.total_optimal_arms_hits[:] = 0
+        return self.current_timestep
+
+    def __getstate__(self) -> dict:
+        # the sampler is a closure, which cannot be pickled
+        state = self.__dict__.copy()
+        del state['_sample_rewards']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._sample_rewards = type(self.reward_distributions[0]).batch_sampler(self.reward_distributions)
+
+    def step(self, actions: np.ndarray) -> Tuple[int, np.ndarray, bool, dict]:
+        """Return observation, rewards, done, and info. 'actions' holds the
+        action of each run, and 'rewards' the corresponding rewards."""
+        if self.reward_table is None:
+            rewards = self._sample_rewards(actions, self.rng)
+        else:
+            rewards = self.reward_table.draw(actions)
+        self.current_timestep += 1
+        done = self.current_timestep >= self.total_timesteps
+        self.total_optimal_arms_hits += actions == self.optimal_arm_index
+        return self.current_timestep, rewards, done, {'optimal_arm_hits': self.total_optimal_arms_hits}
+
+    def render(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
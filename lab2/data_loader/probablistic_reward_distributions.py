@@ -1,5 +1,6 @@
 import sys
 import numpy as np
+from typing import Callable, List
 
 sys.path.insert(0, '..')
 from base.reward_distribution import RewardDistribution
@@ -16,6 +17,20 @@ class BinomialRewardDistribution(RewardDistribution):
         """Returns reward of 1 with probability p and reward of 0 with probability 1-p."""
         return np.random.binomial(1, self.p)
 
+    @property
+    def mean(self) -> float:
+        return self.p
+
+    @classmethod
+    def batch_sampler(cls, arms: List['BinomialRewardDistribution']) -> Callable:
+        p = np.array([arm.p for arm in arms])
+        return lambda actions, rng: (rng.random(np.shape(actions)) < p[actions]).astype(float)
+
+    @classmethod
+    def table_sampler(cls, arms: List['BinomialRewardDistribution']) -> Callable:
+        p = np.array([arm.p for arm in arms])
+        return lambda shape, rng: (rng.random(tuple(shape) + p.shape) < p).astype(float)
+
     def __str__(self) -> str:
         return f'BinomalRewardDistribution(p={self.p:.3f})'
 
@@ -34,6 +49,25 @@ class GaussianRewardDistribution(RewardDistribution):
     def sample(self) -> float:
         """Returns a sample from the Gaussian distribution."""
         return np.random.normal(self.mu, self.sigma)
+
+    @property
+    def mean(self) -> float:
+        return self.mu
+
+    @classmethod
+    def batch_sampler(cls, arms: List['GaussianRewardDistribution']) -> Callable:
+        mu, sigma = np.array([arm.mu for arm in arms], dtype=float), np.array([arm.sigma for arm in arms], dtype=float)
+        return lambda actions, rng: rng.normal(mu[actions], sigma[actions])
+
+    @classmethod
+    def table_sampler(cls, arms: List['GaussianRewardDistribution']) -> Callable:
+        mu, sigma = np.array([arm.mu for arm in arms], dtype=float), np.array([arm.sigma for arm in arms], dtype=float)
+        def sample(shape, rng):
+            table = rng.standard_normal(tuple(shape) + mu.shape)
+            table *= sigma
+            table += mu
+            return table
+        return sample
     
     def __str__(self) -> str:
         return f'Gaussian(mu={self.mu}, sigma={self.sigma})'
@@ -1,5 +1,28 @@
-from models.epsilon_greedy import EpsilonGreedyAgent
-from models.ucb import UCBAgent
-from models.thompson_sampling import ThompsonSamplingAgent
-from models.softmax import SoftmaxAgent
-from models.reinforce import ReinforceAgent
\ No newline at end of file
+"""The agents are imported lazily, on first access: `from models import UCBAgent`
+only loads models/ucb.py, so a process pays for the agent it plays only."""
+import importlib
+
+_AGENT_MODULES = {
+    'EpsilonGreedyAgent': 'models.epsilon_greedy', 'BatchedEpsilonGreedyAgent': 'models.epsilon_greedy',
+    'UCBAgent': 'models.ucb', 'BatchedUCBAgent': 'models.ucb',
+    'LazyUCBAgent': 'models.ucb', 'BatchedLazyUCBAgent': 'models.ucb',
+    'ThompsonSamplingAgent': 'models.thompson_sampling', 'BatchedThompsonSamplingAgent': 'models.thompson_sampling',
+    'SoftmaxAgent': 'models.softmax', 'BatchedSoftmaxAgent': 'models.softmax',
+    'ReinforceAgent': 'models.reinforce', 'BatchedReinforceAgent': 'models.reinforce',
+    'BatchedSlidingWindowUCBAgent': 'models.nonstationary_ucb', 'BatchedDiscountedUCBAgent': 'models.nonstationary_ucb',
+    'BatchedLinUCBAgent': 'models.linear_bandits', 'BatchedLinTSAgent': 'models.linear_bandits',
+}
+
+__all__ = list(_AGENT_MODULES)
+
+
+def __getattr__(name: str):
+    if name not in _AGENT_MODULES:
+        raise AttributeError(f"module 'models' has no attribute '{name}'")
+    agent_class = getattr(importlib.import_module(_AGENT_MODULES[name]), name)
+    globals()[name] = agent_class
+    return agent_class
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,11 +1,10 @@
 import numpy as np
 import sys
 
-from torch import initial_seed
-
 sys.path.insert(0, '../')
-from utils.utils import RunningMean
+from utils.utils import ArmStatistics, top_k
 from base.multi_arm_bandit_agent import MultiArmBanditAgent
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
 
 
 class EpsilonGreedyAgent(MultiArmBanditAgent):
@@ -34,16 +33,37 @@ class EpsilonGreedyAgent(MultiArmBanditAgent):
         self.current_temp = initial_temp
         self.initial_temp = initial_temp
         self.decay_factor = decay_factor
-        self.running_means = [RunningMean() for _ in range(num_arms)]
+        self.statistics = ArmStatistics(num_arms)
 
     def reset(self) -> None:
         """Reset the agent."""
-        self.running_means = [RunningMean() for _ in range(self.num_arms)]
+        self.statistics.reset()
         self.current_temp = self.initial_temp
 
     def update_mean(self, arm_index: int, reward: int) -> None:
         """Update the running mean of the selected arm_index."""
-        self.running_means[arm_index].update_mean(reward)
+        self.statistics.update(arm_index, reward)
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the running means with many rewards at once."""
+        self.statistics.update_batch(actions, rewards)
+
+    def next_eps(self) -> float:
+        """Epsilon of the next round, decaying the temperature of a variable
+        epsilon agent."""
+        if self.current_temp is not None:
+            self.current_temp *= self.decay_factor
+            return self.eps / self.current_temp
+        return self.eps
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """The k arms of best estimated mean for the users who exploit, a random
+        slate for those who explore, with probability eps."""
+        eps = self.next_eps()
+        scores = np.tile(self.statistics.means, (n, 1))
+        explore = np.random.random(n) < eps
+        scores[explore] = np.random.random((int(explore.sum()), self.num_arms))
+        return top_k(scores, k)
 
     def forward(self, state: int, eps: float) -> int:
         """Select an action.
@@ -63,20 +83,61 @@ class EpsilonGreedyAgent(MultiArmBanditAgent):
         if np.random.random() < eps:
             return np.random.choice(self.num_arms)
         else:
-            return np.argmax([mean.mean for mean in self.running_means])
+            return np.argmax(self.statistics.means)
 
     def __call__(self, state: int) -> int:
 
+        # if it is a variable epsilon agent, update the temperature
+        eps = self.next_eps()
+
+        action = self.forward(state, eps)
+
+        return action
+
+    def __str__(self) -> str:
+        return f'EpsilonGreedyAgent(eps={self.eps}, arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BatchedEpsilonGreedyAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, eps: float, num_arms: int, num_runs: int, initial_temp: int = None, decay_factor: float=1.0,
+                 rng: np.random.Generator = None) -> None:
+        """Epsilon greedy agent playing num_runs runs at once. Same parameters as
+        EpsilonGreedyAgent, and rng, the generator used to explore."""
+        super(BatchedEpsilonGreedyAgent, self).__init__(num_runs, num_arms, rng)
+        self.eps = eps
+        self.current_temp = initial_temp
+        self.initial_temp = initial_temp
+        self.decay_factor = decay_factor
+        self.statistics = ArmStatistics(num_arms, num_runs)
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+        self.current_temp = self.initial_temp
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the running means of the selected arms."""
+        self.statistics.update(actions, rewards)
+
+    def forward(self, state: int, eps: float) -> np.ndarray:
+        """Select an action in each run, randomly with probability eps and greedily otherwise."""
+        actions = np.argmax(self.statistics.means, axis=1)
+        explore = self.rng.random(self.num_runs) < eps
+        actions[explore] = self.rng.integers(0, self.num_arms, size=int(explore.sum()))
+        return actions
+
+    def __call__(self, state: int) -> np.ndarray:
         # if it is a variable epsilon agent, update the temperature
         if self.current_temp is not None:
             self.current_temp *= self.decay_factor
             eps = self.eps / self.current_temp
         else:
             eps = self.eps
-
-        action = self.forward(state, eps)
-
-        return action
+        return self.forward(state, eps)
 
     def __str__(self) -> str:
         return f'EpsilonGreedyAgent(eps={self.eps}, arms={self.num_arms})'
@@ -0,0 +1,140 @@
+from abc import abstractmethod
+import numpy as np
+import sys
+import logging
+
+sys.path.insert(0, '../')
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BatchedLinearBanditAgent(BatchedMultiArmBanditAgent):
+    """Base class of the agents for linear contextual bandits, where the mean
+    reward of an arm is x . theta for the context x of the arm. Each run keeps a
+    ridge regression estimate of theta: the inverse of the design matrix
+    A = regularization * I + sum x x^T, of shape (num_runs, context_dim,
+    context_dim), and b = sum reward * x. A^-1 is updated in O(context_dim^2)
+    per pull with the Sherman-Morrison formula, instead of being inverted again.
+
+    The state passed to the agent is the contexts of the arms, of shape
+    (num_runs, num_arms, context_dim)."""
+
+    def __init__(self, num_arms: int, num_runs: int, context_dim: int, regularization: float = 1.0,
+                 rng: np.random.Generator = None) -> None:
+        super(BatchedLinearBanditAgent, self).__init__(num_runs, num_arms, rng)
+        self.context_dim = context_dim
+        self.regularization = regularization
+        self.design_inverse = np.empty((num_runs, context_dim, context_dim))
+        self.b = np.empty((num_runs, context_dim))
+        self.theta = np.empty((num_runs, context_dim))
+        self._rows = np.arange(num_runs)
+        self._contexts = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.design_inverse[:] = np.eye(self.context_dim) / self.regularization
+        self.b.fill(0)
+        self.theta.fill(0)
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Add the pulls of the last contexts to the regression of each run."""
+        x = self._contexts[self._rows, actions]
+        design_inverse_x = np.einsum('rde,re->rd', self.design_inverse, x)
+        denominator = 1 + np.einsum('rd,rd->r', x, design_inverse_x)
+        # Sherman-Morrison: (A + x x^T)^-1 = A^-1 - A^-1 x x^T A^-1 / (1 + x^T A^-1 x)
+        self.design_inverse -= design_inverse_x[:, :, None] * design_inverse_x[:, None, :] / denominator[:, None, None]
+        self.b += rewards[:, None] * x
+        np.einsum('rde,re->rd', self.design_inverse, self.b, out=self.theta)
+
+    @abstractmethod
+    def scores(self, contexts: np.ndarray) -> np.ndarray:
+        """Score of every arm of every run, of shape (num_runs, num_arms)."""
+        pass
+
+    def forward(self, state: np.ndarray) -> np.ndarray:
+        """Select the arm of maximum score in each run, for the contexts 'state'."""
+        self._contexts = state
+        return self.scores(state).argmax(axis=1)
+
+
+class BatchedLinUCBAgent(BatchedLinearBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, context_dim: int, regularization: float = 1.0,
+                 exploration: float = 1.0, rng: np.random.Generator = None) -> None:
+        """LinUCB (Li et al.), with a parameter theta shared by the arms. The score
+        of an arm of context x is
+            x . theta_hat + exploration * sqrt(x^T A^-1 x)
+        which costs O(num_arms context_dim^2) per run and timestep.
+
+        Parameters
+        ----------
+        num_arms : int
+            The number of arms in the bandit.
+        num_runs : int
+            The number of runs played at once.
+        context_dim : int
+            The dimension of the contexts of the arms.
+        regularization : float, optional
+            Ridge regularization, the initial design matrix, by default 1.0
+        exploration : float, optional
+            Scale of the confidence width, by default 1.0
+        rng : np.random.Generator, optional
+            Unused, kept for the common interface of the batched agents.
+        """
+        super(BatchedLinUCBAgent, self).__init__(num_arms, num_runs, context_dim, regularization, rng)
+        self.exploration = exploration
+
+    def scores(self, contexts: np.ndarray) -> np.ndarray:
+        means = np.einsum('rad,rd->ra', contexts, self.theta)
+        widths = np.einsum('rad,rad->ra', contexts @ self.design_inverse, contexts)
+        return means + self.exploration * np.sqrt(np.maximum(widths, 0))
+
+    def __str__(self):
+        return f'LinUCBAgent(arms={self.num_arms}, dim={self.context_dim})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BatchedLinTSAgent(BatchedLinearBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, context_dim: int, regularization: float = 1.0,
+                 posterior_scale: float = 1.0, rng: np.random.Generator = None) -> None:
+        """Linear Thompson sampling (Agrawal and Goyal). Each timestep a parameter
+        is sampled from N(theta_hat, posterior_scale^2 A^-1), and the arm of best
+        x . theta_sample is selected. The update is O(context_dim^2); sampling
+        needs a Cholesky factor of A^-1, O(context_dim^3) per run and timestep.
+
+        Parameters
+        ----------
+        num_arms : int
+            The number of arms in the bandit.
+        num_runs : int
+            The number of runs played at once.
+        context_dim : int
+            The dimension of the contexts of the arms.
+        regularization : float, optional
+            Ridge regularization, the initial design matrix, by default 1.0
+        posterior_scale : float, optional
+            Scale of the posterior covariance, by default 1.0
+        rng : np.random.Generator, optional
+            Generator used to sample the parameters.
+        """
+        super(BatchedLinTSAgent, self).__init__(num_arms, num_runs, context_dim, regularization, rng)
+        self.posterior_scale = posterior_scale
+
+    def scores(self, contexts: np.ndarray) -> np.ndarray:
+        # the rank one updates slowly break the symmetry of A^-1
+        design_inverse = (self.design_inverse + self.design_inverse.transpose(0, 2, 1)) / 2
+        cholesky = np.linalg.cholesky(design_inverse)
+        noise = self.rng.standard_normal((self.num_runs, self.context_dim))
+        theta_sample = self.theta + self.posterior_scale * np.einsum('rde,re->rd', cholesky, noise)
+        return np.einsum('rad,rd->ra', contexts, theta_sample)
+
+    def __str__(self):
+        return f'LinTSAgent(arms={self.num_arms}, dim={self.context_dim})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,130 @@
+import numpy as np
+import sys
+import logging
+
+sys.path.insert(0, '../')
+from utils.utils import ArmStatistics
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BatchedSlidingWindowUCBAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, window: int = 1000, exploration: float = 1.0,
+                 rng: np.random.Generator = None) -> None:
+        """Sliding window UCB (Garivier and Moulines), for arms whose means change
+        over time. Only the last 'window' pulls of each run are used, so the
+        index of an arm is
+            mean_window + exploration * sqrt(log(min(t, window)) / n_window)
+        The pulls are kept in a ring buffer of shape (window, num_runs): each
+        update adds the new pull and removes the one leaving the window, in O(1)
+        per run.
+
+        Parameters
+        ----------
+        num_arms : int
+            The number of arms in the bandit.
+        num_runs : int
+            The number of runs played at once.
+        window : int, optional
+            Number of most recent pulls taken into account, by default 1000
+        exploration : float, optional
+            Scale of the exploration bonus, by default 1.0
+        rng : np.random.Generator, optional
+            Unused, kept for the common interface of the batched agents.
+        """
+        super(BatchedSlidingWindowUCBAgent, self).__init__(num_runs, num_arms, rng)
+        self.window = window
+        self.exploration = exploration
+        self.statistics = ArmStatistics(num_arms, num_runs)
+        self._past_actions = np.zeros((window, num_runs), dtype=np.int64)
+        self._past_rewards = np.zeros((window, num_runs))
+        self.time = 0
+
+    def reset(self) -> None:
+        self.statistics.reset()
+        self.time = 0
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        position = self.time % self.window
+        if self.time >= self.window:
+            # forget the pull leaving the window
+            index = self.statistics.index(self._past_actions[position])
+            self.statistics.counts[index] -= 1
+            self.statistics.sums[index] -= self._past_rewards[position]
+        self._past_actions[position] = actions
+        self._past_rewards[position] = rewards
+        self.statistics.update(actions, rewards)
+        self.time += 1
+
+    def forward(self, state) -> np.ndarray:
+        """Select the arm of maximum index in each run, the arms absent from the
+        window first."""
+        counts = self.statistics.counts
+        bonus = self.exploration * np.sqrt(np.log(max(min(self.time, self.window), 1)) / np.maximum(counts, 1))
+        indices = np.where(counts > 0, self.statistics.means + bonus, np.inf)
+        return indices.argmax(axis=1)
+
+    def __str__(self):
+        return f'SlidingWindowUCBAgent(arms={self.num_arms}, window={self.window})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BatchedDiscountedUCBAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, discount: float = 0.999, exploration: float = 1.0,
+                 rng: np.random.Generator = None) -> None:
+        """Discounted UCB (Kocsis and Szepesvari), for arms whose means change over
+        time. Every pull is weighted by discount^age, so the index of an arm is
+            mean_discounted + exploration * sqrt(log(N) / n_discounted)
+        with N the discounted number of pulls of all the arms. The discounted
+        counts are fractional, so they are kept in float arrays rather than in
+        ArmStatistics.
+
+        Parameters
+        ----------
+        num_arms : int
+            The number of arms in the bandit.
+        num_runs : int
+            The number of runs played at once.
+        discount : float, optional
+            Weight kept by the past pulls at each timestep, by default 0.999
+        exploration : float, optional
+            Scale of the exploration bonus, by default 1.0
+        rng : np.random.Generator, optional
+            Unused, kept for the common interface of the batched agents.
+        """
+        super(BatchedDiscountedUCBAgent, self).__init__(num_runs, num_arms, rng)
+        self.discount = discount
+        self.exploration = exploration
+        self.counts = np.zeros((num_runs, num_arms))
+        self.sums = np.zeros((num_runs, num_arms))
+        self._rows = np.arange(num_runs)
+
+    def reset(self) -> None:
+        self.counts.fill(0)
+        self.sums.fill(0)
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.counts *= self.discount
+        self.sums *= self.discount
+        self.counts[self._rows, actions] += 1
+        self.sums[self._rows, actions] += rewards
+
+    def forward(self, state) -> np.ndarray:
+        """Select the arm of maximum index in each run, the arms never pulled first."""
+        played = self.counts > 0
+        safe_counts = np.where(played, self.counts, 1)
+        total = np.maximum(self.counts.sum(axis=1, keepdims=True), 1)
+        indices = np.where(played, self.sums / safe_counts + self.exploration * np.sqrt(np.log(total) / safe_counts), np.inf)
+        return indices.argmax(axis=1)
+
+    def __str__(self):
+        return f'DiscountedUCBAgent(arms={self.num_arms}, discount={self.discount})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
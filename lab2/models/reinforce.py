@@ -3,16 +3,20 @@ import sys
 import logging
 
 sys.path.insert(0, '../')
-from utils.utils import RunningMeanReinforce, softmax
+from utils.utils import ArmStatistics, sample_softmax, gumbel_top_k, gradient_bandit_update
 from base.multi_arm_bandit_agent import MultiArmBanditAgent
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+UPDATE_RULES = ('full_gradient', 'selected_arm')
+
 
 class ReinforceAgent(MultiArmBanditAgent):
 
-    def __init__(self, num_arms: int, baseline: bool = True, alpha: float = 0.3, beta: float = 0.3) -> None:
+    def __init__(self, num_arms: int, baseline: bool = True, alpha: float = 0.3, beta: float = 0.3,
+                 sampling: str = 'inverse_cdf', update_rule: str = 'full_gradient') -> None:
         """Initialize the ReinforceAgent. Each arm has a preference score, the
         agent selects an arm by sampling from the probability distribution defined
         by the softmax of the preferences. The baseline is used to estimate how
@@ -30,18 +34,32 @@ class ReinforceAgent(MultiArmBanditAgent):
             agent, by default 0.3
             Read more in banditsComparision.pdf in 'lab2/ques/'
         beta: float, optional
-            The rate at which the preference of the selected arm is to be updated
+            The rate at which the preferences are to be updated
+        sampling: str, optional
+            How the arm is sampled from the softmax of the preferences,
+            'inverse_cdf' or 'gumbel', by default 'inverse_cdf'
+        update_rule: str, optional
+            'full_gradient' moves every preference along the gradient of the
+            expected reward, the selected arm up and the others down in proportion
+            to their probability (see gradient_bandit_update); 'selected_arm' only
+            moves the preference of the selected arm, floored at 0. By default
+            'full_gradient'
         """
         super(ReinforceAgent, self).__init__()
+        if update_rule not in UPDATE_RULES:
+            raise ValueError(f'Unknown update rule: {update_rule}. Please choose from: {", ".join(UPDATE_RULES)}')
         self.num_arms = num_arms
         self.baseline = baseline
         self.beta = beta
-        self.running_means = [RunningMeanReinforce(baseline=self.baseline, beta=self.beta) for _ in range(self.num_arms)]
+        self.statistics = ArmStatistics(num_arms, fields=('preferences',))
         self._baseline_rewards_mean = 0.0
         self.alpha = alpha
+        self.sampling = sampling
+        self.update_rule = update_rule
+        self._scratch = np.empty(num_arms)
 
     def reset(self) -> None:
-        self.running_means = [RunningMeanReinforce(baseline=self.baseline, beta=self.beta) for _ in range(self.num_arms)]
+        self.statistics.reset()
         self._baseline_rewards_mean = 0.0
 
     @property
@@ -51,15 +69,23 @@ class ReinforceAgent(MultiArmBanditAgent):
     def update_mean(self, arm_index: int, reward: int) -> None:
         # update the running average reward, used for the baseline
         self._baseline_rewards_mean = (1 - self.alpha) * self._baseline_rewards_mean + self.alpha * reward
-        # update the underlying preference of the selected arm
-        self.running_means[arm_index].update_preference(reward, self.average_reward)
+        step = self.beta * (reward - (self.average_reward if self.baseline else 0))
+        preferences = self.statistics.preferences
+        if self.update_rule == 'full_gradient':
+            gradient_bandit_update(preferences, arm_index, step, out=self._scratch)
+        else:
+            # update the underlying preference of the selected arm
+            preferences[arm_index] = max(preferences[arm_index] + step, 0.0)
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """Sample k distinct arms for each of n users from the softmax of the
+        preferences, with Gumbel-top-k."""
+        return gumbel_top_k(np.broadcast_to(self.statistics.preferences, (n, self.num_arms)), k, np.random)
 
     def forward(self, state: int) -> int:
         """Choose the arm whose probability is maximum. The probability is calculated
         by taking softmax of the preferences of all arms."""
-        pi = softmax([mean.preference for mean in self.running_means])
-        # logger.info(f'pi: {pi}')
-        return np.random.choice(self.num_arms, 1, p=pi)[0]
+        return int(sample_softmax(self.statistics.preferences, np.random, method=self.sampling, out=self._scratch))
 
     def __call__(self, state: int) -> int:
         action = self.forward(state)
@@ -70,3 +96,54 @@ class ReinforceAgent(MultiArmBanditAgent):
 
     def __repr__(self) -> str:
         return self.__str__()
+
+
+class BatchedReinforceAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, baseline: bool = True, alpha: float = 0.3, beta: float = 0.3,
+                 sampling: str = 'inverse_cdf', update_rule: str = 'full_gradient', rng: np.random.Generator = None) -> None:
+        """ReinforceAgent playing num_runs runs at once. Same parameters as
+        ReinforceAgent, and rng, the generator used to sample the arms. The full
+        gradient update of all the runs is a single pass over the
+        (num_runs, num_arms) preferences."""
+        super(BatchedReinforceAgent, self).__init__(num_runs, num_arms, rng)
+        if update_rule not in UPDATE_RULES:
+            raise ValueError(f'Unknown update rule: {update_rule}. Please choose from: {", ".join(UPDATE_RULES)}')
+        self.baseline = baseline
+        self.alpha = alpha
+        self.beta = beta
+        self.statistics = ArmStatistics(num_arms, num_runs, fields=('preferences',))
+        self._baseline_rewards_mean = np.zeros(num_runs)
+        self.sampling = sampling
+        self.update_rule = update_rule
+        self._scratch = np.empty((num_runs, num_arms))
+
+    def reset(self) -> None:
+        self.statistics.reset()
+        self._baseline_rewards_mean[:] = 0
+
+    @property
+    def average_reward(self) -> np.ndarray:
+        return self._baseline_rewards_mean
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        # update the running average reward, used for the baseline
+        self._baseline_rewards_mean *= 1 - self.alpha
+        self._baseline_rewards_mean += self.alpha * rewards
+        steps = self.beta * (rewards - (self.average_reward if self.baseline else 0))
+        preferences, index = self.statistics.preferences, self.statistics.index(actions)
+        if self.update_rule == 'full_gradient':
+            gradient_bandit_update(preferences, index, steps, out=self._scratch)
+        else:
+            # update the underlying preference of the selected arms
+            preferences[index] = np.maximum(preferences[index] + steps, 0)
+
+    def forward(self, state: int) -> np.ndarray:
+        """Sample an arm in each run, from the softmax of the preferences."""
+        return sample_softmax(self.statistics.preferences, self.rng, method=self.sampling, out=self._scratch)
+
+    def __str__(self):
+        return f'ReinforceAgent(arms={self.num_arms}, baseline={self.baseline})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
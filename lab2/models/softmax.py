@@ -3,11 +3,11 @@ import sys
 from typing import List
 import logging
 from math import inf
-from data_loader.environments import MultiArmBanditEnvironment
 
 sys.path.insert(0, '../')
-from utils.utils import RunningMean, softmax
+from utils.utils import ArmStatistics, sample_softmax, gumbel_top_k
 from base.multi_arm_bandit_agent import MultiArmBanditAgent
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -16,7 +16,7 @@ logger.setLevel(logging.INFO)
 
 class SoftmaxAgent(MultiArmBanditAgent):
 
-    def __init__(self, num_arms: int, initial_temp: int = 1000, decay_factor: float=0.9) -> None:
+    def __init__(self, num_arms: int, initial_temp: int = 1000, decay_factor: float=0.9, sampling: str = 'inverse_cdf') -> None:
         """Softmax agent. The agent selects an action greedily with arm probabilities
         equal to the softmax applied to corresponding estimated means divided by the
         tempreature. The exploration part comes with high tempreature, where the 
@@ -34,22 +34,37 @@ class SoftmaxAgent(MultiArmBanditAgent):
             The multiplicant to be multiplied with the temprature each time the
             agent selects an action, by default 0.9
             T_new = T_old * decay_factor
+        sampling : str, optional
+            How the action is sampled from the softmax, 'inverse_cdf' or
+            'gumbel', by default 'inverse_cdf'
         """
         super(SoftmaxAgent, self).__init__()
         self.num_arms = num_arms
         self.current_temp = initial_temp
         self.initial_temp = initial_temp
         self.decay_factor = decay_factor
-        self.running_means = [RunningMean() for _ in range(num_arms)]
+        self.statistics = ArmStatistics(num_arms)
+        self.sampling = sampling
+        self._scratch = np.empty(num_arms)
 
     def reset(self) -> None:
         """Reset the agent."""
-        self.running_means = [RunningMean() for _ in range(self.num_arms)]
+        self.statistics.reset()
         self.current_temp = self.initial_temp
 
     def update_mean(self, arm_index: int, reward: int) -> None:
         """Update the running mean of the selected arm_index."""
-        self.running_means[arm_index].update_mean(reward)
+        self.statistics.update(arm_index, reward)
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the running means with many rewards at once."""
+        self.statistics.update_batch(actions, rewards)
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """Sample k distinct arms for each of n users from the softmax over the
+        estimated means, with Gumbel-top-k."""
+        self.current_temp = np.clip(self.current_temp * self.decay_factor, 0.001, inf)
+        return gumbel_top_k(np.broadcast_to(self.statistics.means, (n, self.num_arms)), k, np.random, self.current_temp)
 
     def forward(self, state: int) -> int:
         """Select an action using the softmax over the estimated means and the
@@ -65,10 +80,7 @@ class SoftmaxAgent(MultiArmBanditAgent):
         int
             The index of the arm selected.
         """
-        arm_selection_probs = softmax([
-            np.clip(mean.mean / self.current_temp, 0.001, 700) for mean in self.running_means])
-        action = np.random.choice(self.num_arms, p=arm_selection_probs)
-        return action
+        return int(sample_softmax(self.statistics.means, np.random, self.current_temp, method=self.sampling, out=self._scratch))
 
     def __call__(self, state: int) -> int:
         self.current_temp = np.clip(self.current_temp * self.decay_factor, 0.001, inf)
@@ -79,4 +91,43 @@ class SoftmaxAgent(MultiArmBanditAgent):
         return f'SoftmaxAgent(arms={self.num_arms})'
 
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+
+class BatchedSoftmaxAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, initial_temp: int = 1000, decay_factor: float=0.9,
+                 sampling: str = 'inverse_cdf', rng: np.random.Generator = None) -> None:
+        """Softmax agent playing num_runs runs at once. Same parameters as
+        SoftmaxAgent, and rng, the generator used to sample the arms."""
+        super(BatchedSoftmaxAgent, self).__init__(num_runs, num_arms, rng)
+        self.current_temp = initial_temp
+        self.initial_temp = initial_temp
+        self.decay_factor = decay_factor
+        self.statistics = ArmStatistics(num_arms, num_runs)
+        self.sampling = sampling
+        self._scratch = np.empty((num_runs, num_arms))
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+        self.current_temp = self.initial_temp
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        """Update the running means of the selected arms."""
+        self.statistics.update(actions, rewards)
+
+    def forward(self, state: int) -> np.ndarray:
+        """Sample an action in each run, from the softmax over the estimated means
+        and the current tempreature."""
+        return sample_softmax(self.statistics.means, self.rng, self.current_temp, method=self.sampling, out=self._scratch)
+
+    def __call__(self, state: int) -> np.ndarray:
+        self.current_temp = np.clip(self.current_temp * self.decay_factor, 0.001, inf)
+        return self.forward(state)
+
+    def __str__(self):
+        return f'SoftmaxAgent(arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
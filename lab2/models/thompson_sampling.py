@@ -1,19 +1,79 @@
 import numpy as np
 import sys
 import logging
+import unittest
 from math import inf
 
 sys.path.insert(0, '../')
-from utils.utils import RunningMeanThompsonBeta, RunningMeanThompsonGaussian
+from utils.utils import ArmStatistics, top_k
 from base.multi_arm_bandit_agent import MultiArmBanditAgent
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def get_statistics(num_arms: int, underlying_dist: str, num_runs: int = None) -> ArmStatistics:
+    """Allocate the statistics needed by the posterior of the underlying distribution."""
+    if underlying_dist == 'bernoulli':
+        return ArmStatistics(num_arms, num_runs, fields=('alpha', 'beta'))
+    elif underlying_dist == 'gaussian':
+        return ArmStatistics(num_arms, num_runs, fields=('counts', 'sums', 'm2'))
+    raise ValueError(f'Unknown underlying distribution {underlying_dist}')
+
+
+def gaussian_posterior(statistics: ArmStatistics) -> (np.ndarray, np.ndarray):
+    """Mean and std of the Gaussian posterior of every arm, following point 2 from
+    bayesNormal.pdf. The likelihood uses the empirical mean and std of the reward
+    history of the arm, with an initial reward of 0 prepended to it. Computed in
+    O(1) per arm from the Welford statistics instead of the history."""
+    initial_mean, initial_std = 0, 10000
+    counts = statistics.counts
+    means = statistics.means
+    # mean and sum of squared deviations of the rewards, once the initial 0 is added
+    mu = statistics.sums / (counts + 1)
+    m2 = statistics.m2 + counts / (counts + 1) * means**2
+    sigma = np.clip(np.sqrt(m2 / (counts + 1)), 0.001, 10_000)
+
+    std_sq = 1.0 / np.clip((1.0 / initial_std**2 + counts / sigma**2), 0.001, 10_000)
+    new_mean = std_sq * (initial_mean / initial_std**2 + mu * counts / sigma**2)
+    return new_mean, np.sqrt(std_sq)
+
+
+def sample_normal_gamma_posterior(statistics: ArmStatistics, rng, prior_mean: float = 0.0, prior_count: float = 1e-3,
+                                  prior_shape: float = 1.0, prior_rate: float = 1.0, size: tuple = None) -> np.ndarray:
+    """Draw the mean of every arm from the conjugate Normal-Gamma posterior over
+    the (unknown) mean and precision of its rewards, with one rng.gamma and one
+    rng.normal call for all the arms.
+
+    Parameters
+    ----------
+    statistics : ArmStatistics
+        Welford statistics (counts, sums, m2) of the rewards.
+    rng : np.random.Generator or the np.random module
+        Source of the random draws.
+    prior_mean, prior_count : float
+        Prior mean, and the number of pseudo observations it is worth.
+    prior_shape, prior_rate : float
+        Shape and rate of the Gamma prior over the precision.
+    size : tuple, optional
+        Shape of the draws, e.g. (n, num_arms) for n independent draws of every
+        arm, by default the shape of the statistics.
+    """
+    counts = statistics.counts
+    means = statistics.means
+    posterior_count = prior_count + counts
+    posterior_mean = (prior_count * prior_mean + counts * means) / posterior_count
+    posterior_shape = prior_shape + counts / 2
+    posterior_rate = prior_rate + statistics.m2 / 2 + prior_count * counts * (means - prior_mean)**2 / (2 * posterior_count)
+
+    precision = rng.gamma(posterior_shape, 1 / posterior_rate, size=size)
+    return rng.normal(posterior_mean, 1 / np.sqrt(posterior_count * precision), size=size)
+
+
 class ThompsonSamplingAgent(MultiArmBanditAgent):
 
-    def __init__(self, num_arms: int, underlying_dist: str = 'beta') -> None:
+    def __init__(self, num_arms: int, underlying_dist: str = 'beta', posterior: str = 'empirical') -> None:
         """Thompson Sampling Agent. The agent selects an action using a random
         draw from a Beta distribution. The distribution is updated each time the
         arm is selected. The initial exploration comes from the initialization
@@ -24,27 +84,49 @@ class ThompsonSamplingAgent(MultiArmBanditAgent):
         ----------
         num_arms : int
             The number of arms in the Multi Arm Bandit environment.
+        underlying_dist : str
+            'bernoulli' for a Beta posterior, 'gaussian' for a Gaussian one.
+        posterior : str, optional
+            For gaussian arms, 'empirical' plugs the empirical std of the rewards in
+            the posterior of the mean (bayesNormal.pdf), 'normal_gamma' uses the
+            conjugate posterior over both the mean and the precision, by default
+            'empirical'
         """
         super(ThompsonSamplingAgent, self).__init__()
         self.num_arms = num_arms
-        if underlying_dist == 'bernoulli':
-            self.RunningMean = RunningMeanThompsonBeta
-        elif underlying_dist == 'gaussian':
-            self.RunningMean = RunningMeanThompsonGaussian
-        else:
-            raise ValueError(f'Unknown underlying distribution {underlying_dist}')
-        self.running_means = [self.RunningMean() for _ in range(num_arms)]
+        self.underlying_dist = underlying_dist
+        self.posterior = posterior
+        self.statistics = get_statistics(num_arms, underlying_dist)
 
     def reset(self) -> None:
         """Reset the agent."""
-        self.running_means = [self.RunningMean() for _ in range(self.num_arms)]
+        self.statistics.reset()
 
     def update_mean(self, arm_index: int, reward: int) -> None:
-        self.running_means[arm_index].update_mean(reward)
+        self.statistics.update(arm_index, reward)
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update_batch(actions, rewards)
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """The k arms of highest draws, from an independent draw from the posterior
+        of every arm for each user."""
+        size = (n, self.num_arms)
+        if self.underlying_dist == 'bernoulli':
+            samples = np.random.beta(self.statistics.alpha, self.statistics.beta, size=size)
+        elif self.posterior == 'normal_gamma':
+            samples = sample_normal_gamma_posterior(self.statistics, np.random, size=size)
+        else:
+            samples = np.random.normal(*gaussian_posterior(self.statistics), size=size)
+        return top_k(samples, k)
 
     def forward(self, state: int) -> int:
-        """Select an action using a random draw from a Beta distribution."""
-        return np.argmax([mean.priority for mean in self.running_means])
+        """Select the arm with the highest draw from the posteriors, all drawn at once."""
+        if self.underlying_dist == 'bernoulli':
+            return np.argmax(np.random.beta(self.statistics.alpha, self.statistics.beta))
+        if self.posterior == 'normal_gamma':
+            return np.argmax(sample_normal_gamma_posterior(self.statistics, np.random))
+        return np.argmax(np.random.normal(*gaussian_posterior(self.statistics)))
 
     def __call__(self, state: int) -> int:
         action = self.forward(state)
@@ -54,4 +136,85 @@ class ThompsonSamplingAgent(MultiArmBanditAgent):
         return f'ThompsonSamplingAgent(arms={self.num_arms})'
     
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+
+class BatchedThompsonSamplingAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, underlying_dist: str = 'bernoulli', posterior: str = 'empirical',
+                 rng: np.random.Generator = None) -> None:
+        """Thompson Sampling agent playing num_runs runs at once. Same posteriors
+        as ThompsonSamplingAgent, with one draw per (run, arm) in a single call."""
+        super(BatchedThompsonSamplingAgent, self).__init__(num_runs, num_arms, rng)
+        self.underlying_dist = underlying_dist
+        self.posterior = posterior
+        self.statistics = get_statistics(num_arms, underlying_dist, num_runs)
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update(actions, rewards)
+
+    def forward(self, state: int) -> np.ndarray:
+        """Select the arm with the highest posterior draw in each run."""
+        if self.underlying_dist == 'bernoulli':
+            return np.argmax(self.rng.beta(self.statistics.alpha, self.statistics.beta), axis=1)
+        if self.posterior == 'normal_gamma':
+            return np.argmax(sample_normal_gamma_posterior(self.statistics, self.rng), axis=1)
+        return np.argmax(self.rng.normal(*gaussian_posterior(self.statistics)), axis=1)
+
+    def __str__(self) -> str:
+        return f'ThompsonSamplingAgent(arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class TestPosteriors(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.histories = [rng.normal(arm, 1 + arm, size=10 * (arm + 1)) for arm in range(4)]
+        self.statistics = get_statistics(4, 'gaussian')
+        for arm, history in enumerate(self.histories):
+            for reward in history:
+                self.statistics.update(arm, reward)
+
+    def test_gaussian_posterior_matches_history(self):
+        """The posterior from the Welford statistics should match the one from
+        the empirical mean and std of the reward history, initial 0 included."""
+        initial_mean, initial_std = 0, 10000
+        expected_means, expected_stds = [], []
+        for history in self.histories:
+            rewards = np.concatenate(([0.0], history))
+            mu, sigma = np.mean(rewards), np.clip(np.std(rewards), 0.001, 10_000)
+            std_sq = 1.0 / np.clip(1.0 / initial_std**2 + len(history) / sigma**2, 0.001, 10_000)
+            expected_means.append(std_sq * (initial_mean / initial_std**2 + mu * len(history) / sigma**2))
+            expected_stds.append(np.sqrt(std_sq))
+        means, stds = gaussian_posterior(self.statistics)
+        np.testing.assert_allclose(means, expected_means, rtol=1e-9)
+        np.testing.assert_allclose(stds, expected_stds, rtol=1e-9)
+
+    def test_gaussian_posterior_of_unpulled_arms(self):
+        means, stds = gaussian_posterior(get_statistics(3, 'gaussian'))
+        np.testing.assert_allclose(means, 0)
+        self.assertTrue(np.all(np.isfinite(stds)))
+
+    def test_normal_gamma_shapes(self):
+        rng = np.random.default_rng(1)
+        self.assertEqual(sample_normal_gamma_posterior(self.statistics, rng).shape, (4,))
+        self.assertEqual(sample_normal_gamma_posterior(self.statistics, rng, size=(5, 4)).shape, (5, 4))
+        batched = get_statistics(4, 'gaussian', num_runs=6)
+        batched.update(np.arange(6) % 4, np.ones(6))
+        self.assertEqual(sample_normal_gamma_posterior(batched, rng).shape, (6, 4))
+
+    def test_normal_gamma_concentrates_on_the_means(self):
+        """With many rewards, the draws of the mean should concentrate on the
+        empirical mean of the arm."""
+        draws = sample_normal_gamma_posterior(self.statistics, np.random.default_rng(2), size=(2000, 4))
+        np.testing.assert_allclose(draws.mean(axis=0), [np.mean(h) for h in self.histories], atol=0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
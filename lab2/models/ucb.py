@@ -1,15 +1,84 @@
 import numpy as np
 import sys
+import heapq
 import logging
+import unittest
 from math import inf
 
 sys.path.insert(0, '../')
-from utils.utils import RunningMeanUCB
+from utils.utils import ArmStatistics, top_k
 from base.multi_arm_bandit_agent import MultiArmBanditAgent
+from base.batched_multi_arm_bandit_agent import BatchedMultiArmBanditAgent
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+UCB_VARIANTS = ('ucb1', 'ucb_v', 'kl_ucb', 'moss')
+
+
+def _bernoulli_kl(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    eps = 1e-12
+    p, q = np.clip(p, eps, 1 - eps), np.clip(q, eps, 1 - eps)
+    return p * np.log(p / q) + (1 - p) * np.log((1 - p) / (1 - q))
+
+
+def ucb_indices(variant: str, statistics: ArmStatistics, time: float, horizon: int = None,
+                reward_range: float = 1.0, kl_iterations: int = 32, num_arms: int = None) -> np.ndarray:
+    """Compute the upper confidence bound of every arm at once, for arrays of
+    statistics of any shape. Arms which were never played get an infinite index.
+
+    Parameters
+    ----------
+    variant : str
+        'ucb1': mean + sqrt(2 log(t) / n)
+        'ucb_v': mean + sqrt(2 var log(t) / n) + 3 reward_range log(t) / n
+        'kl_ucb': largest q with n kl(mean, q) <= log(t), the Bernoulli kl of the
+            means rescaled to [0, 1] by reward_range
+        'moss': mean + sqrt(max(log(horizon / (num_arms n)), 0) / n)
+    statistics : ArmStatistics
+        The counts, sums (and m2 for 'ucb_v') of the arms.
+    time : float
+        The total number of pulls so far.
+    horizon : int, optional
+        The total number of timesteps, needed by 'moss'.
+    reward_range : float, optional
+        Bound on the range of the rewards, which are assumed to lie in
+        [0, reward_range] by 'kl_ucb', used by 'ucb_v' and 'kl_ucb', by default 1.0
+    kl_iterations : int, optional
+        Number of bisection steps of 'kl_ucb', by default 32
+    num_arms : int, optional
+        Number of arms of the bandit, used by 'moss', by default the last
+        dimension of the statistics
+    """
+    counts = statistics.counts
+    played = counts > 0
+    safe_counts = np.maximum(counts, 1)
+    means = statistics.means
+    log_time = np.log(max(time, 1))
+
+    if variant == 'ucb1':
+        indices = means + np.sqrt(2 * log_time / safe_counts)
+    elif variant == 'ucb_v':
+        variances = statistics.m2 / safe_counts
+        indices = means + np.sqrt(2 * variances * log_time / safe_counts) + 3 * reward_range * log_time / safe_counts
+    elif variant == 'kl_ucb':
+        scaled_means = np.clip(means / reward_range, 0, 1)
+        low, high = scaled_means.copy(), np.ones_like(scaled_means)
+        for _ in range(kl_iterations):
+            mid = (low + high) / 2
+            inside = safe_counts * _bernoulli_kl(scaled_means, mid) <= log_time
+            low = np.where(inside, mid, low)
+            high = np.where(inside, high, mid)
+        indices = low * reward_range
+    elif variant == 'moss':
+        if horizon is None:
+            raise ValueError('moss needs the horizon')
+        num_arms = counts.shape[-1] if num_arms is None else num_arms
+        indices = means + np.sqrt(np.maximum(np.log(horizon / (num_arms * safe_counts)), 0) / safe_counts)
+    else:
+        raise ValueError(f'Unknown UCB variant {variant}, must be one of {UCB_VARIANTS}')
+    return np.where(played, indices, inf)
+
 
 class UCBAgent(MultiArmBanditAgent):
 
@@ -27,28 +96,260 @@ class UCBAgent(MultiArmBanditAgent):
         """
         super(UCBAgent, self).__init__()
         self.num_arms = num_arms
-        self.running_means = [RunningMeanUCB() for _ in range(num_arms)]
+        self.statistics = ArmStatistics(num_arms)
+        self.bonus = np.full(num_arms, inf)
+        self.time = 0
 
     def reset(self) -> None:
         """Reset the agent."""
-        self.running_means = [RunningMeanUCB() for _ in range(self.num_arms)]
+        self.statistics.reset()
+        self.bonus[:] = inf
+        self.time = 0
 
     def update_mean(self, arm_index: int, reward: int) -> None:
-        self.running_means[arm_index].update_mean(reward)
+        self.statistics.update(arm_index, reward)
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update_batch(actions, rewards)
 
     def forward(self, state: int) -> int:
         """Select an action using the UCB over the estimated means and the bonus
         term."""
-        return np.argmax([mean.priority for mean in self.running_means])
+        return np.argmax(self.statistics.means + self.bonus)
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """The k arms of highest UCB, the same for the n users, after which the
+        time moves by the n * k pulls."""
+        arms = top_k(np.broadcast_to(self.statistics.means + self.bonus, (n, self.num_arms)), k)
+        self.tick(n * k)
+        return arms
+
+    def tick(self, steps: int = 1) -> None:
+        """Refresh the bonus terms of the arms which have been played, using the
+        time passed and their pull counts."""
+        self.time += steps
+        counts = self.statistics.counts
+        np.sqrt(2 * np.log(self.time) / np.maximum(counts, 1), out=self.bonus, where=counts > 0)
 
     def __call__(self, state: int) -> int:
         action = self.forward(state)
-        for mean in self.running_means:
-            mean.tick()
+        self.tick()
         return action
 
     def __str__(self) -> str:
         return f'UCBAgent(arms={self.num_arms})'
 
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+
+class BatchedUCBAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, rng: np.random.Generator = None) -> None:
+        """UCB agent playing num_runs runs at once. Same as UCBAgent: the bonus
+        terms are refreshed after every selection (tick), using the pull counts
+        known at that time."""
+        super(BatchedUCBAgent, self).__init__(num_runs, num_arms, rng)
+        self.statistics = ArmStatistics(num_arms, num_runs)
+        self.bonus = np.full((num_runs, num_arms), inf)
+        self.time = 0
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+        self.bonus[:] = inf
+        self.time = 0
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update(actions, rewards)
+
+    def forward(self, state: int) -> np.ndarray:
+        """Select an action in each run using the UCB over the estimated means and
+        the bonus term."""
+        return np.argmax(self.statistics.means + self.bonus, axis=1)
+
+    def tick(self) -> None:
+        self.time += 1
+        counts = self.statistics.counts
+        np.sqrt(2 * np.log(self.time) / np.maximum(counts, 1), out=self.bonus, where=counts > 0)
+
+    def __call__(self, state: int) -> np.ndarray:
+        actions = self.forward(state)
+        self.tick()
+        return actions
+
+    def __str__(self) -> str:
+        return f'UCBAgent(arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class LazyUCBAgent(MultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, variant: str = 'ucb1', horizon: int = None, reward_range: float = 1.0,
+                 use_heap: bool = False) -> None:
+        """UCB agent which keeps a single time counter, instead of ticking every
+        arm, and computes the bonuses of all arms on demand in one vectorized call.
+
+        With use_heap, the arms are kept in a max-heap of their indices, and only
+        the index of the played arm is recomputed after each step, so a selection
+        costs O(log(num_arms)). For this, log(t) is frozen at its value at the end
+        of the current epoch, the epochs doubling in length ([2^k, 2^(k+1))), and
+        the heap is rebuilt when an epoch ends. This overestimates log(t) by at
+        most log(2). The 'moss' index does not depend on t, so its heap is exact.
+
+        Parameters
+        ----------
+        num_arms : int
+            The number of arms in the Multi Arm Bandit environment.
+        variant : str, optional
+            One of 'ucb1', 'ucb_v', 'kl_ucb', 'moss', by default 'ucb1'.
+            See ucb_indices.
+        horizon : int, optional
+            Total number of timesteps, needed by 'moss'.
+        reward_range : float, optional
+            Bound on the range of the rewards, used by 'ucb_v' and 'kl_ucb' (which
+            assumes rewards in [0, reward_range]), by default 1.0
+        use_heap : bool, optional
+            Select the arm from a heap of indices, by default False
+        """
+        super(LazyUCBAgent, self).__init__()
+        if variant not in UCB_VARIANTS:
+            raise ValueError(f'Unknown UCB variant {variant}, must be one of {UCB_VARIANTS}')
+        self.num_arms = num_arms
+        self.variant = variant
+        self.horizon = horizon
+        self.reward_range = reward_range
+        self.use_heap = use_heap
+        fields = ('counts', 'sums', 'm2') if variant == 'ucb_v' else ('counts', 'sums')
+        self.statistics = ArmStatistics(num_arms, fields=fields)
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+        self.time = 0
+        self._heap = []
+        self._heap_time = None
+        self._versions = np.zeros(self.num_arms, dtype=np.int64)
+
+    def indices(self, time: float = None) -> np.ndarray:
+        """Upper confidence bounds of all the arms at the given (by default, current) time."""
+        return ucb_indices(self.variant, self.statistics, self.time if time is None else time,
+                           horizon=self.horizon, reward_range=self.reward_range)
+
+    def _arm_index(self, arm_index: int) -> float:
+        """Index of a single arm, at the frozen time of the heap."""
+        return ucb_indices(self.variant, self.statistics.subset([arm_index]), self._heap_time, horizon=self.horizon,
+                           reward_range=self.reward_range, num_arms=self.num_arms)[0]
+
+    def _rebuild_heap(self) -> None:
+        self._heap_time = 1 << max(int(self.time), 1).bit_length()
+        indices = self.indices(time=self._heap_time)
+        self._heap = [(-index, arm, self._versions[arm]) for arm, index in enumerate(indices)]
+        heapq.heapify(self._heap)
+
+    def update_mean(self, arm_index: int, reward: int) -> None:
+        self.statistics.update(arm_index, reward)
+        if self.use_heap and self._heap_time is not None:
+            # the old entry of the arm gets stale, and is dropped when it reaches the top
+            self._versions[arm_index] += 1
+            heapq.heappush(self._heap, (-self._arm_index(arm_index), arm_index, self._versions[arm_index]))
+
+    def update_batch(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update_batch(actions, rewards)
+        # many arms changed at once, the heap is rebuilt on the next selection
+        self._heap_time = None
+
+    def select_batch(self, n: int, k: int = 1) -> np.ndarray:
+        """The k arms of highest index, the same for the n users, the time moving
+        by the n * k pulls first."""
+        self.time += n * k
+        return top_k(np.broadcast_to(self.indices(), (n, self.num_arms)), k)
+
+    def forward(self, state: int) -> int:
+        """Select the arm with the highest upper confidence bound."""
+        if not self.use_heap:
+            return np.argmax(self.indices())
+
+        if self._heap_time is None or self.time >= self._heap_time or len(self._heap) > 4 * self.num_arms:
+            self._rebuild_heap()
+        while self._heap[0][2] != self._versions[self._heap[0][1]]:
+            heapq.heappop(self._heap)
+        return self._heap[0][1]
+
+    def __call__(self, state: int) -> int:
+        self.time += 1
+        return self.forward(state)
+
+    def __str__(self) -> str:
+        return f'LazyUCBAgent(variant={self.variant}, arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BatchedLazyUCBAgent(BatchedMultiArmBanditAgent):
+
+    def __init__(self, num_arms: int, num_runs: int, variant: str = 'ucb1', horizon: int = None,
+                 reward_range: float = 1.0, rng: np.random.Generator = None) -> None:
+        """LazyUCBAgent playing num_runs runs at once, the indices of all (run, arm)
+        pairs being computed in a single vectorized call."""
+        super(BatchedLazyUCBAgent, self).__init__(num_runs, num_arms, rng)
+        if variant not in UCB_VARIANTS:
+            raise ValueError(f'Unknown UCB variant {variant}, must be one of {UCB_VARIANTS}')
+        self.variant = variant
+        self.horizon = horizon
+        self.reward_range = reward_range
+        fields = ('counts', 'sums', 'm2') if variant == 'ucb_v' else ('counts', 'sums')
+        self.statistics = ArmStatistics(num_arms, num_runs, fields=fields)
+        self.time = 0
+
+    def reset(self) -> None:
+        """Reset the agent."""
+        self.statistics.reset()
+        self.time = 0
+
+    def update_mean(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        self.statistics.update(actions, rewards)
+
+    def forward(self, state: int) -> np.ndarray:
+        """Select the arm with the highest upper confidence bound in each run."""
+        indices = ucb_indices(self.variant, self.statistics, self.time, horizon=self.horizon,
+                              reward_range=self.reward_range)
+        return np.argmax(indices, axis=1)
+
+    def __call__(self, state: int) -> np.ndarray:
+        self.time += 1
+        return self.forward(state)
+
+    def __str__(self) -> str:
+        return f'LazyUCBAgent(variant={self.variant}, arms={self.num_arms})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class TestUCBIndices(unittest.TestCase):
+    def test_kl_ucb_rescales_the_rewards(self):
+        statistics = ArmStatistics(3)
+        for arm, reward in enumerate((12.0, 25.0, 41.0)):
+            statistics.update(arm, reward)
+        indices = ucb_indices('kl_ucb', statistics, time=3, reward_range=100.0)
+        # the order of the means is kept, and the bounds stay within the range
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertTrue(np.all((indices >= [12, 25, 41]) & (indices <= 100)))
+
+    def test_kl_ucb_bernoulli(self):
+        statistics = ArmStatistics(2)
+        for _ in range(100):
+            statistics.update(0, 1.0)
+            statistics.update(1, 0.0)
+        indices = ucb_indices('kl_ucb', statistics, time=200)
+        self.assertGreater(indices[0], indices[1])
+        self.assertTrue(np.all((indices >= [1, 0]) & (indices <= 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,18 @@
 import numpy as np
-import hydra
 import pathlib
 from tqdm import tqdm
-import wandb
 import logging
 import sys
+import unittest
 
-from data_loader.environments import MultiArmBanditEnvironment
+# hydra, wandb, omegaconf and the non stationary environments are imported where
+# they are used: short sweep jobs should not pay for what they do not use
+from data_loader.environments import MultiArmBanditEnvironment, BatchedMultiArmBanditEnvironment
 from data_loader.bandit_arm_reward_initializer import BanditArmRewardInitializer
-from models import ReinforceAgent, EpsilonGreedyAgent, UCBAgent, ThompsonSamplingAgent, SoftmaxAgent
+import models
+from utils.results_store import ResultsStore, config_hash
+from utils.checkpoint import Checkpointer
+from utils.regret_analytics import action_dtype, regret_summary
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,37 +24,186 @@ logger.addHandler(handler)
 logger.propagate = False
 
 
-@hydra.main(config_path="conf", config_name="config")
-def main(cfg):
-    wandb_run = wandb.init(project="multi_arm_bandit", entity="harshraj22", mode=cfg.wandb_tracking)
-    np.random.seed(cfg.seed)
+def get_batched_agent(cfg, num_arms: int, rng: np.random.Generator):
+    """Create the batched version of the agent, playing all the cfg.num_runs runs at once."""
+    if cfg.agent.type == 'eps_greedy':
+        return models.BatchedEpsilonGreedyAgent(cfg.agent.eps_greedy.epsilon, num_arms, cfg.num_runs, initial_temp=cfg.agent.eps_greedy.initial_temp, decay_factor=cfg.agent.eps_greedy.decay_factor, rng=rng)
+    elif cfg.agent.type == 'softmax':
+        return models.BatchedSoftmaxAgent(num_arms, cfg.num_runs, initial_temp=cfg.agent.softmax.initial_temp, decay_factor=cfg.agent.softmax.decay_factor, sampling=cfg.agent.softmax.sampling, rng=rng)
+    elif cfg.agent.type == 'ucb':
+        if cfg.agent.ucb.variant == 'ucb':
+            return models.BatchedUCBAgent(num_arms, cfg.num_runs, rng=rng)
+        return models.BatchedLazyUCBAgent(num_arms, cfg.num_runs, variant=cfg.agent.ucb.variant, horizon=cfg.total_timesteps,
+                                          reward_range=cfg.agent.ucb.reward_range, rng=rng)
+    elif cfg.agent.type == 'thompson_sampling':
+        return models.BatchedThompsonSamplingAgent(num_arms, cfg.num_runs, underlying_dist=cfg.env.reward_dist, posterior=cfg.agent.thompson_sampling.posterior, rng=rng)
+    elif cfg.agent.type == 'sw_ucb':
+        return models.BatchedSlidingWindowUCBAgent(num_arms, cfg.num_runs, window=cfg.agent.sw_ucb.window, exploration=cfg.agent.sw_ucb.exploration, rng=rng)
+    elif cfg.agent.type == 'd_ucb':
+        return models.BatchedDiscountedUCBAgent(num_arms, cfg.num_runs, discount=cfg.agent.d_ucb.discount, exploration=cfg.agent.d_ucb.exploration, rng=rng)
+    elif cfg.agent.type in ('lin_ucb', 'lin_ts'):
+        if cfg.env.type != 'contextual':
+            raise ValueError(f'{cfg.agent.type} needs the contextual environment (env.type=contextual)')
+        if cfg.agent.type == 'lin_ucb':
+            return models.BatchedLinUCBAgent(num_arms, cfg.num_runs, cfg.env.context_dim, regularization=cfg.agent.linear.regularization, exploration=cfg.agent.linear.exploration, rng=rng)
+        return models.BatchedLinTSAgent(num_arms, cfg.num_runs, cfg.env.context_dim, regularization=cfg.agent.linear.regularization, posterior_scale=cfg.agent.linear.exploration, rng=rng)
+    elif cfg.agent.type == 'reinforce':
+        return models.BatchedReinforceAgent(num_arms, cfg.num_runs, baseline=cfg.agent.reinforce.baseline, beta=cfg.agent.reinforce.beta, alpha=cfg.agent.reinforce.alpha, sampling=cfg.agent.reinforce.sampling, update_rule=cfg.agent.reinforce.update_rule, rng=rng)
+    raise ValueError(f'Unknown agent type: {cfg.agent.type}. Please choose from: eps_greedy, softmax, ucb, thompson_sampling, reinforce, '
+                     'sw_ucb, d_ucb, lin_ucb, lin_ts')
+
+
+def check_ucb_reward_range(cfg, optimal_mean: float) -> None:
+    """kl_ucb assumes the rewards lie in [0, agent.ucb.reward_range]: a range
+    below the mean of the best arm would squash all the indices to the bound."""
+    if cfg.agent.ucb.variant == 'kl_ucb' and optimal_mean > cfg.agent.ucb.reward_range:
+        raise ValueError(f'kl_ucb needs rewards in [0, agent.ucb.reward_range], but the best arm has mean {optimal_mean:.3f} '
+                         f'and reward_range={cfg.agent.ucb.reward_range}: set agent.ucb.reward_range to a bound on the rewards')
+
 
+def get_batched_environment(cfg, rng: np.random.Generator):
+    """Create the environment playing all the cfg.num_runs runs at once."""
+    if cfg.env.type == 'stationary':
+        return BatchedMultiArmBanditEnvironment(
+            arm_initializer=BanditArmRewardInitializer(cfg.env.reward_dist),
+            num_arms=cfg.env.num_arms,
+            total_timesteps=cfg.total_timesteps,
+            num_runs=cfg.num_runs,
+            rng=rng,
+            block_size=cfg.env.block_size
+            )
+    from data_loader.dynamic_environments import (DriftingBanditEnvironment, SwitchingBanditEnvironment,
+                                                   LinearContextualBanditEnvironment)
+    # the dynamic environments always draw their means in blocks
+    block_size = cfg.env.block_size or 1
+    if cfg.env.type == 'drifting':
+        return DriftingBanditEnvironment(cfg.env.num_arms, cfg.total_timesteps, cfg.num_runs, noise_sigma=cfg.env.noise_sigma,
+                                         drift_sigma=cfg.env.drift_sigma, block_size=block_size, rng=rng)
+    elif cfg.env.type == 'switching':
+        return SwitchingBanditEnvironment(cfg.env.num_arms, cfg.total_timesteps, cfg.num_runs, noise_sigma=cfg.env.noise_sigma,
+                                          switch_prob=cfg.env.switch_prob, block_size=block_size, rng=rng)
+    elif cfg.env.type == 'contextual':
+        return LinearContextualBanditEnvironment(cfg.env.num_arms, cfg.total_timesteps, cfg.num_runs, noise_sigma=cfg.env.noise_sigma,
+                                                 context_dim=cfg.env.context_dim, block_size=block_size, rng=rng)
+    raise ValueError(f'Unknown environment type: {cfg.env.type}. Please choose from: stationary, drifting, switching, contextual')
+
+
+def save_results(cfg, rewards: np.ndarray, optimal_arm_hits: np.ndarray, actions: np.ndarray, arm_means: np.ndarray,
+                 mu_star: float, agent_name: str) -> str:
+    """Write the results of the run to the ResultsStore at cfg.results.root, and
+    return the hash of its config. The chosen arms and the arm means are kept, so
+    that regret_analytics can be computed from the store later."""
+    from omegaconf import OmegaConf
+    store = ResultsStore(cfg.results.root, compress=cfg.results.compress, dtype=cfg.results.dtype)
+    return store.write(OmegaConf.to_container(cfg, resolve=True),
+                       {'rewards': rewards, 'optimal_arm_hits': optimal_arm_hits, 'actions': actions},
+                       agent_name=agent_name, optimal_mean=float(mu_star),
+                       arm_means=None if arm_means is None else arm_means.tolist())
+
+
+def get_checkpointer(cfg) -> Checkpointer:
+    """Checkpointer of the run, saving to cfg.checkpoint.dir under the hash of
+    the config, so that the same config finds its checkpoint again."""
+    import hydra
+    from omegaconf import OmegaConf
+    # hydra runs the script from a new output directory every time
+    checkpoint_dir = pathlib.Path(hydra.utils.to_absolute_path(cfg.checkpoint.dir))
+    key = config_hash(OmegaConf.to_container(cfg, resolve=True))
+    return Checkpointer(checkpoint_dir / f'{key}.pkl', every_seconds=cfg.checkpoint.every_seconds)
+
+
+def run_batched(cfg, checkpointer: Checkpointer = None, resume: bool = False) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, float, str):
+    """Play all the runs at once, with the batched environment and agent. Returns
+    the rewards, optimal_arm_hits and chosen arms (actions) matrices of shape
+    (num_runs, total_timesteps), the means of the arms (None when they change
+    over time), the optimal mean and the agent's name. With a checkpointer, the state is saved
+    periodically between two timesteps, and with 'resume' the run starts again
+    from the last checkpoint, if any."""
+    state = checkpointer.load() if checkpointer is not None and resume else None
+    if state is None:
+        rng = np.random.default_rng(cfg.seed)
+        env = get_batched_environment(cfg, rng)
+        if cfg.agent.type == 'ucb':
+            check_ucb_reward_range(cfg, env.optimal_mean)
+        agent = get_batched_agent(cfg, env.num_arms, rng)
+
+        rewards = np.zeros((cfg.num_runs, cfg.total_timesteps))
+        optimal_arm_hits = np.zeros((cfg.num_runs, cfg.total_timesteps))
+        actions_taken = np.zeros((cfg.num_runs, cfg.total_timesteps), dtype=action_dtype(env.num_arms))
+        completed_timesteps = 0
+
+        agent.reset()
+        obs = env.reset()
+    else:
+        # the agent and the environment share the generator, pickled once with them
+        env, agent, obs = state['env'], state['agent'], state['obs']
+        rewards, optimal_arm_hits, completed_timesteps = state['rewards'], state['optimal_arm_hits'], state['completed_timesteps']
+        actions_taken = state['actions']
+        logger.info(f'Resuming from timestep {completed_timesteps} of {cfg.total_timesteps}')
+
+    for current_timestep in tqdm(range(completed_timesteps + 1, cfg.total_timesteps + 1)):
+        actions = agent(obs)
+        obs, step_rewards, done, info = env.step(actions)
+        rewards[:, current_timestep - 1] = step_rewards
+        optimal_arm_hits[:, current_timestep - 1] = info['optimal_arm_hits'] / current_timestep
+        actions_taken[:, current_timestep - 1] = actions
+        agent.update_mean(actions, step_rewards)
+        if checkpointer is not None and checkpointer.due():
+            checkpointer.save({'env': env, 'agent': agent, 'obs': obs, 'rewards': rewards, 'optimal_arm_hits': optimal_arm_hits,
+                               'actions': actions_taken, 'completed_timesteps': current_timestep})
+    arm_means = env.arm_means if cfg.env.type == 'stationary' else None
+    return rewards, optimal_arm_hits, actions_taken, arm_means, env.optimal_mean, str(agent)
+
+
+def run_sequential(cfg, checkpointer: Checkpointer = None, resume: bool = False) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, float, str):
+    """Play the runs one after the other, one timestep at a time, returning the
+    same results as run_batched. With a
+    checkpointer, the state is saved periodically between two runs, and with
+    'resume' the runs start again after the last completed one."""
+    if cfg.env.type != 'stationary':
+        raise ValueError(f'The {cfg.env.type} environment is only played with vectorized=True')
     env = MultiArmBanditEnvironment(
         arm_initializer=BanditArmRewardInitializer(cfg.env.reward_dist),
         num_arms=cfg.env.num_arms,
-        total_timesteps=cfg.total_timesteps
+        total_timesteps=cfg.total_timesteps,
+        block_size=cfg.env.block_size,
+        rng=np.random.default_rng(cfg.seed)
         )
 
     if cfg.agent.type == 'eps_greedy':
-        agent = EpsilonGreedyAgent(cfg.agent.eps_greedy.epsilon, env.num_arms, initial_temp=cfg.agent.eps_greedy.initial_temp, decay_factor=cfg.agent.eps_greedy.decay_factor)
+        agent = models.EpsilonGreedyAgent(cfg.agent.eps_greedy.epsilon, env.num_arms, initial_temp=cfg.agent.eps_greedy.initial_temp, decay_factor=cfg.agent.eps_greedy.decay_factor)
     elif cfg.agent.type == 'softmax':
-        agent = SoftmaxAgent(env.num_arms, initial_temp=cfg.agent.softmax.initial_temp, decay_factor=cfg.agent.softmax.decay_factor)
+        agent = models.SoftmaxAgent(env.num_arms, initial_temp=cfg.agent.softmax.initial_temp, decay_factor=cfg.agent.softmax.decay_factor, sampling=cfg.agent.softmax.sampling)
     elif cfg.agent.type == 'ucb':
-        agent = UCBAgent(env.num_arms)
+        if cfg.agent.ucb.variant == 'ucb':
+            agent = models.UCBAgent(env.num_arms)
+        else:
+            check_ucb_reward_range(cfg, env.optimal_mean)
+            agent = models.LazyUCBAgent(env.num_arms, variant=cfg.agent.ucb.variant, horizon=cfg.total_timesteps,
+                                        reward_range=cfg.agent.ucb.reward_range, use_heap=cfg.agent.ucb.use_heap)
     elif cfg.agent.type == 'thompson_sampling':
-        agent = ThompsonSamplingAgent(env.num_arms, underlying_dist=cfg.env.reward_dist)
+        agent = models.ThompsonSamplingAgent(env.num_arms, underlying_dist=cfg.env.reward_dist, posterior=cfg.agent.thompson_sampling.posterior)
     elif cfg.agent.type == 'reinforce':
-        agent = ReinforceAgent(env.num_arms, baseline=cfg.agent.reinforce.baseline, beta=cfg.agent.reinforce.beta, alpha=cfg.agent.reinforce.alpha)
+        agent = models.ReinforceAgent(env.num_arms, baseline=cfg.agent.reinforce.baseline, beta=cfg.agent.reinforce.beta, alpha=cfg.agent.reinforce.alpha, sampling=cfg.agent.reinforce.sampling, update_rule=cfg.agent.reinforce.update_rule)
     else:
         raise ValueError(f'Unknown agent type: {cfg.agent.type}. Please choose from: eps_greedy, softmax, ucb, thompson_sampling, reinforce')
 
-    wandb_run.name = str(agent)
-
     rewards = np.zeros((cfg.num_runs, cfg.total_timesteps))
     optimal_arm_hits = np.zeros((cfg.num_runs, cfg.total_timesteps))
+    actions_taken = np.zeros((cfg.num_runs, cfg.total_timesteps), dtype=action_dtype(env.num_arms))
+    completed_runs = 0
+
+    state = checkpointer.load() if checkpointer is not None and resume else None
+    if state is not None:
+        # the agents sample with the global generator, the environment with its own
+        env, agent = state['env'], state['agent']
+        rewards, optimal_arm_hits, completed_runs = state['rewards'], state['optimal_arm_hits'], state['completed_runs']
+        actions_taken = state['actions']
+        np.random.set_state(state['np_random_state'])
+        logger.info(f'Resuming after run {completed_runs} of {cfg.num_runs}')
     mu_star = env.optimal_mean
 
-    for run_index in tqdm(range(cfg.num_runs)):
+    for run_index in tqdm(range(completed_runs, cfg.num_runs)):
         agent.reset()
         obs = env.reset()
 
@@ -59,30 +212,93 @@ def main(cfg):
             obs, reward, done, info = env.step(action)
             rewards[run_index][current_timestep - 1] = reward
             optimal_arm_hits[run_index][current_timestep - 1] = info['optimal_arm_hits'] / current_timestep
+            actions_taken[run_index][current_timestep - 1] = action
             # logger.info(f'Env: {env.reward_distributions} | Action: {action} | Reward: {reward:.3f}')
             agent.update_mean(action, reward)
         logger.info(f"info: {info}")
+        if checkpointer is not None and checkpointer.due():
+            checkpointer.save({'env': env, 'agent': agent, 'rewards': rewards, 'optimal_arm_hits': optimal_arm_hits,
+                               'actions': actions_taken, 'completed_runs': run_index + 1,
+                               'np_random_state': np.random.get_state()})
+    return rewards, optimal_arm_hits, actions_taken, env.arm_means, mu_star, str(agent)
+
+
+def main(cfg):
+    wandb_run = None
+    if cfg.wandb_tracking != 'disabled':
+        import wandb
+        wandb_run = wandb.init(project="multi_arm_bandit", entity="harshraj22", mode=cfg.wandb_tracking)
+    np.random.seed(cfg.seed)
 
-    mean_rewards = np.mean(rewards, axis=0)
-    mean_optimal_arm_hits = np.mean(optimal_arm_hits, axis=0)
-    cummulative_mean_reward = 0
-    for mean_reward, mean_optimal_arm_hit, current_timestep in zip(mean_rewards, mean_optimal_arm_hits, range(cfg.total_timesteps)):
-        cummulative_mean_reward += mean_reward
-        regret = mu_star * current_timestep - cummulative_mean_reward
-        wandb.log({
-            f"mean_reward: {cfg.env.num_arms} arms, {cfg.env.reward_dist} distribution": mean_reward,
-            f"optimal_arm_percentage: {cfg.env.num_arms} arms, {cfg.env.reward_dist} distribution": mean_optimal_arm_hit,
-            f"regret: {cfg.env.num_arms} arms, {cfg.env.reward_dist} distribution": regret
-        })
+    checkpointer = get_checkpointer(cfg) if cfg.checkpoint.enabled else None
+    if cfg.vectorized:
+        rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name = run_batched(cfg, checkpointer, resume=cfg.resume)
+    else:
+        rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name = run_sequential(cfg, checkpointer, resume=cfg.resume)
+    if arm_means is not None:
+        summary = regret_summary(actions, arm_means, mu_star)
+        logger.info(f'Pseudo-regret: {summary["pseudo_regret"][-1]:.2f} '
+                    f'[{summary["pseudo_regret_lower"][-1]:.2f}, {summary["pseudo_regret_upper"][-1]:.2f}] | '
+                    f'pulls per arm: {np.round(summary["pull_fractions"], 3)}')
+    if cfg.results.store:
+        import hydra
+        # hydra runs the script from its output directory
+        cfg.results.root = hydra.utils.to_absolute_path(cfg.results.root)
+        save_results(cfg, rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name)
+    if checkpointer is not None:
+        # the run is complete, a later job with the same config starts over
+        checkpointer.remove()
+
+    if wandb_run is not None:
+        from utils.wandb_logger import CurveLogger, compute_curves
+        wandb_run.name = agent_name
+        curve_logger = CurveLogger(mode=cfg.logging.mode, max_points=cfg.logging.max_points, flush_every=cfg.logging.flush_every,
+                                   asynchronous=cfg.logging.asynchronous)
+        curve_logger.log_curves(compute_curves(rewards, optimal_arm_hits, mu_star, actions, arm_means),
+                                suffix=f": {cfg.env.num_arms} arms, {cfg.env.reward_dist} distribution")
+        curve_logger.close()
+        wandb_run.finish()
 
     # logger.info(f'\nRewards: \n{rewards} \nMean: {mean_rewards}')
     # logger.info(f'\nOptimal arm hits: \n{optimal_arm_hits} \nMean: {mean_optimal_arm_hits}')
     # logger.info(f'Mean reward: {mean_rewards.shape}')
     # logger.info(f'Env: {env}')
 
+class TestBatchedMatchesSequential(unittest.TestCase):
+    """The batched agents draw from another generator than the sequential ones,
+    so the runs are not identical: the mean reward and the final fraction of
+    optimal arm hits should agree within a few standard errors over the runs."""
+    AGENTS = ('eps_greedy', 'softmax', 'ucb', 'thompson_sampling', 'reinforce')
+
+    def get_cfg(self, agent_type: str, reward_dist: str):
+        from omegaconf import OmegaConf
+        cfg = OmegaConf.load(pathlib.Path(__file__).parent / 'conf' / 'config.yaml')
+        cfg.num_runs, cfg.total_timesteps = 100, 200
+        cfg.agent.type, cfg.env.reward_dist = agent_type, reward_dist
+        return cfg
+
+    def assert_close_over_runs(self, batched: np.ndarray, sequential: np.ndarray, num_std_errors: float = 4.0):
+        std_error = np.sqrt(batched.var(ddof=1) / len(batched) + sequential.var(ddof=1) / len(sequential))
+        self.assertLessEqual(abs(batched.mean() - sequential.mean()), num_std_errors * std_error + 1e-9)
+
+    def test_agents(self):
+        for reward_dist in ('bernoulli', 'gaussian'):
+            for agent_type in self.AGENTS:
+                with self.subTest(agent=agent_type, reward_dist=reward_dist):
+                    cfg = self.get_cfg(agent_type, reward_dist)
+                    np.random.seed(cfg.seed)
+                    batched_rewards, batched_hits, _, batched_means, _, _ = run_batched(cfg)
+                    np.random.seed(cfg.seed)
+                    sequential_rewards, sequential_hits, _, sequential_means, _, _ = run_sequential(cfg)
+                    self.assertEqual(batched_rewards.shape, sequential_rewards.shape)
+                    self.assert_close_over_runs(batched_rewards.mean(axis=1), sequential_rewards.mean(axis=1))
+                    self.assert_close_over_runs(batched_hits[:, -1], sequential_hits[:, -1])
+
+
 if __name__ == '__main__':
+    import hydra
     # pathlib.Path(f'{pathlib.Path.cwd()}/figs/').mkdir(parents=True, exist_ok=True)
-    main()
+    hydra.main(config_path="conf", config_name="config")(main)()
     # print(wandb.)
     # print(logger.handlers)
 
@@ -0,0 +1,130 @@
+import numpy as np
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from omegaconf import OmegaConf
+from typing import Dict, Tuple
+
+from utils.utils import cumulative_regret
+from utils.regret_analytics import pseudo_regret
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter("[%(name)s] [%(levelname)s] %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.propagate = False
+
+# config of the sweep, set once in every worker by init_worker
+_base_cfg = None
+
+
+def init_worker(base_cfg: Dict) -> None:
+    """Runs once per worker process: imports the runner (and with it gym, wandb
+    and the agents) and keeps the base config, so that jobs only pay for the
+    simulation itself."""
+    global _base_cfg
+    import runner  # noqa: F401
+    _base_cfg = base_cfg
+
+
+def get_jobs(cfg) -> list:
+    """All the (agent, reward_dist, num_arms, seed) combinations of the sweep."""
+    return list(itertools.product(cfg.sweep.agents, cfg.sweep.reward_dists, cfg.sweep.num_arms, cfg.sweep.seeds))
+
+
+def run_job(job: Tuple[str, str, int, int]) -> Dict[str, np.ndarray]:
+    """Play the runs of one combination and return its mean reward, optimal arm
+    percentage, regret and pseudo-regret curves, averaged over the runs. The
+    pseudo-regret is NaN for the environments whose means change over time."""
+    import runner
+    agent_type, reward_dist, num_arms, seed = job
+    cfg = OmegaConf.create(_base_cfg)
+    cfg.agent.type, cfg.env.reward_dist, cfg.env.num_arms, cfg.seed = agent_type, reward_dist, num_arms, seed
+
+    # the arms are shuffled with the global generator
+    np.random.seed(seed)
+    start_time = time.perf_counter()
+    if cfg.vectorized:
+        rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name = runner.run_batched(cfg)
+    else:
+        rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name = runner.run_sequential(cfg)
+    if cfg.results.store:
+        runner.save_results(cfg, rewards, optimal_arm_hits, actions, arm_means, mu_star, agent_name)
+    mean_rewards = rewards.mean(axis=0)
+    if arm_means is None:
+        mean_pseudo_regret = np.full(cfg.total_timesteps, np.nan)
+    else:
+        mean_pseudo_regret = pseudo_regret(actions, arm_means, mu_star).mean(axis=0)
+    return {
+        'agent_name': agent_name,
+        'mean_reward': mean_rewards,
+        'optimal_arm_percentage': optimal_arm_hits.mean(axis=0),
+        'regret': cumulative_regret(mean_rewards, mu_star),
+        'pseudo_regret': mean_pseudo_regret,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+
+def run_sweep(cfg) -> Dict[str, np.ndarray]:
+    """Fan the jobs of the sweep across a pool of cfg.sweep.num_workers persistent
+    worker processes (one per core by default), and stack their results."""
+    jobs = get_jobs(cfg)
+    num_workers = min(cfg.sweep.num_workers or os.cpu_count(), len(jobs))
+    base_cfg = OmegaConf.to_container(cfg, resolve=True)
+    context = multiprocessing.get_context(cfg.sweep.start_method)
+
+    results = [None] * len(jobs)
+    with context.Pool(num_workers, initializer=init_worker, initargs=(base_cfg,)) as pool:
+        for job_index, result in enumerate(pool.imap(run_job, jobs)):
+            results[job_index] = result
+            logger.info(f'{jobs[job_index]}: mean reward {result["mean_reward"].mean():.3f}, '
+                        f'optimal arm {100 * result["optimal_arm_percentage"][-1]:.1f}%, '
+                        f'final regret {result["regret"][-1]:.2f} ({result["seconds"]:.1f}s)')
+
+    agents, reward_dists, num_arms, seeds = zip(*jobs)
+    return {
+        'agent': np.array(agents),
+        'reward_dist': np.array(reward_dists),
+        'num_arms': np.array(num_arms),
+        'seed': np.array(seeds),
+        'agent_name': np.array([result['agent_name'] for result in results]),
+        'seconds': np.array([result['seconds'] for result in results]),
+        'mean_reward': np.stack([result['mean_reward'] for result in results]),
+        'optimal_arm_percentage': np.stack([result['optimal_arm_percentage'] for result in results]),
+        'regret': np.stack([result['regret'] for result in results]),
+        'pseudo_regret': np.stack([result['pseudo_regret'] for result in results]),
+    }
+
+
+def main(cfg):
+    import hydra
+    start_time = time.perf_counter()
+    # the workers cannot resolve paths relative to the original directory themselves
+    cfg.results.root = hydra.utils.to_absolute_path(cfg.results.root)
+    results = run_sweep(cfg)
+    # saved in the output directory of the run, created by hydra
+    np.savez_compressed(cfg.sweep.output, **results)
+    logger.info(f'{len(results["seed"])} runs in {time.perf_counter() - start_time:.1f}s, saved to {os.path.abspath(cfg.sweep.output)}')
+
+    # summary over the seeds of each (agent, reward_dist, num_arms)
+    for agent, reward_dist, num_arms in itertools.product(cfg.sweep.agents, cfg.sweep.reward_dists, cfg.sweep.num_arms):
+        mask = (results['agent'] == agent) & (results['reward_dist'] == reward_dist) & (results['num_arms'] == num_arms)
+        logger.info(f'{agent:>18} | {reward_dist:>9} | {num_arms:>3} arms | '
+                    f'mean reward {results["mean_reward"][mask].mean():9.3f} | '
+                    f'optimal arm {100 * results["optimal_arm_percentage"][mask, -1].mean():5.1f}% | '
+                    f'final regret {results["regret"][mask, -1].mean():10.2f} ± {results["regret"][mask, -1].std():.2f} | '
+                    f'pseudo-regret {results["pseudo_regret"][mask, -1].mean():10.2f} ± {results["pseudo_regret"][mask, -1].std():.2f}')
+
+
+if __name__ == '__main__':
+    # hydra is imported here only: with 'spawn', the workers import this module again
+    import hydra
+    hydra.main(config_path="conf", config_name="config")(main)()
+
+    # python3 sweep.py sweep.agents=[reinforce] sweep.reward_dists=[gaussian] sweep.seeds=[32,12,23,43] agent.reinforce.baseline=False
@@ -0,0 +1,58 @@
+import os
+import pathlib
+import pickle
+import time
+import logging
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Checkpointer:
+    """Periodically saves the state of a run (agent, environment, random
+    generators and the partially filled result arrays, as a dict) to a single
+    pickle file, so that a job which was killed can resume where it stopped.
+
+    A checkpoint is written to a temporary file next to 'path', flushed to disk,
+    then renamed over 'path': the rename is atomic, so a job killed while saving
+    leaves the previous checkpoint intact."""
+
+    def __init__(self, path: str, every_seconds: float = 300) -> None:
+        self.path = pathlib.Path(path)
+        self.every_seconds = every_seconds
+        self._last_save = time.monotonic()
+
+    def __str__(self) -> str:
+        return f'Checkpointer({self.path}, every_seconds={self.every_seconds})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def due(self) -> bool:
+        """Whether 'every_seconds' elapsed since the last checkpoint."""
+        return time.monotonic() - self._last_save >= self.every_seconds
+
+    def save(self, state: Dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(temporary_path, 'wb') as checkpoint_file:
+            pickle.dump(state, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.path)
+        self._last_save = time.monotonic()
+        logger.info(f'Checkpoint saved to {self.path}')
+
+    def load(self) -> Optional[Dict]:
+        """The state of the last checkpoint, or None if there is none."""
+        if not self.path.exists():
+            return None
+        with open(self.path, 'rb') as checkpoint_file:
+            return pickle.load(checkpoint_file)
+
+    def remove(self) -> None:
+        """Delete the checkpoint, once the run it belongs to is complete."""
+        if self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,78 @@
+import numpy as np
+from statistics import NormalDist
+from typing import Dict, Tuple
+
+
+def action_dtype(num_arms: int) -> np.dtype:
+    """Smallest unsigned integer type holding the arm indices, so that the
+    (num_runs, total_timesteps) matrix of chosen arms stays small."""
+    return np.min_scalar_type(max(num_arms - 1, 0))
+
+
+def pull_counts(actions: np.ndarray, num_arms: int) -> np.ndarray:
+    """Number of pulls of every arm in each run, of shape (num_runs, num_arms),
+    from the chosen arms of shape (num_runs, total_timesteps)."""
+    actions = np.asarray(actions)
+    num_runs = actions.shape[0]
+    # one bincount over all the runs, each run with its own block of num_arms bins
+    offsets = np.arange(num_runs)[:, None] * num_arms
+    return np.bincount((actions + offsets).ravel(), minlength=num_runs * num_arms).reshape(num_runs, num_arms)
+
+
+def pseudo_regret(actions: np.ndarray, arm_means: np.ndarray, optimal_mean: float = None) -> np.ndarray:
+    """Pseudo-regret of each run after each timestep, of shape (num_runs,
+    total_timesteps): the sum of the gaps optimal_mean - arm_means[action] of the
+    arms chosen so far. Unlike the regret computed from the sampled rewards, it
+    carries no reward noise, only the randomness of the choices of the agent.
+
+    Parameters
+    ----------
+    actions : np.ndarray
+        The chosen arms, of shape (num_runs, total_timesteps).
+    arm_means : np.ndarray
+        The expected reward of every arm, of shape (num_arms,).
+    optimal_mean : float, optional
+        The expected reward of the optimal arm, the maximum of arm_means by default.
+    """
+    arm_means = np.asarray(arm_means, dtype=float)
+    if optimal_mean is None:
+        optimal_mean = arm_means.max()
+    gaps = optimal_mean - arm_means
+    return np.cumsum(gaps[actions], axis=-1)
+
+
+def confidence_band(curves: np.ndarray, confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mean of the curves over the runs (axis 0), with the lower and upper bounds
+    of its normal confidence interval, mean -/+ z * std / sqrt(num_runs)."""
+    num_runs = curves.shape[0]
+    mean = curves.mean(axis=0)
+    if num_runs < 2:
+        return mean, mean.copy(), mean.copy()
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    half_width = z * curves.std(axis=0, ddof=1) / np.sqrt(num_runs)
+    return mean, mean - half_width, mean + half_width
+
+
+def regret_summary(actions: np.ndarray, arm_means: np.ndarray, optimal_mean: float = None,
+                   confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """Analytics of the runs from their chosen arms alone, without playing them
+    again: the pseudo-regret curve averaged over the runs with its confidence
+    band, and the pulls of every arm.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        - pseudo_regret, pseudo_regret_lower, pseudo_regret_upper: of shape (total_timesteps,)
+        - pull_counts: pulls of every arm in each run, of shape (num_runs, num_arms)
+        - pull_fractions: fraction of the pulls going to each arm, averaged over the runs
+    """
+    arm_means = np.asarray(arm_means, dtype=float)
+    mean, lower, upper = confidence_band(pseudo_regret(actions, arm_means, optimal_mean), confidence)
+    counts = pull_counts(actions, len(arm_means))
+    return {
+        'pseudo_regret': mean,
+        'pseudo_regret_lower': lower,
+        'pseudo_regret_upper': upper,
+        'pull_counts': counts,
+        'pull_fractions': counts.mean(axis=0) / np.shape(actions)[-1],
+    }
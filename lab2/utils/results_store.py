@@ -0,0 +1,115 @@
+import numpy as np
+import hashlib
+import json
+import pathlib
+import logging
+from typing import Dict, Iterator, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# config keys which do not change the results of a run
+IGNORED_KEYS = ('wandb_tracking', 'logging', 'sweep', 'results', 'checkpoint', 'resume')
+
+
+def config_hash(config: Dict) -> str:
+    """Short hash of the config of a run, the keys which do not change the results
+    (IGNORED_KEYS) excluded."""
+    config = {key: value for key, value in config.items() if key not in IGNORED_KEYS}
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResultsStore:
+    """Columnar store of the results of the runs, one directory per config hash:
+
+        <root>/<hash>/meta.json                 config, agent name, optimal mean, arm means
+        <root>/<hash>/<column>.npy              one file per column, when not compressed
+        <root>/<hash>/columns.npz               all the columns, when compressed
+
+    Each column is a matrix of shape (num_runs, total_timesteps); the floating
+    point columns are stored as 'dtype', the others (the chosen arms) as they
+    are. The .npy files
+    are memory-mapped when read, so plotting a slice of many runs does not load
+    them entirely; compressed results are smaller but read eagerly.
+    """
+
+    COLUMNS = ('rewards', 'optimal_arm_hits', 'actions')
+
+    def __init__(self, root: str, compress: bool = False, dtype: str = 'float32') -> None:
+        self.root = pathlib.Path(root)
+        self.compress = compress
+        self.dtype = np.dtype(dtype)
+
+    def __str__(self) -> str:
+        return f'ResultsStore({self.root}, compress={self.compress}, dtype={self.dtype})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def write(self, config: Dict, columns: Dict[str, np.ndarray], **meta) -> str:
+        """Save the columns of a run (a dict name -> array) with its config, and
+        return the hash the run is stored under. 'meta' holds any other json
+        serializable information (agent name, optimal mean...)."""
+        key = config_hash(config)
+        run_dir = self.root / key
+        run_dir.mkdir(parents=True, exist_ok=True)
+        columns = {name: np.asarray(column) for name, column in columns.items()}
+        columns = {name: column.astype(self.dtype) if np.issubdtype(column.dtype, np.floating) else column
+                   for name, column in columns.items()}
+        if self.compress:
+            np.savez_compressed(run_dir / 'columns.npz', **columns)
+        else:
+            for name, column in columns.items():
+                np.save(run_dir / f'{name}.npy', column)
+        # written last: a directory without meta.json is an interrupted write
+        with open(run_dir / 'meta.json', 'w') as meta_file:
+            json.dump({'config': config, 'columns': sorted(columns), **meta}, meta_file, indent=2)
+        logger.info(f'Results saved to {run_dir}')
+        return key
+
+    def __contains__(self, key: str) -> bool:
+        return (self.root / key / 'meta.json').exists()
+
+    def keys(self) -> List[str]:
+        """Hashes of all the complete runs of the store."""
+        return sorted(path.parent.name for path in self.root.glob('*/meta.json'))
+
+    def meta(self, key: str) -> Dict:
+        with open(self.root / key / 'meta.json') as meta_file:
+            return json.load(meta_file)
+
+    def read(self, key: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Return the columns and the meta data of the run stored under 'key'. The
+        columns are read-only memory maps unless 'mmap' is False or the run was
+        compressed."""
+        meta = self.meta(key)
+        run_dir = self.root / key
+        if (run_dir / 'columns.npz').exists():
+            with np.load(run_dir / 'columns.npz') as columns:
+                return {name: columns[name] for name in columns.files}, meta
+        return {name: np.load(run_dir / f'{name}.npy', mmap_mode='r' if mmap else None) for name in meta['columns']}, meta
+
+    def find(self, **filters) -> List[str]:
+        """Hashes of the runs whose config matches all the filters, given as dotted
+        keys with '__' in place of the dots, e.g. find(agent__type='ucb', seed=5)."""
+        matches = []
+        for key in self.keys():
+            config = self.meta(key)['config']
+            if all(_get(config, name.split('__')) == value for name, value in filters.items()):
+                matches.append(key)
+        return matches
+
+    def iter_runs(self, **filters) -> Iterator[Tuple[str, Dict[str, np.ndarray], Dict]]:
+        """Iterate over the (hash, columns, meta) of the runs matching the filters."""
+        for key in self.find(**filters):
+            columns, meta = self.read(key)
+            yield key, columns, meta
+
+
+def _get(config: Dict, path: List[str]):
+    for name in path:
+        if not isinstance(config, dict) or name not in config:
+            return None
+        config = config[name]
+    return config
@@ -1,158 +1,263 @@
 import numpy as np
-from math import inf
-from typing import List
+from typing import Tuple
 import logging
+import unittest
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-def softmax(x: List[float]) -> List[float]:
-    """Compute softmax values for each sets of scores in x."""
-    return np.exp(x) / np.sum(np.exp(x), axis=0)
-
-
-class RunningMean:
-    """Class to store and update the running mean."""
-    def __init__(self):
-        self.total_reward = 0.0
-        self.count = 0
+SAMPLING_METHODS = ('inverse_cdf', 'gumbel')
+
+
+def softmax(x: np.ndarray, temperature: float = 1.0, out: np.ndarray = None, axis: int = -1) -> np.ndarray:
+    """Compute the softmax of x / temperature along axis, for scores of shape
+    (num_arms,) or (num_runs, num_arms). The maximum is subtracted before the
+    exponential (log-sum-exp trick), so it never overflows whatever the scale of
+    the scores. The result is written into 'out' when given, which avoids
+    allocating temporaries in the agents' inner loop."""
+    out = np.divide(x, temperature, out=out)
+    out -= out.max(axis=axis, keepdims=True)
+    np.exp(out, out=out)
+    out /= out.sum(axis=axis, keepdims=True)
+    return out
+
+
+def gradient_bandit_update(preferences: np.ndarray, index, steps, out: np.ndarray = None) -> np.ndarray:
+    """Gradient bandit update of the preferences (Sutton and Barto, 2.8), in place:
+        H <- H + steps * (1{a} - pi)
+    for every arm, where pi = softmax(H) is the policy the arm a was sampled from,
+    and steps = step size * (reward - baseline), a scalar or one per run. The
+    preferences are not clipped, the stable softmax handles any scale.
+
+    Parameters
+    ----------
+    preferences : np.ndarray
+        The preferences, of shape (num_arms,) or (num_runs, num_arms).
+    index : int or tuple
+        Index of the selected arm(s) into preferences, see ArmStatistics.index.
+    steps : float or np.ndarray
+        The step of the selected arm of each run.
+    out : np.ndarray, optional
+        Scratch buffer of the shape of preferences, holding the policy.
+    """
+    policy = softmax(preferences, out=out)
+    policy *= -np.expand_dims(steps, -1)
+    preferences += policy
+    preferences[index] += steps
+    return preferences
+
+
+def sample_categorical(probs: np.ndarray, rng: np.random.Generator, out: np.ndarray = None) -> np.ndarray:
+    """Sample one index per row of probs, of shape (num_runs, num_arms), using
+    the inverse of the cumulative distribution. probs need not be normalized;
+    the cumulative sum is written into 'out' when given."""
+    cdf = np.cumsum(probs, axis=-1, out=out)
+    u = rng.random(probs.shape[:-1] + (1,)) * cdf[..., -1:]
+    return np.minimum((cdf <= u).sum(axis=-1), probs.shape[-1] - 1)
+
+
+def sample_softmax(logits: np.ndarray, rng: np.random.Generator, temperature: float = 1.0, method: str = 'inverse_cdf',
+                   out: np.ndarray = None) -> np.ndarray:
+    """Sample an index per row from the softmax of logits / temperature, with
+    'out' (same shape as logits) as the scratch buffer.
+        - inverse_cdf: stable softmax, then the inverse of its cumulative sum
+        - gumbel: argmax of logits / temperature plus Gumbel noise, which never
+          normalizes the probabilities
+    rng can be a np.random.Generator or the np.random module."""
+    if method == 'inverse_cdf':
+        probs = softmax(logits, temperature, out=out)
+        return sample_categorical(probs, rng, out=probs)
+    elif method == 'gumbel':
+        scores = np.divide(logits, temperature, out=out)
+        scores += rng.gumbel(size=scores.shape)
+        return scores.argmax(axis=-1)
+    raise ValueError(f'Unknown sampling method: {method}. Please choose from: {", ".join(SAMPLING_METHODS)}')
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores of each row, from the largest down, for
+    scores of shape (..., num_arms). np.argpartition finds them in O(num_arms),
+    only the k selected are sorted."""
+    num_arms = scores.shape[-1]
+    if not 1 <= k <= num_arms:
+        raise ValueError(f'k must be between 1 and the number of arms ({num_arms}), got {k}')
+    if k < num_arms:
+        selected = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        selected = np.broadcast_to(np.arange(num_arms), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, selected, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(selected, order, axis=-1)
+
+
+def gumbel_top_k(logits: np.ndarray, k: int, rng, temperature: float = 1.0) -> np.ndarray:
+    """Sample k distinct indices per row, without replacement, from the softmax of
+    logits / temperature: the top k of the logits perturbed by Gumbel noise are
+    distributed as successive draws from the softmax, each time excluding the
+    arms already drawn. rng can be a np.random.Generator or the np.random module."""
+    scores = logits / temperature
+    scores = scores + rng.gumbel(size=scores.shape)
+    return top_k(scores, k)
+
+
+def cumulative_regret(mean_rewards: np.ndarray, optimal_mean: float) -> np.ndarray:
+    """Regret after each timestep, optimal_mean * t minus the rewards collected
+    up to t, for rewards of shape (..., total_timesteps)."""
+    timesteps = np.arange(1, np.shape(mean_rewards)[-1] + 1)
+    return optimal_mean * timesteps - np.cumsum(mean_rewards, axis=-1)
+
+
+class ArmStatistics:
+    """Struct of arrays holding the statistics of every arm. The arrays have
+    shape (num_arms,), or (num_runs, num_arms) when num_runs runs are played at
+    once, and only the requested fields are allocated:
+        - counts: number of pulls of each arm
+        - sums: sum of the rewards of each arm
+        - m2: sum of squared deviations of the rewards of each arm from their
+          mean, updated with Welford's algorithm (needs counts and sums)
+        - alpha, beta: parameters of the Beta posterior of bernoulli arms, starting at 1
+        - preferences: preference of each arm, starting at 0
+    """
+    FIELDS = ('counts', 'sums', 'm2', 'alpha', 'beta', 'preferences')
+    _INITIAL_VALUES = {'alpha': 1.0, 'beta': 1.0}
+
+    def __init__(self, num_arms: int, num_runs: int = None, fields: Tuple[str, ...] = ('counts', 'sums')):
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown fields {unknown}, must be among {self.FIELDS}')
+        if 'm2' in fields and not {'counts', 'sums'} <= set(fields):
+            raise ValueError('m2 needs the counts and sums fields')
+        self.num_arms = num_arms
+        self.num_runs = num_runs
+        self.fields = tuple(fields)
+        self.shape = (num_arms,) if num_runs is None else (num_runs, num_arms)
+        self._rows = None if num_runs is None else np.arange(num_runs)
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(self.shape, dtype=np.int64 if field == 'counts' else float)
+                    if field in self.fields else None)
+        self.reset()
+
+    def reset(self) -> None:
+        for field in self.fields:
+            getattr(self, field).fill(self._INITIAL_VALUES.get(field, 0))
+
+    def index(self, actions):
+        """Index of the selected arm(s): the arm itself for a single run, or the
+        (run, arm) pairs when every run selected one arm."""
+        return actions if self._rows is None else (self._rows, actions)
 
     @property
-    def mean(self) -> float:
-        if self.count == 0:
-            return 0.0
-        return self.total_reward / self.count
-
-    def update_mean(self, reward: int) -> None:
-        self.total_reward += reward
-        self.count += 1
+    def means(self) -> np.ndarray:
+        """Running mean of each arm, 0 for the arms which were never pulled."""
+        return np.divide(self.sums, self.counts, out=np.zeros(self.shape), where=self.counts > 0)
+
+    def subset(self, arms) -> 'ArmStatistics':
+        """Copy of the statistics of the given arms only (along the last axis)."""
+        subset = ArmStatistics(len(arms), self.num_runs, fields=self.fields)
+        for field in self.fields:
+            getattr(subset, field)[...] = getattr(self, field)[..., arms]
+        return subset
+
+    def update(self, actions, rewards) -> None:
+        """Add the reward of the selected arm, or of the selected arm of each run,
+        to every allocated reward statistic, in place."""
+        index = self.index(actions)
+        if self.m2 is not None:
+            # Welford: m2 += (reward - old mean) * (reward - new mean)
+            counts, sums = self.counts[index], self.sums[index]
+            old_means = np.divide(sums, counts, out=np.zeros(np.shape(sums)), where=counts > 0)
+            self.m2[index] += (rewards - old_means) * (rewards - (sums + rewards) / (counts + 1))
+        if self.counts is not None:
+            self.counts[index] += 1
+        if self.sums is not None:
+            self.sums[index] += rewards
+        if self.alpha is not None:
+            self.alpha[index] += np.equal(rewards, 1)
+        if self.beta is not None:
+            self.beta[index] += np.equal(rewards, 0)
+
+    def update_batch(self, actions, rewards) -> None:
+        """Add many rewards at once, several of them possibly for the same arm,
+        with np.add.at scatter updates. actions and rewards have any shape for a
+        single run, or (num_runs, ...) when num_runs runs are played at once.
+        m2 merges the Welford statistics of the batch with those of the arm
+        (Chan et al.), so the result matches adding the rewards one by one."""
+        actions, rewards = np.asarray(actions), np.asarray(rewards, dtype=float)
+        if self._rows is None:
+            index = actions
+        else:
+            index = (self._rows.reshape((-1,) + (1,) * (actions.ndim - 1)), actions)
+        if self.m2 is not None:
+            batch_counts, batch_sums, batch_m2 = np.zeros(self.shape), np.zeros(self.shape), np.zeros(self.shape)
+            np.add.at(batch_counts, index, 1)
+            np.add.at(batch_sums, index, rewards)
+            batch_means = np.divide(batch_sums, batch_counts, out=np.zeros(self.shape), where=batch_counts > 0)
+            np.add.at(batch_m2, index, (rewards - batch_means[index])**2)
+            total_counts = self.counts + batch_counts
+            delta = batch_means - self.means
+            self.m2 += batch_m2 + np.divide(delta**2 * self.counts * batch_counts, total_counts,
+                                            out=np.zeros(self.shape), where=total_counts > 0)
+        if self.counts is not None:
+            np.add.at(self.counts, index, 1)
+        if self.sums is not None:
+            np.add.at(self.sums, index, rewards)
+        if self.alpha is not None:
+            np.add.at(self.alpha, index, np.equal(rewards, 1))
+        if self.beta is not None:
+            np.add.at(self.beta, index, np.equal(rewards, 0))
 
     def __str__(self) -> str:
-        return f'Mean: {self.mean:.3f}'
+        return f'ArmStatistics(shape={self.shape}, fields={self.fields})'
 
     def __repr__(self) -> str:
         return self.__str__()
 
 
-class RunningMeanUCB(RunningMean):
-    """Class to store and update the running mean and bonus term for the UCB
-    agent. As the bonus term needs information about the time passed, the agent
-    need to tick() every time it takes an action, irrespective of whether the
-    arm corresponding to this object is chosen or not."""
-    def __init__(self):
-        super(RunningMeanUCB, self).__init__()
-        self.bonus = inf
-        self.time = 0
-
-    @property
-    def priority(self) -> float:
-        return self.mean + self.bonus
-
-    def tick(self):
-        self.time += 1
-        if self.count > 0:
-            self.bonus = np.sqrt(2 * np.log(self.time) / self.count)
-
-
-class RunningMeanThompsonBeta(RunningMean):
-    """Class to store and update the alpha and beta values for the Thompson
-    Sampling using Beta distribution. The reward distribution is assumed to be
-    binomial."""
-
-    def __init__(self):
-        super(RunningMeanThompsonBeta, self).__init__()
-        """ Set the initial alpha and beta values to 1. These correspond to the
-        arguments of the beta distribution. Initial value of 1 is chosen to
-        set the initial distribution as uniform, ie. no prior knowledge about
-        the underlying reward distribution.  """
-        self.alpha = 1
-        self.beta = 1
-
-    def update_mean(self, reward: int) -> None:
-        self.alpha += int(reward == 1)
-        self.beta += int(reward == 0)
-
-        super(RunningMeanThompsonBeta, self).update_mean(reward)
-
-    @property
-    def priority(self) -> float:
-        return np.random.beta(self.alpha, self.beta)
-
-
-class RunningMeanThompsonGaussian(RunningMean):
-    def __init__(self):
-        super(RunningMeanThompsonGaussian, self).__init__()
-        self.mu = 0
-        self.sigma = 1
-        self.rewards = [0]
-
-    @property
-    def mean(self) -> float:
-        return self.mu
-
-    def update_mean(self, reward: int) -> None:
-        # https://stackoverflow.com/a/50729600/10127204
-        # N = self.count + 1
-        # rho = 1.0 / N
-        # d = reward - self.mu
-        # self.mu += rho * d
-        # self.sigma += rho * ((1-rho)* d**2 - self.sigma)
-        # self.sigma = np.clip(self.sigma, 0.001, 10_000)
-        self.rewards.append(reward)
-        super(RunningMeanThompsonGaussian, self).update_mean(reward)
-
-    @property
-    def priority(self) -> float:
-        # Assuming initial mean=0, sigma=1
-        # Following point 2 from bayesNormal.pdf
-        initial_mean, initial_std = 0, 10000
-        self.mu = np.mean(self.rewards)
-        self.sigma = np.clip(np.std(self.rewards), 0.001, 10_000)
-
-        std_sq = 1.0 / np.clip((1.0 / initial_std**2 + self.count / self.sigma**2), 0.001, 10_000)
-        new_mean = std_sq * (initial_mean / initial_std**2 + self.mean*self.count / self.sigma**2)
-        # logger.info(f'Mean: {new_mean:.3f}, std: {np.sqrt(std_sq):.3f} | {self.mu:.3f}, {self.sigma:.3f}')
-        return np.random.normal(new_mean, np.sqrt(std_sq), 1).item()
-        return np.random.normal(self.mu, self.sigma)
-
-
-class RunningMeanReinforce(RunningMean):
-    """Class to store running mean and preference for the REINFORCE agent."""
-    def __init__(self, beta: float = 0.3, baseline: bool = True):
-        """Initialize the class. The agent choses the arm with the highest preference.
-        The preference is updated every time the agent selects the corresponding
-        arm and recieves a reward. Running mean is maintained to implement the
-        baseline.
-
-        Parameters
-        ----------
-        beta : float
-            Rate at which the preference is updated. Low beta will be more robust
-            to outliers, but will take more number of iterations to converge.
-        baseline : bool
-            Whether to use the baseline or not.
-        """
-        super(RunningMeanReinforce, self).__init__()
-
-        self.beta = beta
-        self._preference = 0.0
-        self.baseline = baseline
-
-    @property
-    def preference(self) -> float:
-        """Denotes the preference that should be used for the current arm, while
-        selecting the arm."""
-        return self._preference
-
-    def update_preference(self, reward: int, average_reward: float = 0.0) -> None:
-        self._preference = self._preference + self.beta * (reward - (average_reward if self.baseline else 0))
-        self._preference = np.clip(self._preference, 0, 700)
-
-    def __str__(self) -> str:
-        return f'Preference: {self.preference:.3f}'
-
-    def __repr__(self) -> str:
-        return self.__str__()
-    
\ No newline at end of file
+class TestArmStatistics(unittest.TestCase):
+    FIELDS = ('counts', 'sums', 'm2', 'alpha', 'beta')
+
+    def assert_same_statistics(self, first: ArmStatistics, second: ArmStatistics):
+        for field in self.FIELDS:
+            np.testing.assert_allclose(getattr(first, field), getattr(second, field), rtol=1e-9, atol=1e-9, err_msg=field)
+
+    def test_update_batch_matches_update(self):
+        rng = np.random.default_rng(0)
+        one_by_one, batched = ArmStatistics(4, fields=self.FIELDS), ArmStatistics(4, fields=self.FIELDS)
+        for _ in range(3):
+            actions, rewards = rng.integers(0, 4, size=50), rng.integers(0, 2, size=50).astype(float)
+            for action, reward in zip(actions, rewards):
+                one_by_one.update(action, reward)
+            batched.update_batch(actions, rewards)
+            self.assert_same_statistics(one_by_one, batched)
+
+    def test_update_batch_matches_update_over_runs(self):
+        rng = np.random.default_rng(1)
+        num_runs = 3
+        one_by_one, batched = ArmStatistics(4, num_runs, fields=self.FIELDS), ArmStatistics(4, num_runs, fields=self.FIELDS)
+        for _ in range(3):
+            actions, rewards = rng.integers(0, 4, size=(num_runs, 20)), rng.normal(5.0, 2.0, size=(num_runs, 20))
+            for step in range(actions.shape[1]):
+                one_by_one.update(actions[:, step], rewards[:, step])
+            batched.update_batch(actions, rewards)
+            self.assert_same_statistics(one_by_one, batched)
+
+
+class TestGradientBanditUpdate(unittest.TestCase):
+    def test_matches_closed_form(self):
+        preferences = np.array([0.5, -1.0, 2.0, 0.0])
+        policy = np.exp(preferences) / np.exp(preferences).sum()
+        step = 0.1 * (1.5 - 0.4)
+        expected = preferences + step * (np.eye(4)[2] - policy)
+        np.testing.assert_allclose(gradient_bandit_update(preferences.copy(), 2, step), expected)
+
+    def test_matches_closed_form_over_runs(self):
+        rng = np.random.default_rng(2)
+        preferences = rng.normal(size=(5, 4))
+        actions, steps = rng.integers(0, 4, size=5), rng.normal(size=5)
+        policy = np.exp(preferences) / np.exp(preferences).sum(axis=1, keepdims=True)
+        expected = preferences + steps[:, None] * (np.eye(4)[actions] - policy)
+        updated = gradient_bandit_update(preferences.copy(), (np.arange(5), actions), steps, out=np.empty_like(preferences))
+        np.testing.assert_allclose(updated, expected)
+        # the preferences of each run keep their sum, as the gradient sums to 0
+        np.testing.assert_allclose(updated.sum(axis=1), preferences.sum(axis=1))
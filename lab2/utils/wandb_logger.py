@@ -0,0 +1,131 @@
+import numpy as np
+import queue
+import threading
+import logging
+from typing import Dict, List
+
+from utils.utils import cumulative_regret
+from utils.regret_analytics import confidence_band, pseudo_regret
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def compute_curves(rewards: np.ndarray, optimal_arm_hits: np.ndarray, optimal_mean: float, actions: np.ndarray = None,
+                   arm_means: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """Mean reward, optimal arm percentage and regret after each timestep, averaged
+    over the runs, from the (num_runs, total_timesteps) matrices of a run. Given
+    the chosen arms and the arm means, the pseudo-regret and its confidence band
+    are added."""
+    mean_rewards = np.mean(rewards, axis=0)
+    curves = {
+        'mean_reward': mean_rewards,
+        'optimal_arm_percentage': np.mean(optimal_arm_hits, axis=0),
+        'regret': cumulative_regret(mean_rewards, optimal_mean),
+    }
+    if actions is not None and arm_means is not None:
+        curves['pseudo_regret'], curves['pseudo_regret_lower'], curves['pseudo_regret_upper'] = \
+            confidence_band(pseudo_regret(actions, arm_means, optimal_mean))
+    return curves
+
+
+def downsample(total_timesteps: int, max_points: int = None) -> np.ndarray:
+    """Indices of at most 'max_points' timesteps evenly spread over the run, the
+    first and the last one included (all the timesteps if max_points is None)."""
+    if max_points is None or max_points >= total_timesteps:
+        return np.arange(total_timesteps)
+    return np.unique(np.linspace(0, total_timesteps - 1, max_points).round().astype(np.int64))
+
+
+class CurveLogger:
+    """Logs whole curves to wandb at once, instead of one wandb.log call per
+    timestep. The curves are downsampled to 'max_points' timesteps, then either
+        - 'table': written as a single wandb.Table, with one line plot per curve
+        - 'steps': written as one wandb.log call per kept timestep
+    The payloads are buffered and handed in chunks of 'flush_every' to a
+    background thread which calls wandb, so the training loop never waits on
+    it. close() flushes the buffer and waits for the thread."""
+
+    def __init__(self, mode: str = 'table', max_points: int = 1000, flush_every: int = 100, asynchronous: bool = True) -> None:
+        if mode not in ('table', 'steps'):
+            raise ValueError(f'Unknown logging mode: {mode}. Please choose from: table, steps')
+        self.mode = mode
+        self.max_points = max_points
+        self.flush_every = flush_every
+        self._buffer: List[Dict] = []
+        self._queue = queue.Queue() if asynchronous else None
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(target=self._consume, name='wandb-logger', daemon=True)
+            self._thread.start()
+
+    def __str__(self) -> str:
+        return f'CurveLogger(mode={self.mode}, max_points={self.max_points})'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def log_curves(self, curves: Dict[str, np.ndarray], suffix: str = '') -> None:
+        """Log curves of the same length, a dict name -> values per timestep. The
+        wandb keys are f'{name}{suffix}'."""
+        total_timesteps = len(next(iter(curves.values())))
+        timesteps = downsample(total_timesteps, self.max_points)
+        columns = {f'{name}{suffix}': np.asarray(values)[timesteps] for name, values in curves.items()}
+        if self.mode == 'table':
+            self._log_table(timesteps, columns)
+        else:
+            for row_index, timestep in enumerate(timesteps.tolist()):
+                self._push({'payload': {key: float(values[row_index]) for key, values in columns.items()}, 'step': timestep})
+
+    def _log_table(self, timesteps: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+        import wandb
+        names = list(columns)
+        table = wandb.Table(columns=['timestep'] + names,
+                            data=np.column_stack([timesteps] + [columns[name] for name in names]).tolist())
+        payload = {name: wandb.plot.line(table, 'timestep', name, title=name) for name in names}
+        self._push({'payload': payload, 'step': None})
+
+    def _push(self, entry: Dict) -> None:
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered payloads over to the background thread (or write them
+        right away if the logger is synchronous)."""
+        entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+        if self._queue is None:
+            self._write(entries)
+        else:
+            self._queue.put(entries)
+
+    def close(self) -> None:
+        """Flush the buffer and wait until everything was written."""
+        self.flush()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _consume(self) -> None:
+        while True:
+            entries = self._queue.get()
+            if entries is None:
+                return
+            try:
+                self._write(entries)
+            except Exception as error:
+                # a failing upload should not take the run down with it
+                logger.warning(f'Could not log to wandb: {error}')
+
+    @staticmethod
+    def _write(entries: List[Dict]) -> None:
+        import wandb
+        for entry in entries:
+            if entry['step'] is None:
+                wandb.log(entry['payload'])
+            else:
+                wandb.log(entry['payload'], step=entry['step'])